@@ -12,6 +12,7 @@ from keyboards import (
 )
 from utils import format_price, format_date
 from localization import t
+from session_store import get_session_store
 
 logger = logging.getLogger(__name__)
 
@@ -19,8 +20,9 @@ class AdminHandler:
     def __init__(self, bot, db):
         self.bot = bot
         self.db = db
-        self.admin_states = {}
+        self.admin_states = get_session_store(db, 'admin_state')
         self.notification_manager = None
+        self.security_manager = None
     
     def is_admin(self, telegram_id):
         """Проверка прав администратора"""
@@ -210,11 +212,53 @@ class AdminHandler:
             security_text += f"🔒 Система работает в штатном режиме"
             
             self.bot.send_message(chat_id, security_text, create_admin_keyboard())
+            self.show_blocked_users(chat_id)
             
         except Exception as e:
             logger.error(f"Ошибка панели безопасности: {e}")
             self.bot.send_message(chat_id, "❌ Ошибка получения данных безопасности")
     
+    def show_blocked_users(self, chat_id, limit=10):
+        """Активные блокировки с кнопками разблокировки"""
+        if not self.security_manager:
+            return
+        
+        blocked = self.security_manager.block_list.get_active()
+        if not blocked:
+            self.bot.send_message(chat_id, "🔓 Активных блокировок нет")
+            return
+        
+        blocked_text = f"⛔ <b>Заблокированы ({len(blocked)}):</b>\n\n"
+        keyboard = []
+        for user_id, expires_at in blocked[:limit]:
+            until = format_date(datetime.fromtimestamp(expires_at)) if expires_at else 'бессрочно'
+            blocked_text += f"• <code>{user_id}</code> — до {until}\n"
+            keyboard.append([{'text': f'🔓 Разблокировать {user_id}', 'callback_data': f'unblock_user_{user_id}'}])
+        
+        self.bot.send_message(chat_id, blocked_text, {'inline_keyboard': keyboard})
+    
+    def handle_security_callback(self, callback_query):
+        """Обработка callback'ов панели безопасности"""
+        data = callback_query['data']
+        chat_id = callback_query['message']['chat']['id']
+        telegram_id = callback_query['from']['id']
+        
+        if not self.is_admin(telegram_id):
+            return
+        
+        if data.startswith('unblock_user_'):
+            try:
+                user_id = int(data.replace('unblock_user_', ''))
+            except ValueError:
+                return
+            
+            if self.security_manager and self.security_manager.unblock_user(user_id, telegram_id):
+                self.bot.send_message(chat_id, f"✅ Пользователь {user_id} разблокирован")
+            else:
+                self.bot.send_message(chat_id, f"ℹ️ Пользователь {user_id} не заблокирован")
+        elif data == 'security_blocked':
+            self.show_blocked_users(chat_id)
+    
     def show_financial_reports(self, chat_id):
         """Финансовые отчеты"""
         try:
@@ -0,0 +1,140 @@
+"""
+Уведомления администраторам: кэш списка админов, склейка повторов, фоновая отправка
+"""
+import logging
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+
+class AdminAlertService:
+    """Единая точка отправки сообщений всем администраторам.
+
+    Список админов (users.is_admin = 1) читается из БД не чаще раза
+    в roster_ttl секунд и сбрасывается invalidate_roster() при изменении
+    прав. Одинаковые уведомления (по key или тексту) в пределах
+    dedup_window секунд отправляются один раз, а следующее после окна
+    сообщает, сколько повторов было пропущено. notify() только ставит
+    сообщения в очередь — отправляют фоновые потоки, поэтому оформление
+    заказа не ждет Telegram.
+    """
+
+    def __init__(self, bot, db, workers=2, queue_size=1000, roster_ttl=300, dedup_window=300, fallback_admin_id=None):
+        self.bot = bot
+        self.db = db
+        self.roster_ttl = roster_ttl
+        self.dedup_window = dedup_window
+        self.fallback_admin_id = fallback_admin_id
+        self.roster = None
+        self.roster_loaded_at = 0
+        # key -> [время последней отправки, пропущено повторов]
+        self.recent = {}
+        self.lock = threading.Lock()
+        self.send_queue = queue.Queue(maxsize=queue_size)
+        self.stats = {'alerts': 0, 'coalesced': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'roster_loads': 0}
+        for index in range(workers):
+            threading.Thread(target=self.send_worker, name=f"admin-alerts-{index}", daemon=True).start()
+
+    def get_admins(self):
+        """[(users.id, telegram_id)] администраторов из кэша"""
+        roster = self.roster
+        if roster is not None and time.monotonic() - self.roster_loaded_at < self.roster_ttl:
+            return roster
+
+        rows = self.db.execute_query('SELECT id, telegram_id FROM users WHERE is_admin = 1')
+        if rows is None:
+            # Ошибка БД: лучше старый список, чем никакого
+            return roster or []
+        roster = [(row[0], row[1]) for row in rows]
+        if not roster and self.fallback_admin_id:
+            roster = [(None, self.fallback_admin_id)]
+        self.roster = roster
+        self.roster_loaded_at = time.monotonic()
+        self.stats['roster_loads'] += 1
+        return roster
+
+    def get_admin_ids(self):
+        return [telegram_id for _, telegram_id in self.get_admins()]
+
+    def invalidate_roster(self):
+        """Права админа изменились — список перечитается при следующей отправке"""
+        self.roster = None
+
+    def coalesce(self, key, text):
+        """Текст для отправки или None, если такое же уведомление уже было в окне"""
+        if not self.dedup_window:
+            return text
+        now = time.monotonic()
+        with self.lock:
+            entry = self.recent.get(key)
+            if entry and now - entry[0] < self.dedup_window:
+                entry[1] += 1
+                self.stats['coalesced'] += 1
+                return None
+            if entry and entry[1]:
+                text += f"\n\n🔁 С прошлого уведомления повторялось еще {entry[1]} раз(а)"
+            if len(self.recent) > 1000:
+                self.recent = {k: v for k, v in self.recent.items() if now - v[0] < self.dedup_window}
+            self.recent[key] = [now, 0]
+        return text
+
+    def notify(self, text, key=None, reply_markup=None):
+        """Сообщение всем админам; False — склеено с недавним таким же"""
+        self.stats['alerts'] += 1
+        text = self.coalesce(key or text, text)
+        if text is None:
+            return False
+        for telegram_id in self.get_admin_ids():
+            try:
+                self.send_queue.put_nowait((telegram_id, text, reply_markup))
+            except queue.Full:
+                self.stats['dropped'] += 1
+                logging.info(f"Очередь уведомлений админам переполнена, пропущено для {telegram_id}")
+        return True
+
+    def send_worker(self):
+        while True:
+            telegram_id, text, reply_markup = self.send_queue.get()
+            started = time.perf_counter()
+            try:
+                result = self.bot.send_message(telegram_id, text, reply_markup)
+                if result and result.get('ok'):
+                    self.stats['sent'] += 1
+                else:
+                    self.stats['failed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logging.info(f"Ошибка уведомления админа {telegram_id}: {e}")
+            metrics.observe_job('admin_alert', time.perf_counter() - started)
+
+    def get_stats(self):
+        return dict(self.stats, queued=self.send_queue.qsize(), admins=len(self.roster or []))
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_admin_alerts(bot, db):
+    """Общий сервис уведомлений админам для бота (ADMIN_ALERTS_CONFIG)"""
+    with _services_lock:
+        service = _services.get(id(bot))
+        if service is None:
+            from config import ADMIN_ALERTS_CONFIG, BOT_CONFIG
+            try:
+                fallback_admin_id = int(BOT_CONFIG.get('admin_telegram_id') or 0) or None
+            except ValueError:
+                fallback_admin_id = None
+            service = AdminAlertService(
+                bot,
+                db,
+                workers=ADMIN_ALERTS_CONFIG['workers'],
+                queue_size=ADMIN_ALERTS_CONFIG['queue_size'],
+                roster_ttl=ADMIN_ALERTS_CONFIG['roster_ttl'],
+                dedup_window=ADMIN_ALERTS_CONFIG['dedup_window'],
+                fallback_admin_id=fallback_admin_id
+            )
+            _services[id(bot)] = service
+        return service
@@ -0,0 +1,159 @@
+"""
+Список заблокированных пользователей с истечением блокировок
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime
+
+from metrics import metrics
+
+
+class BlockList:
+    """Активные блокировки из security_blocks, хранимые в памяти процесса.
+
+    is_blocked — один lookup в dict без обращения к БД. Сроки блокировок
+    лежат в куче: просроченные снимаются при проверке (достаточно посмотреть
+    на вершину кучи) и фоновым потоком, который заодно перечитывает таблицу,
+    чтобы подхватить блокировки и разблокировки из других процессов
+    (веб-панель, второй экземпляр бота). Ключ — telegram_id.
+    """
+
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, db, reload_interval=60):
+        self.db = db
+        self.reload_interval = reload_interval
+        # user_id -> время окончания (time.time()) или None для бессрочной
+        self.blocked = {}
+        self.expiry_heap = []
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        """Загрузка активных блокировок и запуск фонового обновления"""
+        self.load()
+        if self.reload_interval and not self.running:
+            self.running = True
+            threading.Thread(target=self.reload_worker, name="block-list", daemon=True).start()
+
+    def load(self):
+        """Чтение активных блокировок из БД"""
+        now = time.time()
+        rows = self.db.execute_query('''
+            SELECT user_id, blocked_until FROM security_blocks
+            WHERE blocked_until IS NULL OR blocked_until > ?
+        ''', (self.format_time(now),))
+        if rows is None:
+            return False
+
+        blocked = {}
+        for user_id, blocked_until in rows:
+            expires_at = self.parse_time(blocked_until)
+            if user_id in blocked:
+                current = blocked[user_id]
+                # Побеждает бессрочная или более поздняя блокировка
+                if current is None or (expires_at is not None and expires_at <= current):
+                    continue
+            blocked[user_id] = expires_at
+
+        with self.lock:
+            self.blocked = blocked
+            self.expiry_heap = [(expires_at, user_id) for user_id, expires_at in blocked.items() if expires_at is not None]
+            heapq.heapify(self.expiry_heap)
+        return True
+
+    def reload_worker(self):
+        while self.running:
+            time.sleep(self.reload_interval)
+            started = time.perf_counter()
+            try:
+                self.purge_expired()
+                self.load()
+                metrics.observe_job('block_list_reload', time.perf_counter() - started)
+            except Exception as e:
+                logging.info(f"Ошибка обновления списка блокировок: {e}")
+
+    def is_blocked(self, user_id):
+        """Проверка блокировки без обращения к БД"""
+        if user_id not in self.blocked:
+            return False
+        if self.expiry_heap and self.expiry_heap[0][0] <= time.time():
+            self.purge_expired()
+        return user_id in self.blocked
+
+    def purge_expired(self):
+        """Снятие блокировок, срок которых истек"""
+        now = time.time()
+        expired = []
+        with self.lock:
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                expires_at, user_id = heapq.heappop(self.expiry_heap)
+                # В куче могут остаться записи от продленных или снятых блокировок
+                if user_id in self.blocked and self.blocked[user_id] == expires_at:
+                    del self.blocked[user_id]
+                    expired.append(user_id)
+        for user_id in expired:
+            logging.info(f"Блокировка пользователя {user_id} истекла")
+        return expired
+
+    def block(self, user_id, reason, duration_hours=None):
+        """Блокировка на duration_hours часов (None — бессрочно)"""
+        now = time.time()
+        expires_at = now + duration_hours * 3600 if duration_hours else None
+        result = self.db.execute_query('''
+            INSERT INTO security_blocks (user_id, reason, blocked_until, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (
+            user_id,
+            reason,
+            self.format_time(expires_at) if expires_at is not None else None,
+            self.format_time(now)
+        ))
+        if result is None:
+            logging.info(f"Ошибка записи блокировки пользователя {user_id}")
+
+        with self.lock:
+            if user_id in self.blocked:
+                current = self.blocked[user_id]
+                # Действующая блокировка длиннее новой — оставляем ее
+                if current is None or (expires_at is not None and current >= expires_at):
+                    return
+            self.blocked[user_id] = expires_at
+            if expires_at is not None:
+                heapq.heappush(self.expiry_heap, (expires_at, user_id))
+
+    def unblock(self, user_id):
+        """Досрочное снятие всех активных блокировок пользователя"""
+        now = self.format_time(time.time())
+        result = self.db.execute_query('''
+            UPDATE security_blocks SET blocked_until = ?
+            WHERE user_id = ? AND (blocked_until IS NULL OR blocked_until > ?)
+        ''', (now, user_id, now))
+
+        with self.lock:
+            was_blocked = self.blocked.pop(user_id, False) is not False
+        return was_blocked or bool(result)
+
+    def get_active(self):
+        """Снимок активных блокировок: [(user_id, время окончания или None)]"""
+        self.purge_expired()
+        with self.lock:
+            return sorted(self.blocked.items(), key=lambda item: item[1] or float('inf'))
+
+    def __len__(self):
+        return len(self.blocked)
+
+    @classmethod
+    def format_time(cls, timestamp):
+        return datetime.fromtimestamp(timestamp).strftime(cls.TIME_FORMAT)
+
+    @classmethod
+    def parse_time(cls, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(str(value)[:19], cls.TIME_FORMAT).timestamp()
+        except ValueError:
+            return None
@@ -0,0 +1,109 @@
+"""
+Ответы на callback-запросы: мгновенное подтверждение и редактирование исходного сообщения
+"""
+import html
+import logging
+import queue
+import re
+import threading
+
+from metrics import metrics
+
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+class CallbackResponder:
+    """Слой ответа на нажатия inline-кнопок.
+
+    answer() ставит answerCallbackQuery в очередь, которую разбирают
+    фоновые потоки, поэтому клиент перестает показывать индикатор загрузки
+    сразу, а не после работы с БД. render() показывает новый экран в том же
+    сообщении (editMessageText / editMessageMedia) и пропускает вызов, если
+    текст и клавиатура совпадают с тем, что Telegram прислал в callback.
+    Новое сообщение отправляется, только когда редактирование невозможно:
+    обычная клавиатура вместо inline, смена текста на фото и обратно или
+    ошибка редактирования.
+    """
+
+    def __init__(self, bot, workers=4, queue_size=1000):
+        self.bot = bot
+        self.ack_queue = queue.Queue(maxsize=queue_size)
+        self.stats = {'acks': 0, 'acks_dropped': 0, 'edits': 0, 'skipped': 0, 'sent': 0}
+        for index in range(workers):
+            threading.Thread(target=self.ack_worker, name=f"callback-ack-{index}", daemon=True).start()
+
+    def answer(self, callback_query, text=None, show_alert=False):
+        """Подтверждение нажатия (один раз на callback)"""
+        if callback_query.get('_answered') or 'id' not in callback_query:
+            return
+        callback_query['_answered'] = True
+        try:
+            self.ack_queue.put_nowait((callback_query['id'], text, show_alert))
+        except queue.Full:
+            self.stats['acks_dropped'] += 1
+
+    def ack_worker(self):
+        while True:
+            callback_query_id, text, show_alert = self.ack_queue.get()
+            try:
+                self.bot.answer_callback_query(callback_query_id, text, show_alert)
+                self.stats['acks'] += 1
+            except Exception as e:
+                logging.info(f"Ошибка подтверждения callback: {e}")
+
+    @staticmethod
+    def plain_text(text):
+        """HTML-разметка -> текст, каким его возвращает Telegram"""
+        return html.unescape(TAG_RE.sub('', text or '')).strip()
+
+    def is_unchanged(self, message, text, reply_markup):
+        current_text = message.get('caption') if 'photo' in message else message.get('text')
+        if self.plain_text(current_text) != self.plain_text(text):
+            return False
+        return (message.get('reply_markup') or None) == (reply_markup or None)
+
+    def render(self, callback_query, text, reply_markup=None, photo=None):
+        """Показ экрана на месте сообщения с нажатой кнопкой"""
+        message = callback_query.get('message') or {}
+        chat_id = message.get('chat', {}).get('id')
+        message_id = message.get('message_id')
+        is_media = 'photo' in message
+
+        editable = (
+            message_id is not None
+            and (reply_markup is None or 'inline_keyboard' in reply_markup)
+            and bool(photo) == is_media
+        )
+        if editable:
+            if self.is_unchanged(message, text, reply_markup):
+                self.stats['skipped'] += 1
+                metrics.cache_lookup('callback_render', True)
+                return True
+            metrics.cache_lookup('callback_render', False)
+
+            if photo:
+                result = self.bot.edit_message_media(chat_id, message_id, photo, text, reply_markup)
+            else:
+                result = self.bot.edit_message_text(chat_id, message_id, text, reply_markup)
+            if result:
+                self.stats['edits'] += 1
+                return True
+
+        self.stats['sent'] += 1
+        if photo:
+            result = self.bot.send_photo(chat_id, photo, text, reply_markup)
+        else:
+            result = self.bot.send_message(chat_id, text, reply_markup)
+        return bool(result and result.get('ok'))
+
+    def edit_markup(self, callback_query, reply_markup):
+        """Замена только inline-клавиатуры (без вызова, если она не изменилась)"""
+        message = callback_query.get('message') or {}
+        if (message.get('reply_markup') or None) == (reply_markup or None):
+            self.stats['skipped'] += 1
+            return True
+        self.stats['edits'] += 1
+        return self.bot.edit_message_reply_markup(message['chat']['id'], message['message_id'], reply_markup)
+
+    def get_stats(self):
+        return dict(self.stats, queued=self.ack_queue.qsize())
@@ -21,14 +21,28 @@ DATABASE_PATH = os.getenv('DATABASE_PATH', './data/shop_bot.db')  # SQLite for l
 DATABASE_CONFIG = {
     'path': os.getenv('DATABASE_PATH', 'shop_bot.db'),
     'backup_interval': 3600,  # Резервное копирование каждый час
-    'max_connections': 10
+    'max_connections': 10,
+    # Профилирование запросов: статистика по отпечаткам и журнал медленных
+    'profiling': os.getenv('DB_PROFILING', 'false').lower() == 'true',
+    'slow_query_ms': int(os.getenv('SLOW_QUERY_MS', '100')),
+    'profile_flush_interval': 60,
+    # Счетчики просмотров/продаж товаров пишутся пачкой раз в N секунд
+    'counter_flush_interval': int(os.getenv('COUNTER_FLUSH_INTERVAL', '5')),
+    'product_views_daily': os.getenv('PRODUCT_VIEWS_DAILY', 'true').lower() == 'true'
 }
 
 # Настройки безопасности
 SECURITY_CONFIG = {
     'rate_limit_per_minute': int(os.getenv('RATE_LIMIT', '20')),
+    'rate_limit_max_keys': int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000')),
     'max_failed_attempts': 5,
     'block_duration_hours': 24,
+    # Спам-фильтр: порог баллов и повторы одного текста
+    'spam_threshold': int(os.getenv('SPAM_THRESHOLD', '3')),
+    'spam_duplicate_limit': int(os.getenv('SPAM_DUPLICATE_LIMIT', '3')),
+    'spam_dedup_window': int(os.getenv('SPAM_DEDUP_WINDOW', '300')),
+    # Как часто перечитывать security_blocks (разблокировки из веб-панели)
+    'block_list_reload_interval': int(os.getenv('BLOCK_LIST_RELOAD_INTERVAL', '60')),
     'jwt_secret': os.getenv('JWT_SECRET', 'your-secret-key-change-in-production'),
     'encryption_key': os.getenv('ENCRYPTION_KEY', 'your-encryption-key')
 }
@@ -38,7 +52,17 @@ LOGGING_CONFIG = {
     'level': os.getenv('LOG_LEVEL', 'INFO'),
     'file': os.getenv('LOG_FILE', 'bot.log'),
     'max_size': 10 * 1024 * 1024,  # 10MB
-    'backup_count': 5
+    'backup_count': 5,
+    # json или text; запись идет через очередь и отдельный поток
+    'format': os.getenv('LOG_FORMAT', 'json'),
+    'queue_size': int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+    # Доля DEBUG-записей, попадающих в лог: общая и по префиксам логгеров
+    'debug_sample_rate': float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0')),
+    'debug_sample_rates': os.getenv('LOG_DEBUG_SAMPLING', 'database=0.01'),
+    # Буферизованная запись журналов аудита в БД
+    'audit_buffer_size': int(os.getenv('AUDIT_BUFFER_SIZE', '10000')),
+    'audit_batch_size': 200,
+    'audit_flush_interval': float(os.getenv('AUDIT_FLUSH_INTERVAL', '0.5'))
 }
 
 # Настройки Redis (для кэширования)
@@ -50,12 +74,23 @@ REDIS_CONFIG = {
     'enabled': os.getenv('REDIS_ENABLED', 'false').lower() == 'true'
 }
 
+# Состояния диалогов (регистрация, оформление заказа, заявки продавцов)
+SESSION_CONFIG = {
+    # memory — в процессе; sql — таблица user_sessions; redis — общий Redis
+    'backend': os.getenv('SESSION_BACKEND', 'memory'),
+    'ttl': int(os.getenv('SESSION_TTL', '86400')),
+    'max_keys': 100000,
+    'purge_interval': 600
+}
+
 # Настройки мониторинга
 MONITORING_CONFIG = {
     'health_check_interval': 60,
     'metrics_enabled': True,
     'sentry_dsn': os.getenv('SENTRY_DSN'),
-    'prometheus_port': int(os.getenv('PROMETHEUS_PORT', '8000'))
+    'prometheus_port': int(os.getenv('PROMETHEUS_PORT', '8000')),
+    # Обновления дольше порога (сек) пишутся через logger.performance
+    'slow_update_threshold': float(os.getenv('SLOW_UPDATE_THRESHOLD', '1.0'))
 }
 
 # Настройки бота
@@ -66,8 +101,20 @@ BOT_CONFIG = {
     'bot_username': 'Safar_call_bot',
     'currency': os.getenv('CURRENCY', 'USD'),
     'currency_symbol': os.getenv('CURRENCY_SYMBOL', '$'),
+    'api_url': os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org'),
+    'update_mode': os.getenv('UPDATE_MODE', 'polling'),  # polling | webhook
     'webhook_url': os.getenv('WEBHOOK_URL'),
     'webhook_secret': os.getenv('WEBHOOK_SECRET'),
+    'webhook_path': os.getenv('WEBHOOK_PATH', '/telegram/webhook'),
+    'webhook_listen_host': os.getenv('WEBHOOK_LISTEN_HOST', '0.0.0.0'),
+    'webhook_listen_port': int(os.getenv('WEBHOOK_LISTEN_PORT', os.getenv('PORT', '8443'))),
+    'webhook_workers': int(os.getenv('WEBHOOK_WORKERS', '4')),
+    'callback_ack_workers': int(os.getenv('CALLBACK_ACK_WORKERS', '4')),
+    # Больше 1 — прием обновлений в одном процессе и обработка в N процессах (по chat_id)
+    'workers': int(os.getenv('BOT_WORKERS', '1')),
+    'worker_queue_size': int(os.getenv('BOT_WORKER_QUEUE_SIZE', '1000')),
+    # Потоки параллельной инициализации подсистем при запуске
+    'startup_workers': int(os.getenv('BOT_STARTUP_WORKERS', '4')),
     'max_message_length': 4096,
     'request_timeout': 30,
     'admin_telegram_id': os.getenv('ADMIN_TELEGRAM_ID', '5720497431'),
@@ -75,6 +122,49 @@ BOT_CONFIG = {
     'post_channel_id': '-1002566537425'
 }
 
+# Массовая рассылка запланированных постов
+POST_DELIVERY_CONFIG = {
+    'workers': int(os.getenv('POST_DELIVERY_WORKERS', '4')),
+    'messages_per_second': int(os.getenv('POST_DELIVERY_RATE', '25')),
+    'max_attempts': 3,
+    'batch_size': 200,
+    # Через сколько секунд захваченная, но не отправленная строка возвращается в очередь
+    'claim_lease': int(os.getenv('POST_DELIVERY_CLAIM_LEASE', '600'))
+}
+
+# Уведомления администраторам
+ADMIN_ALERTS_CONFIG = {
+    'workers': int(os.getenv('ADMIN_ALERT_WORKERS', '2')),
+    'queue_size': 1000,
+    'roster_ttl': int(os.getenv('ADMIN_ROSTER_TTL', '300')),  # секунд
+    'dedup_window': int(os.getenv('ADMIN_ALERT_DEDUP_WINDOW', '300'))  # секунд, 0 — без склейки
+}
+
+# Обработка платежных webhook'ов
+PAYMENT_WEBHOOK_CONFIG = {
+    'workers': int(os.getenv('PAYMENT_WEBHOOK_WORKERS', '2')),
+    'max_attempts': 5,
+    'retry_base_delay': 10,  # секунд, удваивается с каждой попыткой
+    'retry_poll_interval': 5,
+    # Через сколько секунд событие, захваченное упавшим процессом, обрабатывается снова
+    'processing_lease': int(os.getenv('PAYMENT_EVENT_LEASE', '300'))
+}
+
+# HTTP API для партнеров
+API_CONFIG = {
+    'enabled': os.getenv('PARTNER_API_ENABLED', 'false').lower() == 'true',
+    'host': os.getenv('PARTNER_API_HOST', '0.0.0.0'),
+    'port': int(os.getenv('PARTNER_API_PORT', '8081')),
+    'catalog_cache_ttl': int(os.getenv('PARTNER_API_CACHE_TTL', '30')),
+    'keys_reload_interval': 60,
+    'max_page_size': 100
+}
+
+# Настройки веб-панели
+WEB_ADMIN_CONFIG = {
+    'dashboard_refresh_interval': int(os.getenv('DASHBOARD_REFRESH_INTERVAL', '30'))
+}
+
 # Контактная информация
 CONTACT_INFO = {
     'support_phone': os.getenv('SUPPORT_PHONE', '+998901234567'),
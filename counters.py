@@ -0,0 +1,163 @@
+"""
+Отложенная пакетная запись счетчиков популярности товаров
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+from metrics import metrics
+
+# Счетчик -> (колонка products, колонка product_views_daily)
+COUNTER_COLUMNS = {
+    'views': ('views', 'views'),
+    'sales': ('sales_count', 'sales'),
+}
+
+
+class CounterAggregator:
+    """Инкременты счетчиков копятся в памяти и пишутся пачкой.
+
+    add() — обновление dict под блокировкой, без обращения к БД. Фоновый
+    поток раз в flush_interval секунд забирает накопленное и пишет в одной
+    транзакции executemany на счетчик (UPDATE products SET views = views + ?),
+    а при daily_stats — еще и суммы по дням в product_views_daily. Поэтому показ
+    карточки товара больше не конкурирует за блокировку записи SQLite
+    с оформлением заказов. Значения в products отстают от реальных не
+    более чем на flush_interval; при завершении процесса остаток
+    записывается синхронно, при ошибке записи инкременты возвращаются
+    в буфер до следующей попытки.
+    """
+
+    def __init__(self, db, flush_interval=5, daily_stats=True):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.daily_stats = daily_stats
+        # (product_id, день) -> {счетчик: приращение}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stats = {'increments': 0, 'flushes': 0, 'rows_written': 0, 'failed': 0}
+        self.running = True
+
+        self.worker = threading.Thread(target=self.flush_worker, name="product-counters", daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+
+    def add(self, product_id, counter='views', amount=1):
+        """Отложенное увеличение счетчика товара"""
+        if counter not in COUNTER_COLUMNS:
+            raise ValueError(f"Неизвестный счетчик: {counter}")
+        key = (product_id, date.today().isoformat())
+        with self.lock:
+            counters = self.pending.get(key)
+            if counters is None:
+                counters = self.pending[key] = {}
+            counters[counter] = counters.get(counter, 0) + amount
+            self.stats['increments'] += 1
+
+    def flush_worker(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            if self.pending:
+                self.flush()
+
+    def flush(self):
+        """Запись накопленных приращений"""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return True
+
+            started = time.perf_counter()
+            ok = self.write(pending)
+            if ok:
+                self.stats['flushes'] += 1
+            else:
+                self.stats['failed'] += 1
+                self.restore(pending)
+            metrics.observe_job('product_counters_flush', time.perf_counter() - started)
+            return ok
+
+    def write(self, pending):
+        """Все счетчики и дневная статистика — одной транзакцией: пачка пишется целиком или никак"""
+        # Итоги по товарам (все дни вместе) для products
+        totals = {}
+        for (product_id, day), counters in pending.items():
+            product_totals = totals.setdefault(product_id, {})
+            for counter, amount in counters.items():
+                product_totals[counter] = product_totals.get(counter, 0) + amount
+
+        statements = []
+        for counter, (column, _) in COUNTER_COLUMNS.items():
+            rows = [(values[counter], product_id) for product_id, values in totals.items() if values.get(counter)]
+            statements.append((f'UPDATE products SET {column} = COALESCE({column}, 0) + ? WHERE id = ?', rows))
+
+        if self.daily_stats:
+            rows = [
+                (product_id, day, counters.get('views', 0), counters.get('sales', 0))
+                for (product_id, day), counters in pending.items()
+            ]
+            statements.append(('''
+                INSERT INTO product_views_daily (product_id, day, views, sales)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (product_id, day) DO UPDATE SET
+                    views = product_views_daily.views + excluded.views,
+                    sales = product_views_daily.sales + excluded.sales
+            ''', rows))
+
+        written = self.db.execute_batch(statements)
+        if written is None:
+            logging.info("Ошибка записи счетчиков товаров")
+            return False
+        self.stats['rows_written'] += written
+        return True
+
+    def restore(self, pending):
+        """Возврат неудачно записанных приращений в буфер"""
+        with self.lock:
+            for key, counters in pending.items():
+                current = self.pending.setdefault(key, {})
+                for counter, amount in counters.items():
+                    current[counter] = current.get(counter, 0) + amount
+
+    def close(self):
+        """Остановка фонового потока и запись остатка"""
+        if not self.running:
+            return
+        self.running = False
+        self.flush()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, pending=len(self.pending))
+
+
+_aggregators = {}
+_aggregators_lock = threading.Lock()
+
+
+def get_counter_aggregator(db):
+    """Общий агрегатор счетчиков для базы данных (по пути SQLite или URL Postgres).
+
+    Новые экземпляры DatabaseManager той же базы получают тот же агрегатор,
+    а не еще один поток записи и обработчик atexit.
+    """
+    key = (db.driver, db.db_url if db.driver == 'postgres' else os.path.abspath(db.db_path))
+    with _aggregators_lock:
+        aggregator = _aggregators.get(key)
+        if aggregator is None:
+            try:
+                from config import DATABASE_CONFIG
+            except Exception:
+                DATABASE_CONFIG = {}
+            aggregator = CounterAggregator(
+                db,
+                flush_interval=DATABASE_CONFIG.get('counter_flush_interval', 5),
+                daily_stats=DATABASE_CONFIG.get('product_views_daily', True)
+            )
+            _aggregators[key] = aggregator
+        return aggregator
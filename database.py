@@ -4,8 +4,15 @@
 import logging
 
 import sqlite3
-import os, re, contextlib
+import os, re, contextlib, time
+from datetime import datetime
 from config import DATABASE_URL, DATABASE_PATH
+from metrics import metrics
+from query_profiler import get_profiler
+from counters import get_counter_aggregator
+from migrations import migrate
+
+logger = logging.getLogger(__name__)
 
 DRIVER = 'postgres' if (DATABASE_URL and DATABASE_URL.startswith(('postgres://','postgresql://'))) else 'sqlite'
 
@@ -43,48 +50,22 @@ class DatabaseManager:
                 os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
             except Exception:
                 pass
+        self.profiler = None
         self.init_database()
+        # Профилирование запросов (DB_PROFILING=true)
+        self.profiler = get_profiler(self)
     def _connect(self):
         if self.driver == 'postgres':
             return psycopg2.connect(self.db_url)
         return sqlite3.connect(self.db_path)
 
     def init_database(self):
-        # Обновление схемы: роль пользователя
-        try:
-            conn_alter = self._connect()
-            cur_alter = conn_alter.cursor()
-            cur_alter.execute("ALTER TABLE users ADD COLUMN role TEXT")
-            conn_alter.commit()
-        except Exception:
-            pass
-        finally:
-            try:
-                conn_alter.close()
-            except Exception:
-                pass
+        """Инициализация базы данных: недостающие миграции (migrations.py).
 
-        """Инициализация базы данных"""
-        try:
-            conn = self._connect()
-            cursor = conn.cursor()
-            
-            # Создаем все таблицы
-            self.create_tables(cursor)
-            
-            # Создаем тестовые данные если база пустая
-            if self.is_database_empty(cursor):
-                self.create_test_data(cursor)
-            
-            conn.commit()
-            
-        except Exception as e:
-            logging.info(f"Ошибка инициализации базы данных: {e}")
-            if 'conn' in locals():
-                conn.rollback()
-        finally:
-            if 'conn' in locals():
-                conn.close()
+        Повторное создание DatabaseManager в том же процессе не обращается к БД,
+        первое — читает одну версию из schema_version.
+        """
+        migrate(self)
     
     def create_tables(self, cursor):
         """Создание всех таблиц"""
@@ -135,6 +116,13 @@ CREATE TABLE IF NOT EXISTS products (
     original_price REAL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    rating_sum INTEGER DEFAULT 0,
+    rating_count INTEGER DEFAULT 0,
+    rating_1 INTEGER DEFAULT 0,
+    rating_2 INTEGER DEFAULT 0,
+    rating_3 INTEGER DEFAULT 0,
+    rating_4 INTEGER DEFAULT 0,
+    rating_5 INTEGER DEFAULT 0,
     FOREIGN KEY (category_id) REFERENCES categories (id),
     FOREIGN KEY (subcategory_id) REFERENCES subcategories (id)
 )
@@ -442,6 +430,56 @@ CREATE TABLE IF NOT EXISTS security_blocks (
 )
         ''')
         
+        # Взвешенные правила спам-фильтра
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS spam_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    weight INTEGER DEFAULT 1,
+    is_active INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+        ''')
+        
+        # Статистика профилировщика запросов
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS query_profile (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    count INTEGER DEFAULT 0,
+    total_ms REAL DEFAULT 0,
+    p95_ms REAL DEFAULT 0,
+    max_ms REAL DEFAULT 0,
+    rows_total INTEGER DEFAULT 0,
+    plan TEXT,
+    updated_at TIMESTAMP,
+    UNIQUE (source, fingerprint)
+)
+        ''')
+        
+        # Состояния диалогов (SESSION_BACKEND=sql)
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS user_sessions (
+    session_key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+        ''')
+        
+        # Просмотры и продажи товаров по дням (пишет CounterAggregator)
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS product_views_daily (
+    product_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    views INTEGER DEFAULT 0,
+    sales INTEGER DEFAULT 0,
+    PRIMARY KEY (product_id, day),
+    FOREIGN KEY (product_id) REFERENCES products (id)
+)
+        ''')
+        
         # API ключи
         cursor.execute('''
 CREATE TABLE IF NOT EXISTS api_keys (
@@ -470,6 +508,25 @@ CREATE TABLE IF NOT EXISTS webhook_logs (
 )
         ''')
         
+        # Входящие платежные события (идемпотентность webhook'ов)
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS payment_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    event_type TEXT,
+    order_id INTEGER,
+    payload TEXT,
+    status TEXT DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP,
+    UNIQUE (provider, event_id)
+)
+        ''')
+        
         # Маркетинговые кампании
         cursor.execute('''
 CREATE TABLE IF NOT EXISTS marketing_campaigns (
@@ -579,6 +636,39 @@ CREATE TABLE IF NOT EXISTS post_statistics (
 )
         ''')
         
+        # Рассылки постов
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS post_deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER,
+    time_period TEXT,
+    message_text TEXT NOT NULL,
+    image_url TEXT,
+    keyboard_json TEXT,
+    status TEXT DEFAULT 'running',
+    total_count INTEGER DEFAULT 0,
+    sent_count INTEGER DEFAULT 0,
+    error_count INTEGER DEFAULT 0,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (post_id) REFERENCES scheduled_posts (id)
+)
+        ''')
+        
+        # Очередь доставки постов по получателям
+        cursor.execute('''
+CREATE TABLE IF NOT EXISTS post_delivery_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    delivery_id INTEGER NOT NULL,
+    telegram_id INTEGER NOT NULL,
+    status TEXT DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    error_message TEXT,
+    sent_at TIMESTAMP,
+    FOREIGN KEY (delivery_id) REFERENCES post_deliveries (id)
+)
+        ''')
+        
         # Создаем индексы для оптимизации
         self.create_indexes(cursor)
     
@@ -587,14 +677,25 @@ CREATE TABLE IF NOT EXISTS post_statistics (
         indexes = [
             'CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)',
             'CREATE INDEX IF NOT EXISTS idx_products_category ON products(category_id)',
+            'CREATE INDEX IF NOT EXISTS idx_products_subcategory ON products(subcategory_id)',
+            'CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)',
+            'CREATE INDEX IF NOT EXISTS idx_categories_name ON categories(name)',
+            'CREATE INDEX IF NOT EXISTS idx_subcategories_name ON subcategories(name)',
             'CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id)',
             'CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)',
+            'CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at)',
             'CREATE INDEX IF NOT EXISTS idx_cart_user ON cart(user_id)',
             'CREATE INDEX IF NOT EXISTS idx_reviews_product ON reviews(product_id)',
             'CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id)',
+            'CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications(user_id, is_read)',
             'CREATE INDEX IF NOT EXISTS idx_inventory_movements_product ON inventory_movements(product_id)',
             'CREATE INDEX IF NOT EXISTS idx_security_logs_user ON security_logs(user_id)',
-            'CREATE INDEX IF NOT EXISTS idx_automation_executions_user ON automation_executions(user_id)'
+            'CREATE INDEX IF NOT EXISTS idx_security_blocks_until ON security_blocks(blocked_until)',
+            'CREATE INDEX IF NOT EXISTS idx_security_blocks_user ON security_blocks(user_id, blocked_until)',
+            'CREATE INDEX IF NOT EXISTS idx_automation_executions_user ON automation_executions(user_id)',
+            'CREATE INDEX IF NOT EXISTS idx_post_delivery_queue_delivery ON post_delivery_queue(delivery_id, status)',
+            'CREATE INDEX IF NOT EXISTS idx_payment_events_status ON payment_events(status, next_attempt_at)',
+            'CREATE INDEX IF NOT EXISTS idx_user_sessions_expires ON user_sessions(expires_at)'
         ]
         
         for index_sql in indexes:
@@ -716,6 +817,9 @@ CREATE TABLE IF NOT EXISTS post_statistics (
         INSERT -> lastrowid (int)
         UPDATE/DELETE -> rowcount (int)
         """
+        started = time.perf_counter()
+        failed = False
+        rows = 0
         try:
             conn = self._connect()
             cursor = conn.cursor()
@@ -726,6 +830,7 @@ CREATE TABLE IF NOT EXISTS post_statistics (
             q = query.strip().upper()
             if q.startswith('SELECT'):
                 result = cursor.fetchall()
+                rows = len(result)
             else:
                 conn.commit()
                 op = q.split()[0]
@@ -733,13 +838,137 @@ CREATE TABLE IF NOT EXISTS post_statistics (
                     result = cursor.lastrowid
                 else:
                     result = cursor.rowcount
+                rows = cursor.rowcount
             return result
         except Exception as e:
+            failed = True
             logging.info(f"Ошибка выполнения запроса: {e}")
             return None
         finally:
             if 'conn' in locals():
                 conn.close()
+            duration = time.perf_counter() - started
+            metrics.observe_db(query, duration, failed)
+            if self.profiler:
+                self.profiler.record(query, params, duration, rows)
+
+    def execute_many(self, query, params_list):
+        """Пакетное выполнение запроса в одной транзакции. Возвращает число строк"""
+        if not params_list:
+            return 0
+        started = time.perf_counter()
+        failed = False
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.executemany(query, params_list)
+            conn.commit()
+            return len(params_list)
+        except Exception as e:
+            failed = True
+            logging.info(f"Ошибка пакетного выполнения запроса: {e}")
+            return None
+        finally:
+            if 'conn' in locals():
+                conn.close()
+            duration = time.perf_counter() - started
+            metrics.observe_db(query, duration, failed)
+            if self.profiler:
+                self.profiler.record(query, None, duration, len(params_list))
+
+    def execute_batch(self, statements):
+        """Несколько пакетных запросов [(запрос, строки)] в одной транзакции. Число строк или None"""
+        statements = [(query, rows) for query, rows in statements if rows]
+        if not statements:
+            return 0
+        started = time.perf_counter()
+        failed = False
+        total = sum(len(rows) for _, rows in statements)
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            for query, rows in statements:
+                cursor.executemany(query, rows)
+            conn.commit()
+            return total
+        except Exception as e:
+            failed = True
+            logging.info(f"Ошибка пакетного выполнения запросов: {e}")
+            if 'conn' in locals():
+                conn.rollback()
+            return None
+        finally:
+            if 'conn' in locals():
+                conn.close()
+            duration = time.perf_counter() - started
+            for query, rows in statements:
+                metrics.observe_db(query, duration / len(statements), failed)
+                if self.profiler:
+                    self.profiler.record(query, None, duration / len(statements), len(rows))
+
+    def claim_delivery_rows(self, delivery_id, limit):
+        """Захват пачки строк рассылки (pending -> queued); [(id, telegram_id)] или None.
+
+        Выборка и UPDATE идут в одной транзакции под блокировкой записи,
+        поэтому одну строку не может захватить второй загрузчик. Время
+        захвата (claimed_at) позволяет вернуть строки упавшего процесса.
+        """
+        try:
+            conn = self._connect()
+            if self.driver == 'sqlite':
+                conn.isolation_level = None
+                conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            cursor.execute(_convert_placeholders('''
+                SELECT id, telegram_id FROM post_delivery_queue
+                WHERE delivery_id = ? AND status = 'pending'
+                ORDER BY id
+                LIMIT ?
+            ''' + (' FOR UPDATE SKIP LOCKED' if self.driver == 'postgres' else '')), (delivery_id, limit))
+            rows = cursor.fetchall()
+            if rows:
+                placeholders = ', '.join('?' for _ in rows)
+                cursor.execute(_convert_placeholders(f'''
+                    UPDATE post_delivery_queue SET status = 'queued', claimed_at = ?
+                    WHERE id IN ({placeholders}) AND status = 'pending'
+                '''), [time.time()] + [row[0] for row in rows])
+            conn.commit()
+            return rows
+        except Exception as e:
+            logging.info(f"Ошибка захвата строк рассылки {delivery_id}: {e}")
+            if 'conn' in locals():
+                conn.rollback()
+            return None
+        finally:
+            if 'conn' in locals():
+                conn.close()
+
+    def record_payment_event(self, provider, event_id, event_type, order_id, payload, status='pending'):
+        """Сохранение платежного события. (id, True) для нового, (None, False) для повтора"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute(_convert_placeholders('''
+                INSERT INTO payment_events (
+                    provider, event_id, event_type, order_id, payload, status, next_attempt_at, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (provider, event_id) DO NOTHING
+            '''), (provider, event_id, event_type, order_id, payload, status, now, now))
+            conn.commit()
+            if cursor.rowcount != 1:
+                return None, False
+            cursor.execute(
+                _convert_placeholders('SELECT id FROM payment_events WHERE provider = ? AND event_id = ?'),
+                (provider, event_id)
+            )
+            return cursor.fetchone()[0], True
+        except Exception as e:
+            logging.info(f"Ошибка записи платежного события: {e}")
+            return None, None
+        finally:
+            if 'conn' in locals():
+                conn.close()
 
     def get_user_by_telegram_id(self, telegram_id):
         """Получение пользователя по telegram_id"""
@@ -811,7 +1040,7 @@ CREATE TABLE IF NOT EXISTS post_statistics (
     
     def add_to_cart(self, user_id, product_id, quantity=1):
         """Добавление товара в корзину"""
-        logging.info(f"DEBUG: add_to_cart вызван с user_id={user_id}, product_id={product_id}, quantity={quantity}")
+        logger.debug("add_to_cart: user_id=%s product_id=%s quantity=%s", user_id, product_id, quantity)
         
         # Проверяем наличие товара
         product = self.execute_query(
@@ -819,10 +1048,10 @@ CREATE TABLE IF NOT EXISTS post_statistics (
             (product_id,)
         )
         
-        logging.info(f"DEBUG: Товар в базе: {product}")
+        logger.debug("add_to_cart: товар в базе %s", product)
         
         if not product or product[0][0] < quantity:
-            logging.info(f"DEBUG: Товар недоступен или недостаточно на складе")
+            logger.debug("add_to_cart: товар недоступен или недостаточно на складе")
             return None
         
         # Проверяем, есть ли уже товар в корзине
@@ -831,14 +1060,14 @@ CREATE TABLE IF NOT EXISTS post_statistics (
             (user_id, product_id)
         )
         
-        logging.info(f"DEBUG: Существующий товар в корзине: {existing}")
+        logger.debug("add_to_cart: существующая строка корзины %s", existing)
         
         if existing:
             # Обновляем количество
             new_quantity = existing[0][1] + quantity
             # Проверяем не превышает ли новое количество остаток
             if new_quantity > product[0][0]:
-                logging.info(f"DEBUG: Новое количество {new_quantity} превышает остаток {product[0][0]}")
+                logger.debug("add_to_cart: количество %s превышает остаток %s", new_quantity, product[0][0])
                 return None
             
             # Обновляем количество и время
@@ -846,7 +1075,7 @@ CREATE TABLE IF NOT EXISTS post_statistics (
                 'UPDATE cart SET quantity = ?, created_at = CURRENT_TIMESTAMP WHERE id = ?',
                 (new_quantity, existing[0][0])
             )
-            logging.info(f"DEBUG: Обновление количества в корзине: {result}")
+            logger.debug("add_to_cart: обновление количества %s", result)
             return existing[0][0]  # Возвращаем ID записи корзины
         else:
             # Добавляем новый товар
@@ -854,7 +1083,7 @@ CREATE TABLE IF NOT EXISTS post_statistics (
                 'INSERT INTO cart (user_id, product_id, quantity) VALUES (?, ?, ?)',
                 (user_id, product_id, quantity)
             )
-            logging.info(f"DEBUG: Добавление нового товара в корзину: {result}")
+            logger.debug("add_to_cart: новая строка корзины %s", result)
             return result
     
     def get_cart_items(self, user_id):
@@ -888,7 +1117,36 @@ CREATE TABLE IF NOT EXISTS post_statistics (
                 INSERT INTO order_items (order_id, product_id, quantity, price)
                 VALUES (?, ?, ?, ?)
             ''', (order_id, item[5], item[3], item[2]))  # product_id, quantity, price
+            get_counter_aggregator(self).add(item[5], 'sales', item[3])
     
+    def place_order(self, user_id, total_amount, delivery_address, payment_method, items, latitude=None, longitude=None):
+        """Заказ и его позиции [(product_id, quantity, price)] одной транзакцией; id заказа или None"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(_convert_placeholders('''
+                INSERT INTO orders (user_id, total_amount, delivery_address, payment_method, latitude, longitude)
+                VALUES (?, ?, ?, ?, ?, ?)
+            '''), (user_id, total_amount, delivery_address, payment_method, latitude, longitude))
+            order_id = cursor.lastrowid
+            cursor.executemany(_convert_placeholders('''
+                INSERT INTO order_items (order_id, product_id, quantity, price)
+                VALUES (?, ?, ?, ?)
+            '''), [(order_id, product_id, quantity, price) for product_id, quantity, price in items])
+            conn.commit()
+        except Exception as e:
+            logging.info(f"Ошибка создания заказа: {e}")
+            if 'conn' in locals():
+                conn.rollback()
+            return None
+        finally:
+            if 'conn' in locals():
+                conn.close()
+        # Продажи — через тот же агрегатор счетчиков, что и в add_order_items
+        for product_id, quantity, price in items:
+            get_counter_aggregator(self).add(product_id, 'sales', quantity)
+        return order_id
+
     def get_user_orders(self, user_id):
         """Получение заказов пользователя"""
         return self.execute_query('''
@@ -935,21 +1193,87 @@ CREATE TABLE IF NOT EXISTS post_statistics (
         ''', (f'%{query}%', f'%{query}%', limit))
     
     def add_review(self, user_id, product_id, rating, comment):
-        """Добавление отзыва"""
-        return self.execute_query('''
-            INSERT INTO reviews (user_id, product_id, rating, comment)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, product_id, rating, comment))
+        """Добавление отзыва с обновлением агрегатов рейтинга товара"""
+        try:
+            rating = int(rating)
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(_convert_placeholders('''
+                INSERT INTO reviews (user_id, product_id, rating, comment)
+                VALUES (?, ?, ?, ?)
+            '''), (user_id, product_id, rating, comment))
+            review_id = cursor.lastrowid
+            self.apply_rating_delta(cursor, product_id, rating, 1)
+            conn.commit()
+            return review_id
+        except Exception as e:
+            logging.info(f"Ошибка добавления отзыва: {e}")
+            if 'conn' in locals():
+                conn.rollback()
+            return None
+        finally:
+            if 'conn' in locals():
+                conn.close()
     
-    def get_product_reviews(self, product_id):
-        """Получение отзывов на товар"""
-        return self.execute_query('''
+    def delete_review(self, review_id):
+        """Удаление отзыва с обновлением агрегатов рейтинга товара"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(_convert_placeholders('SELECT product_id, rating FROM reviews WHERE id = ?'), (review_id,))
+            review = cursor.fetchone()
+            if not review:
+                return 0
+            cursor.execute(_convert_placeholders('DELETE FROM reviews WHERE id = ?'), (review_id,))
+            self.apply_rating_delta(cursor, review[0], review[1], -1)
+            conn.commit()
+            return 1
+        except Exception as e:
+            logging.info(f"Ошибка удаления отзыва: {e}")
+            if 'conn' in locals():
+                conn.rollback()
+            return None
+        finally:
+            if 'conn' in locals():
+                conn.close()
+    
+    def apply_rating_delta(self, cursor, product_id, rating, delta):
+        """Инкрементальное изменение суммы, количества и гистограммы оценок"""
+        if rating not in (1, 2, 3, 4, 5):
+            raise ValueError(f"Недопустимая оценка: {rating}")
+        cursor.execute(_convert_placeholders(f'''
+            UPDATE products SET
+                rating_sum = rating_sum + ?,
+                rating_count = rating_count + ?,
+                rating_{rating} = rating_{rating} + ?
+            WHERE id = ?
+        '''), (rating * delta, delta, delta, product_id))
+    
+    def get_product_rating(self, product_id):
+        """Средняя оценка, число отзывов и гистограмма {1..5: count} без чтения отзывов"""
+        result = self.execute_query('''
+            SELECT rating_sum, rating_count, rating_1, rating_2, rating_3, rating_4, rating_5
+            FROM products WHERE id = ?
+        ''', (product_id,))
+        if not result:
+            return 0, 0, {}
+        rating_sum, rating_count = result[0][0] or 0, result[0][1] or 0
+        histogram = {star: result[0][star + 1] or 0 for star in range(1, 6)}
+        avg_rating = rating_sum / rating_count if rating_count else 0
+        return avg_rating, rating_count, histogram
+    
+    def get_product_reviews(self, product_id, limit=None, offset=0):
+        """Получение отзывов на товар (постранично, если задан limit)"""
+        query = '''
             SELECT r.rating, r.comment, r.created_at, u.name
             FROM reviews r
             JOIN users u ON r.user_id = u.id
             WHERE r.product_id = ?
             ORDER BY r.created_at DESC
-        ''', (product_id,))
+        '''
+        if limit is None:
+            return self.execute_query(query, (product_id,))
+        return self.execute_query(query + ' LIMIT ? OFFSET ?', (product_id, limit, offset))
     
     def add_to_favorites(self, user_id, product_id):
         """Добавление в избранное"""
@@ -996,6 +1320,33 @@ CREATE TABLE IF NOT EXISTS post_statistics (
             (notification_id,)
         )
     
+    def count_notifications(self, user_id):
+        """Всего уведомлений пользователя и непрочитанных из них"""
+        result = self.execute_query('''
+            SELECT COUNT(*), COALESCE(SUM(CASE WHEN is_read = 0 THEN 1 ELSE 0 END), 0)
+            FROM notifications WHERE user_id = ?
+        ''', (user_id,))
+        return (result[0][0], result[0][1]) if result else (0, 0)
+    
+    def get_notifications_page(self, user_id, limit, offset=0):
+        """Страница уведомлений, новые первыми (порядок по id не сдвигается при прочтении)"""
+        return self.execute_query('''
+            SELECT * FROM notifications
+            WHERE user_id = ?
+            ORDER BY id DESC
+            LIMIT ? OFFSET ?
+        ''', (user_id, limit, offset))
+    
+    def mark_notifications_read(self, user_id, notification_ids):
+        """Отметка нескольких уведомлений как прочитанных одним UPDATE"""
+        if not notification_ids:
+            return 0
+        placeholders = ', '.join('?' for _ in notification_ids)
+        return self.execute_query(
+            f'UPDATE notifications SET is_read = 1 WHERE user_id = ? AND is_read = 0 AND id IN ({placeholders})',
+            (user_id, *notification_ids)
+        )
+    
     def get_user_loyalty_points(self, user_id):
         """Получение баллов лояльности"""
         result = self.execute_query(
@@ -1041,11 +1392,18 @@ CREATE TABLE IF NOT EXISTS post_statistics (
             )
     
     def increment_product_views(self, product_id):
-        """Увеличение счетчика просмотров товара"""
-        return self.execute_query(
-            'UPDATE products SET views = views + 1 WHERE id = ?',
-            (product_id,)
-        )
+        """Увеличение счетчика просмотров товара (запись пачкой в фоне, см. counters.py)"""
+        get_counter_aggregator(self).add(product_id, 'views')
+        return True
+    
+    def get_product_views_trend(self, product_id, days=30):
+        """Просмотры и продажи товара по дням: [(day, views, sales)]"""
+        return self.execute_query('''
+            SELECT day, views, sales FROM product_views_daily
+            WHERE product_id = ?
+            ORDER BY day DESC
+            LIMIT ?
+        ''', (product_id, days))
     
     def get_popular_products(self, limit=10):
         """Получение популярных товаров"""
@@ -1062,13 +1420,3 @@ CREATE TABLE IF NOT EXISTS post_statistics (
             'UPDATE users SET language = ? WHERE id = ?',
             (language, user_id)
         )
-
-# Миграция: добавить колонки для координат заказа, если их нет
-try:
-    cols = [r[1] for r in cursor.execute("PRAGMA table_info(orders)").fetchall()]
-    if 'latitude' not in cols:
-        cursor.execute("ALTER TABLE orders ADD COLUMN latitude REAL")
-    if 'longitude' not in cols:
-        cursor.execute("ALTER TABLE orders ADD COLUMN longitude REAL")
-except Exception as _:
-    pass
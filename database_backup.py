@@ -13,11 +13,12 @@ from config import DATABASE_CONFIG
 from logger import logger
 
 class DatabaseBackup:
-    def __init__(self, db_path):
+    def __init__(self, db_path, start=True):
         self.db_path = db_path
         self.backup_dir = 'backups'
         os.makedirs(self.backup_dir, exist_ok=True)
-        self.start_backup_scheduler()
+        if start:
+            self.start_backup_scheduler()
     
     def start_backup_scheduler(self):
         """Запуск планировщика резервного копирования"""
@@ -0,0 +1,143 @@
+"""
+Локальная имитация Telegram Bot API для ручной и автоматической проверки бота
+
+Пример:
+    api = FakeTelegramAPI()
+    api.start()
+    os.environ['TELEGRAM_API_URL'] = api.base_url   # до импорта config
+    ...запустить бота в режиме webhook...
+    api.push_update({'update_id': 1, 'message': {...}})
+    api.wait_for_calls('sendMessage', 1)
+"""
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegramAPI:
+    """Записывает вызовы методов бота и доставляет обновления на его webhook"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.calls = []
+        self.calls_lock = threading.Condition()
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.pending_updates = []
+        self.message_ids = itertools.count(1)
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), self.create_handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def handle_method(self, method, params):
+        """Ответ на вызов Bot API"""
+        with self.calls_lock:
+            self.calls.append((method, params))
+            self.calls_lock.notify_all()
+
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url')
+            self.webhook_secret = params.get('secret_token')
+            return True
+        if method == 'deleteWebhook':
+            self.webhook_url = None
+            return True
+        if method == 'getWebhookInfo':
+            return {'url': self.webhook_url or '', 'pending_update_count': 0}
+        if method == 'getUpdates':
+            updates, self.pending_updates = self.pending_updates, []
+            return updates
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        if method in ('sendMessage', 'sendPhoto', 'editMessageText', 'editMessageMedia'):
+            return {
+                'message_id': next(self.message_ids),
+                'chat': {'id': params.get('chat_id')},
+                'date': int(time.time()),
+                'text': params.get('text') or params.get('caption', '')
+            }
+        return True
+
+    def push_update(self, update):
+        """Отправка обновления на зарегистрированный webhook (или в очередь getUpdates)"""
+        if not self.webhook_url:
+            self.pending_updates.append(update)
+            return None
+
+        headers = {'Content-Type': 'application/json'}
+        if self.webhook_secret:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.webhook_secret
+        request = urllib.request.Request(
+            self.webhook_url, data=json.dumps(update).encode('utf-8'), headers=headers, method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+
+    def get_calls(self, method=None):
+        with self.calls_lock:
+            return [call for call in self.calls if method is None or call[0] == method]
+
+    def wait_for_calls(self, method, count, timeout=5):
+        """Ожидание, пока бот сделает count вызовов method"""
+        deadline = time.time() + timeout
+        with self.calls_lock:
+            while len([call for call in self.calls if call[0] == method]) < count:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.calls_lock.wait(remaining)
+        return True
+
+    def create_handler(self):
+        api = self
+
+        class FakeAPIHandler(BaseHTTPRequestHandler):
+            def handle_request(self, body):
+                # /bot<token>/<method>
+                parsed = urllib.parse.urlparse(self.path)
+                method = parsed.path.rsplit('/', 1)[-1]
+                params = dict(urllib.parse.parse_qsl(parsed.query))
+                if body:
+                    if self.headers.get('Content-Type', '').startswith('application/json'):
+                        params.update(json.loads(body))
+                    else:
+                        params.update(urllib.parse.parse_qsl(body))
+
+                result = api.handle_method(method, params)
+                response = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(response)
+
+            def do_GET(self):
+                self.handle_request('')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.handle_request(self.rfile.read(length).decode('utf-8'))
+
+            def log_message(self, format, *args):
+                pass
+
+        return FakeAPIHandler
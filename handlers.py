@@ -12,16 +12,23 @@ from keyboards import (
     create_confirmation_keyboard, create_search_filters_keyboard,
     create_price_filter_keyboard, create_rating_keyboard,
     create_order_details_keyboard, create_language_keyboard,
-    create_payment_methods_keyboard, create_cart_item_keyboard
+    create_payment_methods_keyboard, create_categories_inline_keyboard,
+    create_subcategories_inline_keyboard, create_products_inline_keyboard,
+    create_cart_inline_keyboard
 )
-from keyboards import create_product_inline_keyboard_with_qty
+from keyboards import create_product_inline_keyboard_with_qty, get_catalog_label_map, keyboard_cache
 from utils import (
     format_price, format_date, validate_email, validate_phone,
     truncate_text, create_pagination_keyboard, escape_html,
     calculate_cart_total, format_cart_summary, get_order_status_emoji,
     get_order_status_text, create_product_card, create_stars_display
 )
-from localization import t, get_user_language
+from localization import (
+    t, get_user_language, get_session_language, remember_user_language, localization
+)
+from router import Router
+from session_store import get_session_store
+from admin_alerts import get_admin_alerts
 from payments import PaymentProcessor, create_payment_keyboard, format_payment_info
 
 logger = logging.getLogger(__name__)
@@ -30,9 +37,82 @@ class MessageHandler:
     def __init__(self, bot, db):
         self.bot = bot
         self.db = db
-        self.user_states = {}
+        # Состояния диалогов в общем хранилище (SESSION_BACKEND): переживают перезапуск
+        self.user_states = get_session_store(db, 'user_state')
+        self.order_data = get_session_store(db, 'order')
+        self.seller_data = get_session_store(db, 'seller')
+        self.registration_data = get_session_store(db, 'registration')
         self.notification_manager = None
         self.payment_processor = PaymentProcessor()
+        # chat_id -> {подпись кнопки: [тип, id]} последней клавиатуры каталога (с TTL, общее для процессов)
+        self.catalog_labels = get_session_store(db, 'catalog_labels')
+        self.build_routers()
+    
+    def build_routers(self):
+        """Сборка таблиц маршрутов (один раз при создании обработчика)"""
+        self.command_router = Router('commands')
+        self.command_router.add_exact('/start', lambda message, language: self.handle_start_command(message), 'cmd_start')
+        self.command_router.add_exact('/help', lambda message, language: self.handle_help_command(message, language), 'cmd_help')
+        self.command_router.add_exact('/notifications', lambda message, language: self.show_user_notifications(message), 'cmd_notifications')
+        self.command_router.add_prefix('/order_', lambda message, language: self.handle_order_command(message), 'cmd_order')
+        self.command_router.add_prefix('/track_', lambda message, language: self.handle_track_command(message), 'cmd_track')
+        self.command_router.add_prefix('/promo_', lambda message, language: self.handle_promo_command(message), 'cmd_promo')
+        self.command_router.add_prefix('/restore_', lambda message, language: self.handle_restore_command(message), 'cmd_restore')
+        
+        # Кнопки меню: подписи берутся из локализации для всех языков сразу
+        router = Router('buttons')
+        router.add_exact(localization.get_all_texts('btn_catalog') + ['🛍 Перейти в каталог', '🔙 К категориям', '➕ Добавить товары'],
+                         lambda message, language: self.show_catalog(message), 'catalog')
+        router.add_exact(localization.get_all_texts('btn_cart'), lambda message, language: self.show_cart(message), 'cart')
+        router.add_exact(localization.get_all_texts('btn_orders'), lambda message, language: self.show_user_orders(message), 'orders')
+        router.add_exact(localization.get_all_texts('btn_profile'), lambda message, language: self.show_user_profile(message), 'profile')
+        router.add_exact(localization.get_all_texts('btn_search'), lambda message, language: self.start_product_search(message), 'search')
+        router.add_exact(localization.get_all_texts('btn_become_seller'), lambda message, language: self.start_seller_application(message), 'seller')
+        router.add_exact(localization.get_all_texts('btn_help'), lambda message, language: self.handle_help_command(message, language), 'help')
+        router.add_exact(localization.get_all_texts('btn_contact'), lambda message, language: self.handle_contact_request(message, language), 'contact')
+        router.add_exact(localization.get_all_texts('btn_main') + ['🔙 Главная'], lambda message, language: self.show_main_menu(message), 'main_menu')
+        router.add_exact('🌍 Сменить язык', lambda message, language: self.start_language_change(message), 'change_language')
+        router.add_exact('📦 Оформить заказ', lambda message, language: self.start_order_process(message), 'checkout')
+        router.add_exact(['💳 Онлайн оплата', '💵 Наличными при получении'],
+                         lambda message, language: self.handle_payment_method_selection(message), 'payment_method')
+        router.add_exact('🗑 Очистить корзину', lambda message, language: self.clear_user_cart(message), 'clear_cart')
+        
+        # Префиксы кнопок каталога (create_products_keyboard / create_categories_keyboard)
+        router.add_prefix('🛍 ', lambda message, language: self.handle_product_selection(message), 'product')
+        router.add_prefix(['📱 ', '👕 ', '🏠 ', '⚽ ', '💄 ', '📚 '],
+                          lambda message, language: self.handle_category_selection(message), 'category')
+        router.add_prefix(['🍎 ', '✔️ ', '👖 ', '☕ ', '👟 ', '💎 ', '📖 '],
+                          lambda message, language: self.handle_subcategory_selection(message), 'subcategory')
+        self.button_router = router
+        
+        self.callback_router = Router('callbacks')
+        self.callback_router.add_exact('back_to_categories', self.handle_back_to_categories, 'back_to_categories')
+        self.callback_router.add_exact('go_to_cart', self.handle_go_to_cart, 'go_to_cart')
+        self.callback_router.add_exact('checkout', self.handle_checkout, 'checkout')
+        self.callback_router.add_exact(['noop', 'current_page'], lambda callback_query: None, 'noop')
+        self.callback_router.add_exact('cancel_payment', self.handle_cancel_payment, 'cancel_payment')
+        self.callback_router.add_prefix(['back_to_category_', 'open_category_'], self.handle_back_to_category, 'back_to_category')
+        self.callback_router.add_prefix(['back_to_subcategory_', 'open_subcategory_'], self.handle_back_to_subcategory, 'back_to_subcategory')
+        self.callback_router.add_prefix('open_product_', self.handle_open_product, 'open_product')
+        self.callback_router.add_prefix(['qty_inc_', 'qty_dec_'], self.handle_quantity_change, 'quantity')
+        self.callback_router.add_prefix('add_to_cart_', self.handle_add_to_cart, 'add_to_cart')
+        self.callback_router.add_prefix('add_to_favorites_', self.handle_add_to_favorites, 'add_to_favorites')
+        self.callback_router.add_prefix('reviews_', self.handle_show_reviews, 'reviews')
+        self.callback_router.add_prefix('notifications_page_', self.handle_notifications_page, 'notifications_page')
+        self.callback_router.add_prefix('rate_product_', self.handle_rate_product, 'rate_product')
+        self.callback_router.add_prefix('cart_', self.handle_cart_action, 'cart_action')
+        self.callback_router.add_prefix('pay_', self.handle_payment_selection, 'payment')
+    
+    def get_language(self, message):
+        """Язык автора сообщения (определенный в handle_message или из сессии)"""
+        return message.get('_language') or get_user_language(self.db, message['from']['id'])
+    
+    def get_route_stats(self):
+        """Счетчики маршрутов по всем таблицам"""
+        return {
+            router.name: router.get_stats()
+            for router in (self.command_router, self.button_router, self.callback_router)
+        }
     
     def handle_message(self, message):
         """Главный обработчик сообщений"""
@@ -41,94 +121,40 @@ class MessageHandler:
             chat_id = message['chat']['id']
             telegram_id = message['from']['id']
             
-            # Проверяем регистрацию пользователя
-            user_data = self.db.get_user_by_telegram_id(telegram_id)
+            # Язык из сессии: он есть только у зарегистрированных, поэтому
+            # запрос пользователя нужен лишь при первом сообщении
+            user_language = get_session_language(self.db, telegram_id)
+            if user_language is None:
+                user_data = self.db.get_user_by_telegram_id(telegram_id)
+                
+                if not user_data and text != '/start':
+                    self.send_registration_prompt(chat_id)
+                    return
+                
+                user_language = 'ru'
+                if user_data:
+                    user_language = user_data[0][5] or 'ru'
+                    remember_user_language(self.db, telegram_id, user_language)
             
-            if not user_data and text != '/start':
-                self.send_registration_prompt(chat_id)
-                return
+            # Язык определяется один раз на обновление
+            message['_language'] = user_language
             
-            # Получаем язык пользователя
-            user_language = 'ru'
-            if user_data:
-                user_language = user_data[0][5] or 'ru'
-            
-            # Обрабатываем команды
-            if text == '/start':
-                self.handle_start_command(message)
-            elif text == '/help':
-                self.handle_help_command(message, user_language)
-            elif text.startswith('/order_'):
-                self.handle_order_command(message)
-            elif text.startswith('/track_'):
-                self.handle_track_command(message)
-            elif text.startswith('/promo_'):
-                self.handle_promo_command(message)
-            elif text.startswith('/restore_'):
-                self.handle_restore_command(message)
-            elif text == '/notifications':
-                self.show_user_notifications(message)
+            # Команды имеют приоритет над состояниями пользователя
+            if self.command_router.dispatch(text, message, user_language):
+                return
             
             # Обрабатываем состояния пользователя
-            elif telegram_id in self.user_states:
-                self.handle_user_state(message)
-            
-            # Обрабатываем кнопки меню
-            elif text in ['🛍 Каталог', '🛍 Katalog', '🛍 Перейти в каталог']:
-                self.show_catalog(message)
-            elif text == '🔙 К категориям':
-                self.show_catalog(message)
-            elif text.startswith('🛍 '):
-                self.handle_product_selection(message)
-            elif text in ['🛒 Корзина', '🛒 Savat']:
-                self.show_cart(message)
-            elif text in ['📋 Мои заказы', '📋 Mening buyurtmalarim']:
-                self.show_user_orders(message)
-            elif text in ['👤 Профиль', '👤 Profil']:
-                self.show_user_profile(message)
-            elif text in ['🔍 Поиск', '🔍 Qidiruv']:
-                self.start_product_search(message)
-            elif text in ['🧑‍💼 Стать продавцом', "🧑‍💼 Sotuvchi bo'lish"]:
-                self.start_seller_application(message)
-            elif text in ['ℹ️ Помощь', 'ℹ️ Yordam']:
-                self.handle_help_command(message, user_language)
-            elif text in ['📞 Связаться с нами', '📞 Biz bilan bog\'lanish']:
-                self.handle_contact_request(message, user_language)
-            elif text == '🔙 Главная' or text == '🏠 Главная' or text == '🏠 Bosh sahifa':
-                self.show_main_menu(message)
-            elif text == '🌍 Сменить язык':
-                self.start_language_change(message)
-            
-            # Обрабатываем выбор категории
-            elif text.startswith('📱 ') or text.startswith('👕 ') or text.startswith('🏠 ') or text.startswith('⚽ ') or text.startswith('💄 ') or text.startswith('📚 '):
-                self.handle_category_selection(message)
-            
-            # Обрабатываем выбор подкатегории/бренда
-            elif text.startswith('🍎 ') or text.startswith('📱 ') or text.startswith('✔️ ') or text.startswith('👖 ') or text.startswith('☕ ') or text.startswith('👟 ') or text.startswith('💎 ') or text.startswith('📖 '):
-                self.handle_subcategory_selection(message)
-            
-            # Обрабатываем выбор товара
-            elif text.startswith('🛍 '):
-                self.handle_product_selection(message)
-            
-            # Обрабатываем поиск
-            elif telegram_id in self.user_states and self.user_states[telegram_id] == 'searching':
-                self.handle_search_query(message)
-            
-            # Обрабатываем оформление заказа
-            elif text == '📦 Оформить заказ':
-                self.start_order_process(message)
-            elif text in ['💳 Онлайн оплата', '💵 Наличными при получении']:
-                self.handle_payment_method_selection(message)
-            
-            # Обрабатываем управление корзиной
-            elif text == '🗑 Очистить корзину':
-                self.clear_user_cart(message)
-            elif text == '➕ Добавить товары' or text == '🛍 Перейти в каталог':
-                self.show_catalog(message)
-            
-            # Неизвестная команда
-            else:
+            state = self.user_states.get(telegram_id)
+            if state is not None:
+                self.handle_user_state(message, state)
+                return
+            
+            # Кнопки последней показанной клавиатуры каталога — по id
+            if self.handle_catalog_label(message):
+                return
+            
+            # Кнопки меню и каталога
+            if not self.button_router.dispatch(text, message, user_language):
                 self.handle_unknown_command(message, user_language)
                 
         except Exception as e:
@@ -175,10 +201,11 @@ class MessageHandler:
         
         self.user_states[telegram_id] = 'registration_name'
     
-    def handle_user_state(self, message):
+    def handle_user_state(self, message, state=None):
         """Обработка состояний пользователя"""
         telegram_id = message['from']['id']
-        state = self.user_states.get(telegram_id)
+        if state is None:
+            state = self.user_states.get(telegram_id)
         
         if state == 'registration_name':
             self.handle_registration_name(message)
@@ -221,8 +248,6 @@ class MessageHandler:
             return
         
         # Сохраняем имя и переходим к телефону
-        if not hasattr(self, 'registration_data'):
-            self.registration_data = {}
         self.registration_data[telegram_id] = {'name': text}
         
         phone_text = "📱 Поделитесь номером телефона или пропустите этот шаг:"
@@ -242,8 +267,7 @@ class MessageHandler:
             phone = None
         elif text == '❌ Отмена':
             del self.user_states[telegram_id]
-            if hasattr(self, 'registration_data') and telegram_id in self.registration_data:
-                del self.registration_data[telegram_id]
+            self.registration_data.pop(telegram_id, None)
             self.bot.send_message(chat_id, "❌ Регистрация отменена")
             return
         elif 'contact' in message:
@@ -254,7 +278,7 @@ class MessageHandler:
                 self.bot.send_message(chat_id, "❌ Неверный формат телефона. Попробуйте еще раз:")
                 return
         
-        self.registration_data[telegram_id]['phone'] = phone
+        self.registration_data.merge(telegram_id, phone=phone)
         
         email_text = "📧 Введите email или пропустите:"
         self.bot.send_message(chat_id, email_text, create_registration_keyboard('email'))
@@ -273,8 +297,7 @@ class MessageHandler:
             email = None
         elif text == '❌ Отмена':
             del self.user_states[telegram_id]
-            if hasattr(self, 'registration_data') and telegram_id in self.registration_data:
-                del self.registration_data[telegram_id]
+            self.registration_data.pop(telegram_id, None)
             self.bot.send_message(chat_id, "❌ Регистрация отменена")
             return
         else:
@@ -283,7 +306,7 @@ class MessageHandler:
                 return
             email = text
         
-        self.registration_data[telegram_id]['email'] = email
+        self.registration_data.merge(telegram_id, email=email)
         
         language_text = "🌍 Выберите язык / Tilni tanlang:"
         self.bot.send_message(chat_id, language_text, create_registration_keyboard('language'))
@@ -305,7 +328,7 @@ class MessageHandler:
             return
         
         # Завершаем регистрацию
-        reg_data = self.registration_data.get(telegram_id, {})
+        reg_data = self.registration_data.get(telegram_id) or {}
         
         user_id = self.db.add_user(
             telegram_id,
@@ -316,6 +339,8 @@ class MessageHandler:
         )
         
         if user_id:
+            remember_user_language(self.db, telegram_id, language)
+            
             # Создаем запись баллов лояльности
             self.db.execute_query(
                 'INSERT OR IGNORE INTO loyalty_points (user_id) VALUES (?)',
@@ -334,8 +359,7 @@ class MessageHandler:
         
         # Очищаем состояние
         del self.user_states[telegram_id]
-        if hasattr(self, 'registration_data') and telegram_id in self.registration_data:
-            del self.registration_data[telegram_id]
+        self.registration_data.pop(telegram_id, None)
     
     def send_registration_prompt(self, chat_id):
         """Приглашение к регистрации"""
@@ -415,7 +439,43 @@ Biz doimo yordam berishga tayyormiz! 🤝
 
         self.bot.send_message(chat_id, welcome_text, create_main_keyboard(language))
     
-    def show_catalog(self, message):
+    def remember_catalog_labels(self, chat_id, kind, rows):
+        """Запоминаем подписи последней клавиатуры каталога, чтобы нажатие разрешалось по id"""
+        self.catalog_labels[chat_id] = get_catalog_label_map(kind, rows)
+    
+    def handle_catalog_label(self, message):
+        """Нажатие кнопки из последней показанной клавиатуры каталога (поиск по первичному ключу)"""
+        labels = self.catalog_labels.get(message['chat']['id'])
+        if not labels:
+            return False
+        
+        entry = labels.get(message.get('text', ''))
+        if not entry:
+            return False
+        
+        kind, entity_id = entry
+        chat_id = message['chat']['id']
+        if kind == 'category':
+            self.show_category(chat_id, entity_id)
+        elif kind == 'subcategory':
+            self.show_subcategory(chat_id, entity_id)
+        else:
+            product = self.db.get_product_by_id(entity_id)
+            if product and product[11]:  # is_active
+                self.show_product_details(chat_id, product)
+            else:
+                self.bot.send_message(chat_id, "❌ Товар не найден")
+        return True
+    
+    def send_view(self, chat_id, text, reply_markup=None, callback_query=None, photo=None):
+        """Показ экрана: из callback — на месте исходного сообщения, иначе новым сообщением"""
+        if callback_query:
+            return self.bot.callback_responder.render(callback_query, text, reply_markup, photo)
+        if photo:
+            return self.bot.send_photo(chat_id, photo, text, reply_markup)
+        return self.bot.send_message(chat_id, text, reply_markup)
+    
+    def show_catalog(self, message, callback_query=None):
         """Показ каталога товаров"""
         chat_id = message['chat']['id']
         
@@ -423,12 +483,110 @@ Biz doimo yordam berishga tayyormiz! 🤝
         
         if categories:
             catalog_text = "🛍 <b>Каталог товаров</b>\n\nВыберите категорию:"
-            self.bot.send_message(chat_id, catalog_text, create_categories_keyboard(categories))
+            if callback_query:
+                keyboard = keyboard_cache.get(
+                    'categories_inline', lambda: create_categories_inline_keyboard(categories), catalog=True
+                )
+                self.send_view(chat_id, catalog_text, keyboard, callback_query)
+            else:
+                self.remember_catalog_labels(chat_id, 'category', categories)
+                keyboard = keyboard_cache.get('categories', lambda: create_categories_keyboard(categories), catalog=True)
+                self.bot.send_message(chat_id, catalog_text, keyboard)
+        else:
+            self.send_view(chat_id, "❌ Каталог временно недоступен", callback_query=callback_query)
+    
+    def show_category(self, chat_id, category_id, category_name=None, callback_query=None):
+        """Показ подкатегорий (или товаров) категории по id"""
+        if category_name is None:
+            category = self.db.execute_query(
+                'SELECT name FROM categories WHERE id = ? AND is_active = 1',
+                (category_id,)
+            )
+            if not category:
+                self.send_view(chat_id, "❌ Категория не найдена", callback_query=callback_query)
+                return
+            category_name = category[0][0]
+        
+        # Получаем подкатегории/бренды
+        subcategories = self.db.get_products_by_category(category_id)
+        
+        if subcategories:
+            subcategory_text = f"📂 <b>{category_name}</b>\n\nВыберите бренд или подкатегорию:"
+            if callback_query:
+                keyboard = keyboard_cache.get(
+                    ('subcategories_inline', category_id),
+                    lambda: create_subcategories_inline_keyboard(subcategories),
+                    catalog=True
+                )
+                self.send_view(chat_id, subcategory_text, keyboard, callback_query)
+            else:
+                self.remember_catalog_labels(chat_id, 'subcategory', subcategories)
+                keyboard = keyboard_cache.get(
+                    ('subcategories', category_id), lambda: create_subcategories_keyboard(subcategories), catalog=True
+                )
+                self.bot.send_message(chat_id, subcategory_text, keyboard)
         else:
-            self.bot.send_message(chat_id, "❌ Каталог временно недоступен")
+            # Если подкатегорий с товарами нет — показываем товары прямо из категории
+            products = self.db.execute_query(
+                'SELECT * FROM products WHERE category_id = ? AND is_active = 1 ORDER BY name LIMIT 30',
+                (category_id,)
+            )
+            if products:
+                products_text = f"🛍 <b>{category_name}</b>\n\nВыберите товар:"
+                if callback_query:
+                    keyboard = keyboard_cache.get(
+                        ('category_products_inline', category_id),
+                        lambda: create_products_inline_keyboard(products),
+                        catalog=True
+                    )
+                    self.send_view(chat_id, products_text, keyboard, callback_query)
+                else:
+                    self.remember_catalog_labels(chat_id, 'product', products)
+                    keyboard = keyboard_cache.get(
+                        ('category_products', category_id),
+                        lambda: create_products_keyboard(products, show_back=True),
+                        catalog=True
+                    )
+                    self.bot.send_message(chat_id, products_text, keyboard)
+            else:
+                self.send_view(chat_id, f"❌ В категории '{category_name}' пока нет товаров", callback_query=callback_query)
+    
+    def show_subcategory(self, chat_id, subcategory_id, subcategory_name=None, callback_query=None):
+        """Показ товаров подкатегории по id"""
+        if subcategory_name is None:
+            subcategory = self.db.execute_query(
+                'SELECT name FROM subcategories WHERE id = ? AND is_active = 1',
+                (subcategory_id,)
+            )
+            if not subcategory:
+                self.send_view(chat_id, "❌ Подкатегория не найдена", callback_query=callback_query)
+                return
+            subcategory_name = subcategory[0][0]
+        
+        # Получаем товары подкатегории
+        products = self.db.get_products_by_subcategory(subcategory_id)
+        
+        if products:
+            products_text = f"🛍 <b>{subcategory_name}</b>\n\nВыберите товар:"
+            if callback_query:
+                # «Назад» ведет к подкатегориям той же категории
+                keyboard = keyboard_cache.get(
+                    ('subcategory_products_inline', subcategory_id),
+                    lambda: create_products_inline_keyboard(products, f'open_category_{products[0][4]}'),
+                    catalog=True
+                )
+                self.send_view(chat_id, products_text, keyboard, callback_query)
+            else:
+                self.remember_catalog_labels(chat_id, 'product', products)
+                keyboard = keyboard_cache.get(
+                    ('subcategory_products', subcategory_id), lambda: create_products_keyboard(products), catalog=True
+                )
+                self.bot.send_message(chat_id, products_text, keyboard)
+        else:
+            self.send_view(chat_id, f"❌ В подкатегории '{subcategory_name}' пока нет товаров", callback_query=callback_query)
     
     def handle_category_selection(self, message):
-        """Обработка выбора категории"""
+        """Обработка выбора категории по подписи (если клавиатура не из текущей сессии)"""
         text = message.get('text', '')
         chat_id = message['chat']['id']
         
@@ -442,30 +600,12 @@ Biz doimo yordam berishga tayyormiz! 🤝
         )
         
         if category:
-            category_id = category[0][0]
-            
-            # Получаем подкатегории/бренды
-            subcategories = self.db.get_products_by_category(category_id)
-            
-            if subcategories:
-                subcategory_text = f"📂 <b>{category_name}</b>\n\nВыберите бренд или подкатегорию:"
-                self.bot.send_message(chat_id, subcategory_text, create_subcategories_keyboard(subcategories))
-            else:
-                # Если подкатегорий с товарами нет — показываем товары прямо из категории
-                products = self.db.execute_query(
-                    'SELECT * FROM products WHERE category_id = ? AND is_active = 1 ORDER BY name LIMIT 30',
-                    (category_id,)
-                )
-                if products:
-                    products_text = f"🛍 <b>{category_name}</b>\n\nВыберите товар:"
-                    self.bot.send_message(chat_id, products_text, create_products_keyboard(products, show_back=True))
-                else:
-                    self.bot.send_message(chat_id, f"❌ В категории '{category_name}' пока нет товаров")
+            self.show_category(chat_id, category[0][0], category_name)
         else:
             self.bot.send_message(chat_id, "❌ Категория не найдена")
     
     def handle_subcategory_selection(self, message):
-        """Обработка выбора подкатегории"""
+        """Обработка выбора подкатегории по подписи (если клавиатура не из текущей сессии)"""
         text = message.get('text', '')
         chat_id = message['chat']['id']
         
@@ -479,21 +619,12 @@ Biz doimo yordam berishga tayyormiz! 🤝
         )
         
         if subcategory:
-            subcategory_id = subcategory[0][0]
-            
-            # Получаем товары подкатегории
-            products = self.db.get_products_by_subcategory(subcategory_id)
-            
-            if products:
-                products_text = f"🛍 <b>{subcategory_name}</b>\n\nВыберите товар:"
-                self.bot.send_message(chat_id, products_text, create_products_keyboard(products))
-            else:
-                self.bot.send_message(chat_id, f"❌ В подкатегории '{subcategory_name}' пока нет товаров")
+            self.show_subcategory(chat_id, subcategory[0][0], subcategory_name)
         else:
             self.bot.send_message(chat_id, "❌ Подкатегория не найдена")
     
     def handle_product_selection(self, message):
-        """Обработка выбора товара"""
+        """Обработка выбора товара по подписи (если клавиатура не из текущей сессии)"""
         text = message.get('text', '')
         chat_id = message['chat']['id']
         
@@ -517,44 +648,37 @@ Biz doimo yordam berishga tayyormiz! 🤝
         else:
             self.bot.send_message(chat_id, "❌ Товар не найден")
     
-    def show_product_details(self, chat_id, product):
+    def show_product_details(self, chat_id, product, callback_query=None):
         """Показ деталей товара"""
         try:
             # Увеличиваем счетчик просмотров
             self.db.increment_product_views(product[0])
             
-            # Получаем отзывы
-            reviews = self.db.get_product_reviews(product[0])
-            avg_rating = sum(review[0] for review in reviews) / len(reviews) if reviews else 0
+            # Рейтинг берется из агрегатов товара, отзывы не читаются
+            avg_rating, reviews_count, _ = self.db.get_product_rating(product[0])
             
             # Формируем карточку товара
             product_card = create_product_card(product)
             
             if avg_rating > 0:
                 stars = create_stars_display(avg_rating)
-                product_card += f"⭐ Рейтинг: {stars} ({avg_rating:.1f}/5, {len(reviews)} отзывов)\n"
-            
-            # Отправляем с изображением если есть
-            if product[7]:  # image_url
-                self.bot.send_photo(
-                    chat_id, 
-                    product[7], 
-                    product_card, 
-                    create_product_inline_keyboard_with_qty(product[0], qty=1, category_id=product[4], subcategory_id=product[5])
-                )
-            else:
-                self.bot.send_message(
-                    chat_id, 
-                    product_card, 
-                    create_product_inline_keyboard_with_qty(product[0], qty=1, category_id=product[4], subcategory_id=product[5])
-                )
+                product_card += f"⭐ Рейтинг: {stars} ({avg_rating:.1f}/5, {reviews_count} отзывов)\n"
+            
+            # Отправляем с изображением если есть (product[7] — image_url)
+            self.send_view(
+                chat_id,
+                product_card,
+                create_product_inline_keyboard_with_qty(product[0], qty=1, category_id=product[4], subcategory_id=product[5]),
+                callback_query,
+                photo=product[7]
+            )
                 
         except Exception as e:
             logger.error(f"Ошибка показа товара: {e}")
             self.bot.send_message(chat_id, "❌ Ошибка загрузки товара")
     
-    def show_cart(self, message):
-        """Показ корзины"""
+    def show_cart(self, message, callback_query=None):
+        """Показ корзины (из callback — с inline-кнопками управления позициями)"""
         chat_id = message['chat']['id']
         telegram_id = message['from']['id']
         
@@ -567,7 +691,10 @@ Biz doimo yordam berishga tayyormiz! 🤝
         
         if not cart_items:
             empty_cart_text = t('empty_cart', language=user_data[0][5])
-            self.bot.send_message(chat_id, empty_cart_text, create_cart_keyboard(False))
+            if callback_query:
+                self.send_view(chat_id, empty_cart_text, create_cart_inline_keyboard([]), callback_query)
+            else:
+                self.bot.send_message(chat_id, empty_cart_text, create_cart_keyboard(False))
             return
         
         # Формируем текст корзины
@@ -583,7 +710,10 @@ Biz doimo yordam berishga tayyormiz! 🤝
         
         cart_text += f"💳 <b>Итого: {format_price(total_amount)}</b>"
         
-        self.bot.send_message(chat_id, cart_text, create_cart_keyboard(True))
+        if callback_query:
+            self.send_view(chat_id, cart_text, create_cart_inline_keyboard(cart_items), callback_query)
+        else:
+            self.bot.send_message(chat_id, cart_text, create_cart_keyboard(True))
     
     def show_user_orders(self, message):
         """Показ заказов пользователя"""
@@ -713,6 +843,7 @@ Biz doimo yordam berishga tayyormiz! 🤝
             
             search_results += "💡 Нажмите на название товара для подробностей"
             
+            self.remember_catalog_labels(chat_id, 'product', products[:10])
             self.bot.send_message(chat_id, search_results, create_products_keyboard(products[:10], False))
         else:
             no_results = f"❌ По запросу '{text}' ничего не найдено\n\n"
@@ -767,16 +898,14 @@ Biz doimo yordam berishga tayyormiz! 🤝
         location = message.get('location')
         if location and isinstance(location, dict) and 'latitude' in location and 'longitude' in location:
             # Сохраняем координаты и двигаемся к выбору оплаты
-            if not hasattr(self, 'order_data'):
-                self.order_data = {}
-            self.order_data[telegram_id] = self.order_data.get(telegram_id, {})
-            self.order_data[telegram_id]['lat'] = float(location.get('latitude'))
-            self.order_data[telegram_id]['lon'] = float(location.get('longitude'))
+            order = self.order_data.get(telegram_id) or {}
+            order['lat'] = float(location.get('latitude'))
+            order['lon'] = float(location.get('longitude'))
             # Если адрес текстом не задан — ставим пометку
-            self.order_data[telegram_id].setdefault('address', 'Геолокация отправлена')
+            order.setdefault('address', 'Геолокация отправлена')
+            self.order_data[telegram_id] = order
 
-            user_data = self.db.get_user_by_telegram_id(telegram_id)
-            language = user_data[0][5] if user_data else 'ru'
+            language = self.get_language(message)
             payment_text = "💳 Выберите способ оплаты:"
             self.bot.send_message(chat_id, payment_text, create_payment_methods_keyboard(language))
             del self.user_states[telegram_id]
@@ -797,13 +926,9 @@ Biz doimo yordam berishga tayyormiz! 🤝
             return
         
         # Сохраняем адрес и показываем способы оплаты
-        if not hasattr(self, 'order_data'):
-            self.order_data = {}
-        
         self.order_data[telegram_id] = {'address': text}
         
-        user_data = self.db.get_user_by_telegram_id(telegram_id)
-        language = user_data[0][5] if user_data else 'ru'
+        language = self.get_language(message)
         
         payment_text = "💳 Выберите способ оплаты:"
         self.bot.send_message(chat_id, payment_text, create_payment_methods_keyboard(language))
@@ -838,7 +963,7 @@ Biz doimo yordam berishga tayyormiz! 🤝
         
         # Создаем заказ
         total_amount = calculate_cart_total(cart_items)
-        order_data = getattr(self, 'order_data', {}).get(telegram_id, {})
+        order_data = self.order_data.get(telegram_id) or {}
         delivery_address = order_data.get('address', 'Не указан')
         
         order_id = self.db.create_order(user_id, total_amount, delivery_address, payment_method, order_data.get('lat'), order_data.get('lon'))
@@ -874,8 +999,7 @@ Biz doimo yordam berishga tayyormiz! 🤝
                 self.notification_manager.send_order_notification_to_admins(order_id)
             
             # Очищаем данные заказа
-            if hasattr(self, 'order_data') and telegram_id in self.order_data:
-                del self.order_data[telegram_id]
+            del self.order_data[telegram_id]
         else:
             self.bot.send_message(chat_id, "❌ Ошибка создания заказа")
     
@@ -1006,6 +1130,7 @@ Biz doimo yordam berishga tayyormiz! 🤝
         if user_data:
             user_id = user_data[0][0]
             self.db.update_user_language(user_id, new_language)
+            remember_user_language(self.db, telegram_id, new_language)
             
             success_text = t('language_changed', language=new_language)
             self.bot.send_message(chat_id, success_text, create_main_keyboard(new_language))
@@ -1158,8 +1283,27 @@ Biz doimo yordam berishga tayyormiz! 🤝
         except (ValueError, IndexError):
             self.bot.send_message(chat_id, "❌ Неверный ID для восстановления")
     
-    def show_user_notifications(self, message):
-        """Показ уведомлений пользователя"""
+    NOTIFICATIONS_PAGE_SIZE = 10
+    NOTIFICATION_EMOJI = {
+        'order': '📦',
+        'order_status': '📋',
+        'promotion': '🎁',
+        'system': '⚙️',
+        'info': 'ℹ️'
+    }
+    
+    def format_notification(self, notif, max_length):
+        """Блок одного уведомления в сообщении входящих"""
+        type_emoji = self.NOTIFICATION_EMOJI.get(notif[4], 'ℹ️')
+        new_mark = '🆕 ' if not notif[5] else ''
+        head = f"{new_mark}{type_emoji} <b>{notif[2]}</b>\n"
+        tail = f"\n📅 {format_date(notif[6])}\n\n"
+        body = truncate_text(notif[3] or '', max(20, max_length - len(head) - len(tail)))
+        return head + body + tail
+    
+    def show_user_notifications(self, message, page=1, callback_query=None):
+        """Входящие уведомления: страница склеивается в минимум сообщений, прочтение — одним UPDATE"""
+        from config import BOT_CONFIG
         chat_id = message['chat']['id']
         telegram_id = message['from']['id']
         
@@ -1168,107 +1312,134 @@ Biz doimo yordam berishga tayyormiz! 🤝
             return
         
         user_id = user_data[0][0]
-        notifications = self.db.get_unread_notifications(user_id)
+        total, unread = self.db.count_notifications(user_id)
         
-        if not notifications:
-            self.bot.send_message(chat_id, "🔔 У вас нет новых уведомлений")
+        if not total:
+            self.send_view(chat_id, "🔔 У вас нет уведомлений", callback_query=callback_query)
             return
         
-        # Показываем все уведомления
+        total_pages = (total + self.NOTIFICATIONS_PAGE_SIZE - 1) // self.NOTIFICATIONS_PAGE_SIZE
+        page = max(1, min(page, total_pages))
+        notifications = self.db.get_notifications_page(
+            user_id, self.NOTIFICATIONS_PAGE_SIZE, (page - 1) * self.NOTIFICATIONS_PAGE_SIZE
+        ) or []
+        
+        # Уведомления страницы склеиваются, пока помещаются в одно сообщение
+        max_length = BOT_CONFIG['max_message_length']
+        header = f"🔔 <b>Уведомления</b> (новых: {unread})\n\n"
+        chunks = [header]
         for notif in notifications:
-            type_emoji = {
-                'order': '📦',
-                'order_status': '📋',
-                'promotion': '🎁',
-                'system': '⚙️',
-                'info': 'ℹ️'
-            }.get(notif[4], 'ℹ️')
-            
-            notif_text = f"{type_emoji} <b>{notif[2]}</b>\n\n"
-            notif_text += f"{notif[3]}\n\n"
-            notif_text += f"📅 {format_date(notif[6])}"
-            
-            self.bot.send_message(chat_id, notif_text)
-            
-            # Отмечаем как прочитанное
-            self.db.mark_notification_read(notif[0])
+            block = self.format_notification(notif, max_length - len(header))
+            if len(chunks[-1]) + len(block) > max_length:
+                chunks.append('')
+            chunks[-1] += block
+        
+        pagination = create_pagination_keyboard(page, total_pages, 'notifications_page')
+        reply_markup = {'inline_keyboard': pagination} if pagination else None
+        
+        if len(chunks) == 1:
+            self.send_view(chat_id, chunks[0].rstrip(), reply_markup, callback_query)
+        else:
+            for chunk in chunks[:-1]:
+                self.bot.send_message(chat_id, chunk.rstrip())
+            self.bot.send_message(chat_id, chunks[-1].rstrip(), reply_markup)
+        
+        # Показанные непрочитанные отмечаются одним запросом
+        self.db.mark_notifications_read(user_id, [notif[0] for notif in notifications if not notif[5]])
+    
+    def handle_notifications_page(self, callback_query):
+        """Переход по страницам уведомлений (notifications_page_<page>)"""
+        try:
+            page = int(callback_query['data'].rsplit('_', 1)[1])
+        except ValueError:
+            return
+        message = {'chat': callback_query['message']['chat'], 'from': callback_query['from']}
+        self.show_user_notifications(message, page, callback_query)
     
     def handle_callback_query(self, callback_query):
         """Обработка callback запросов"""
         try:
-            data = callback_query['data']
-            chat_id = callback_query['message']['chat']['id']
-            telegram_id = callback_query['from']['id']
-            
-            if data == 'back_to_categories':
-                msg = {'chat': {'id': chat_id}}
-                self.show_catalog(msg)
-            elif data.startswith('back_to_category_'):
-                try:
-                    cid = int(data.split('_')[-1])
-                except Exception:
-                    cid = None
-                if cid:
-                    # Показ подкатегорий
-                    cat_row = self.db.execute_query('SELECT name FROM categories WHERE id=?', (cid,))
-                    name = cat_row[0][0] if cat_row else ''
-                    subs = self.db.get_products_by_category(cid)
-                    if subs:
-                        self.bot.send_message(chat_id, f"📂 <b>{name}</b>\n\nВыберите бренд или подкатегорию:", create_subcategories_keyboard(subs))
-                    else:
-                        self.bot.send_message(chat_id, f"❌ В категории '{name}' пока нет товаров")
-                else:
-                    msg = {'chat': {'id': chat_id}}
-                    self.show_catalog(msg)
-            elif data == 'go_to_cart':
-                # Переход в корзину
-                msg = {'chat': {'id': chat_id}, 'from': {'id': telegram_id}}
-                self.show_cart(msg)
-            elif data.startswith('back_to_subcategory_'):
-                try:
-                    sid = int(data.split('_')[-1])
-                except Exception:
-                    sid = None
-                if sid:
-                    # Показ товаров в подкатегории
-                    sub_row = self.db.execute_query('SELECT name FROM subcategories WHERE id=?', (sid,))
-                    subname = sub_row[0][0] if sub_row else 'Подкатегория'
-                    products = self.db.get_products_by_subcategory(sid)
-                    if products:
-                        self.bot.send_message(chat_id, f"🛍 <b>{subname}</b>\n\nВыберите товар:", create_products_keyboard(products))
-                    else:
-                        self.bot.send_message(chat_id, f"❌ В подкатегории '{subname}' пока нет товаров")
-                else:
-                    msg = {'chat': {'id': chat_id}}
-                    self.show_catalog(msg)
-            elif data.startswith('qty_inc_') or data.startswith('qty_dec_'):
-                parts = data.split('_')
-                try:
-                    pid = int(parts[2]); qty = int(parts[3])
-                except (ValueError, IndexError):
-                    return
-                new_qty = qty + 1 if data.startswith('qty_inc_') else max(1, qty - 1)
-                kb = create_product_inline_keyboard_with_qty(pid, new_qty)
-                message_id = callback_query['message']['message_id']
-                self.bot.edit_message_reply_markup(chat_id, message_id, kb)
-            elif data.startswith('add_to_cart_'):
-                self.handle_add_to_cart(callback_query)
-            elif data.startswith('add_to_favorites_'):
-                self.handle_add_to_favorites(callback_query)
-            elif data.startswith('reviews_'):
-                self.handle_show_reviews(callback_query)
-            elif data.startswith('rate_product_'):
-                self.handle_rate_product(callback_query)
-            elif data.startswith('cart_'):
-                self.handle_cart_action(callback_query)
-            elif data.startswith('pay_'):
-                self.handle_payment_selection(callback_query)
-            elif data == 'cancel_payment':
-                self.bot.send_message(chat_id, "❌ Оплата отменена")
-            
+            self.callback_router.dispatch(callback_query['data'], callback_query)
         except Exception as e:
             logger.error(f"Ошибка обработки callback: {e}")
     
+    def handle_back_to_categories(self, callback_query):
+        """Возврат к списку категорий"""
+        chat_id = callback_query['message']['chat']['id']
+        self.show_catalog({'chat': {'id': chat_id}}, callback_query)
+    
+    def handle_go_to_cart(self, callback_query):
+        """Переход в корзину"""
+        chat_id = callback_query['message']['chat']['id']
+        telegram_id = callback_query['from']['id']
+        self.show_cart({'chat': {'id': chat_id}, 'from': {'id': telegram_id}}, callback_query)
+    
+    def handle_checkout(self, callback_query):
+        """Оформление заказа из inline-корзины (дальше — обычная клавиатура для адреса)"""
+        chat_id = callback_query['message']['chat']['id']
+        telegram_id = callback_query['from']['id']
+        self.start_order_process({'chat': {'id': chat_id}, 'from': {'id': telegram_id}})
+    
+    def handle_cancel_payment(self, callback_query):
+        """Отмена оплаты"""
+        chat_id = callback_query['message']['chat']['id']
+        self.bot.send_message(chat_id, "❌ Оплата отменена")
+    
+    def handle_back_to_category(self, callback_query):
+        """Подкатегории категории (open_category_ / back_to_category_)"""
+        data = callback_query['data']
+        chat_id = callback_query['message']['chat']['id']
+        try:
+            cid = int(data.split('_')[-1])
+        except Exception:
+            cid = None
+        if cid:
+            self.show_category(chat_id, cid, callback_query=callback_query)
+        else:
+            self.show_catalog({'chat': {'id': chat_id}}, callback_query)
+    
+    def handle_back_to_subcategory(self, callback_query):
+        """Товары подкатегории (open_subcategory_ / back_to_subcategory_)"""
+        data = callback_query['data']
+        chat_id = callback_query['message']['chat']['id']
+        try:
+            sid = int(data.split('_')[-1])
+        except Exception:
+            sid = None
+        if sid:
+            self.show_subcategory(chat_id, sid, callback_query=callback_query)
+        else:
+            self.show_catalog({'chat': {'id': chat_id}}, callback_query)
+    
+    def handle_open_product(self, callback_query):
+        """Карточка товара из inline-списка"""
+        chat_id = callback_query['message']['chat']['id']
+        try:
+            product_id = int(callback_query['data'].split('_')[-1])
+        except ValueError:
+            return
+        product = self.db.get_product_by_id(product_id)
+        if product and product[11]:  # is_active
+            self.show_product_details(chat_id, product, callback_query)
+        else:
+            self.send_view(chat_id, "❌ Товар не найден", callback_query=callback_query)
+    
+    def handle_quantity_change(self, callback_query):
+        """Изменение количества на карточке товара"""
+        data = callback_query['data']
+        parts = data.split('_')
+        try:
+            pid = int(parts[2]); qty = int(parts[3])
+        except (ValueError, IndexError):
+            return
+        new_qty = qty + 1 if data.startswith('qty_inc_') else max(1, qty - 1)
+        kb = create_product_inline_keyboard_with_qty(pid, new_qty)
+        # Кнопка «Назад» остается той же, что на карточке (категория/подкатегория товара)
+        current = (callback_query['message'].get('reply_markup') or {}).get('inline_keyboard')
+        if current and current[-1]:
+            kb['inline_keyboard'][-1][-1] = current[-1][-1]
+        self.bot.callback_responder.edit_markup(callback_query, kb)
+    
     def handle_add_to_cart(self, callback_query):
         """Добавление товара в корзину"""
         data = callback_query['data']
@@ -1336,21 +1507,38 @@ Biz doimo yordam berishga tayyormiz! 🤝
         except (ValueError, IndexError) as e:
             logger.error(f"Ошибка добавления в избранное: {e}")
     
+    REVIEWS_PAGE_SIZE = 5
+    
     def handle_show_reviews(self, callback_query):
-        """Показ отзывов о товаре"""
+        """Показ отзывов о товаре (reviews_<product_id>[_<page>])"""
         data = callback_query['data']
         chat_id = callback_query['message']['chat']['id']
         
         try:
-            product_id = int(data.split('_')[1])
+            parts = data.split('_')
+            product_id = int(parts[1])
+            page = int(parts[2]) if len(parts) > 2 else 1
             
-            reviews = self.db.get_product_reviews(product_id)
             product = self.db.get_product_by_id(product_id)
+            if not product:
+                return
+            avg_rating, reviews_count, histogram = self.db.get_product_rating(product_id)
+            
+            reviews_text = f"⭐ <b>Отзывы о товаре:</b>\n{product[1]}\n\n"
             
-            if reviews:
-                reviews_text = f"⭐ <b>Отзывы о товаре:</b>\n{product[1]}\n\n"
+            if reviews_count:
+                total_pages = (reviews_count + self.REVIEWS_PAGE_SIZE - 1) // self.REVIEWS_PAGE_SIZE
+                page = max(1, min(page, total_pages))
+                reviews = self.db.get_product_reviews(
+                    product_id, limit=self.REVIEWS_PAGE_SIZE, offset=(page - 1) * self.REVIEWS_PAGE_SIZE
+                ) or []
                 
-                for review in reviews[:5]:  # Показываем первые 5
+                reviews_text += f"{create_stars_display(avg_rating)} {avg_rating:.1f}/5 ({reviews_count} отзывов)\n"
+                for star in range(5, 0, -1):
+                    reviews_text += f"{star}⭐ — {histogram.get(star, 0)}\n"
+                reviews_text += "\n"
+                
+                for review in reviews:
                     stars = create_stars_display(review[0])
                     reviews_text += f"{stars} <b>{review[3]}</b>\n"
                     
@@ -1359,14 +1547,12 @@ Biz doimo yordam berishga tayyormiz! 🤝
                     
                     reviews_text += f"📅 {format_date(review[2])}\n\n"
                 
-                if len(reviews) > 5:
-                    reviews_text += f"... и еще {len(reviews) - 5} отзывов"
+                pagination = create_pagination_keyboard(page, total_pages, f'reviews_{product_id}')
+                self.bot.send_message(chat_id, reviews_text, {'inline_keyboard': pagination} if pagination else None)
             else:
-                reviews_text = f"⭐ <b>Отзывы о товаре:</b>\n{product[1]}\n\n"
                 reviews_text += "❌ Пока нет отзывов\n\n"
                 reviews_text += "💡 Станьте первым, кто оставит отзыв!"
-            
-            self.bot.send_message(chat_id, reviews_text)
+                self.bot.send_message(chat_id, reviews_text)
             
         except (ValueError, IndexError) as e:
             logger.error(f"Ошибка показа отзывов: {e}")
@@ -1409,7 +1595,7 @@ Biz doimo yordam berishga tayyormiz! 🤝
             logger.error(f"Ошибка оценки товара: {e}")
     
     def handle_cart_action(self, callback_query):
-        """Обработка действий с корзиной"""
+        """Обработка действий с корзиной: позиция меняется, корзина перерисовывается на месте"""
         data = callback_query['data']
         chat_id = callback_query['message']['chat']['id']
         telegram_id = callback_query['from']['id']
@@ -1422,21 +1608,21 @@ Biz doimo yordam berishga tayyormiz! 🤝
                 # Увеличиваем количество
                 current_quantity = self.get_cart_item_quantity(cart_item_id)
                 self.db.update_cart_quantity(cart_item_id, current_quantity + 1)
-                self.update_cart_message(callback_query, cart_item_id)
                 
             elif action == 'decrease':
-                # Уменьшаем количество
+                # Уменьшаем количество (меньше 1 — без изменений, экран не перерисовывается)
                 current_quantity = self.get_cart_item_quantity(cart_item_id)
                 if current_quantity > 1:
                     self.db.update_cart_quantity(cart_item_id, current_quantity - 1)
-                    self.update_cart_message(callback_query, cart_item_id)
-                else:
-                    self.bot.send_message(chat_id, "❌ Минимальное количество: 1")
                 
             elif action == 'remove':
                 # Удаляем товар
                 self.db.remove_from_cart(cart_item_id)
-                self.bot.send_message(chat_id, "🗑 Товар удален из корзины")
+            
+            else:
+                return
+            
+            self.show_cart({'chat': {'id': chat_id}, 'from': {'id': telegram_id}}, callback_query)
                 
         except (ValueError, IndexError) as e:
             logger.error(f"Ошибка действия с корзиной: {e}")
@@ -1449,20 +1635,6 @@ Biz doimo yordam berishga tayyormiz! 🤝
         )
         return result[0][0] if result else 1
     
-    def update_cart_message(self, callback_query, cart_item_id):
-        """Обновление сообщения корзины"""
-        try:
-            new_quantity = self.get_cart_item_quantity(cart_item_id)
-            new_keyboard = create_cart_item_keyboard(cart_item_id, new_quantity)
-            
-            self.bot.edit_message_reply_markup(
-                callback_query['message']['chat']['id'],
-                callback_query['message']['message_id'],
-                new_keyboard
-            )
-        except Exception as e:
-            logger.error(f"Ошибка обновления сообщения корзины: {e}")
-    
     def handle_payment_selection(self, callback_query):
         """Обработка выбора способа оплаты"""
         data = callback_query['data']
@@ -1526,9 +1698,7 @@ Biz doimo yordam berishga tayyormiz! 🤝
                 return
 
         # Если ничего не найдено
-        telegram_id = message['from']['id']
-        user_data = self.db.get_user_by_telegram_id(telegram_id)
-        lang = user_data[0][5] if user_data else 'ru'
+        lang = self.get_language(message)
 
         unknown_text = "❓ Команда не распознана\n\n"
         unknown_text += "💡 Используйте кнопки меню или команды:\n"
@@ -1591,10 +1761,7 @@ def handle_contact_request(self, message, language='ru'):
 def start_seller_application(self, message):
     chat_id = message['chat']['id']
     telegram_id = message['from']['id']
-    user_data = self.db.get_user_by_telegram_id(telegram_id)
-    language = (user_data[0][5] if user_data else 'ru') or 'ru'
-    if not hasattr(self, 'seller_data'):
-        self.seller_data = {}
+    language = self.get_language(message)
     self.seller_data[telegram_id] = {}
     prompt = "👤 Как вас зовут?" if language == 'ru' else "👤 Ismingiz nima?"
     self.bot.send_message(chat_id, prompt, create_back_keyboard())
@@ -1606,15 +1773,13 @@ def handle_seller_name(self, message):
     telegram_id = message['from']['id']
     if text in ['❌ Отмена', '🔙 Назад']:
         self.user_states.pop(telegram_id, None)
-        if hasattr(self, 'seller_data'): self.seller_data.pop(telegram_id, None)
+        self.seller_data.pop(telegram_id, None)
         self.bot.send_message(chat_id, "Отменено.", create_main_keyboard('ru'))
         return
     if not text or len(text) < 2:
         self.bot.send_message(chat_id, "❌ Имя слишком короткое. Попробуйте ещё раз:")
         return
-    if not hasattr(self, 'seller_data'):
-        self.seller_data = {}
-    self.seller_data.setdefault(telegram_id, {})['name'] = text
+    self.seller_data.merge(telegram_id, name=text)
     self.bot.send_message(chat_id, "📱 Укажите ваш номер телефона (например, +998 90 123 45 67):")
     self.user_states[telegram_id] = 'seller_phone'
 
@@ -1626,7 +1791,7 @@ def handle_seller_phone(self, message):
     if not phone:
         self.bot.send_message(chat_id, "❌ Неверный формат телефона. Попробуйте ещё раз:")
         return
-    self.seller_data.setdefault(telegram_id, {})['phone'] = phone
+    self.seller_data.merge(telegram_id, phone=phone)
     self.bot.send_message(chat_id, "🏷️ Название вашего бренда или компании:")
     self.user_states[telegram_id] = 'seller_brand'
 
@@ -1637,7 +1802,7 @@ def handle_seller_brand(self, message):
     if len(text) < 2:
         self.bot.send_message(chat_id, "❌ Слишком коротко. Введите название бренда/компании:")
         return
-    self.seller_data.setdefault(telegram_id, {})['brand'] = text
+    self.seller_data.merge(telegram_id, brand=text)
     self.bot.send_message(chat_id, "🛍 Что вы продаёте? Кратко опишите товары/категории:")
     self.user_states[telegram_id] = 'seller_products'
 
@@ -1648,15 +1813,9 @@ def handle_seller_products(self, message):
     if len(text) < 2:
         self.bot.send_message(chat_id, "❌ Слишком коротко. Опишите, что вы продаёте:")
         return
-    data = self.seller_data.get(telegram_id, {})
+    data = self.seller_data.get(telegram_id) or {}
     data['products'] = text
     try:
-        admins = self.db.execute_query('SELECT telegram_id FROM users WHERE is_admin = 1')
-        if not admins:
-            from config import BOT_CONFIG
-            admin_id = int(BOT_CONFIG.get('admin_telegram_id', '0') or 0)
-            if admin_id:
-                admins = [(admin_id,)]
         msg = (
             "🧑‍💼 <b>Новая заявка продавца</b>\n\n"
             f"• Имя: {data.get('name','')}\n"
@@ -1664,17 +1823,13 @@ def handle_seller_products(self, message):
             f"• Бренд/Компания: {data.get('brand','')}\n"
             f"• Что продаёт: {data.get('products','')}"
         )
-        for adm in admins or []:
-            try:
-                self.bot.send_message(adm[0], msg)
-            except Exception as e:
-                logging.error(f"Ошибка отправки заявки админу {adm}: {e}")
+        # Без админов в БД заявка уходит ADMIN_TELEGRAM_ID из конфига
+        get_admin_alerts(self.bot, self.db).notify(msg)
     except Exception as e:
         logging.error(f"Ошибка подготовки уведомления админа: {e}")
     self.bot.send_message(chat_id, "✅ Спасибо! Ваша заявка отправлена. Мы свяжемся с вами в ближайшее время.", create_main_keyboard('ru'))
     self.user_states.pop(telegram_id, None)
-    if hasattr(self, 'seller_data'):
-        self.seller_data.pop(telegram_id, None)
+    self.seller_data.pop(telegram_id, None)
 
 # === Привязка новых методов к классу MessageHandler ===
 MessageHandler.start_seller_application = start_seller_application
@@ -8,9 +8,11 @@ import psutil
 from datetime import datetime
 from config import MONITORING_CONFIG
 from logger import logger
+from metrics import metrics
+from admin_alerts import get_admin_alerts
 
 class HealthMonitor:
-    def __init__(self, db, bot):
+    def __init__(self, db, bot, start=True):
         self.db = db
         self.bot = bot
         self.metrics = {
@@ -22,15 +24,18 @@ class HealthMonitor:
             'memory_usage': 0,
             'cpu_usage': 0
         }
-        self.start_monitoring()
+        if start:
+            self.start_monitoring()
     
     def start_monitoring(self):
         """Запуск мониторинга"""
         def monitor_worker():
             while True:
                 try:
+                    started = time.perf_counter()
                     self.update_metrics()
                     self.check_health()
+                    metrics.observe_job('health_check', time.perf_counter() - started)
                     time.sleep(MONITORING_CONFIG['health_check_interval'])
                 except Exception as e:
                     logger.error(f"Ошибка мониторинга: {e}", exc_info=True)
@@ -86,8 +91,6 @@ class HealthMonitor:
     def send_alert_to_admins(self, issues):
         """Отправка алертов админам"""
         try:
-            admins = self.db.execute_query('SELECT telegram_id FROM users WHERE is_admin = 1')
-            
             alert_message = "🚨 <b>СИСТЕМНОЕ ПРЕДУПРЕЖДЕНИЕ</b>\n\n"
             alert_message += "Обнаружены проблемы:\n"
             for issue in issues:
@@ -99,8 +102,8 @@ class HealthMonitor:
             alert_message += f"🕐 Время работы: {self.metrics['uptime_hours']:.1f}ч\n"
             alert_message += f"📨 Сообщений: {self.metrics['messages_processed']}\n"
             
-            for admin in admins:
-                self.bot.send_message(admin[0], alert_message)
+            # Метрики в тексте меняются, повтор определяется по списку проблем
+            get_admin_alerts(self.bot, self.db).notify(alert_message, key='health:' + '; '.join(issues))
                 
         except Exception as e:
             logger.error(f"Ошибка отправки алерта: {e}")
@@ -127,7 +130,8 @@ class HealthMonitor:
             'cpu_percent': self.metrics['cpu_usage'],
             'messages_processed': self.metrics['messages_processed'],
             'errors_count': self.metrics['errors_count'],
-            'database_status': self.metrics['database_status']
+            'database_status': self.metrics['database_status'],
+            'routes': self.bot.get_route_stats() if hasattr(self.bot, 'get_route_stats') else {}
         }
     
     def create_health_endpoint(self):
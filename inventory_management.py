@@ -244,15 +244,10 @@ class InventoryManager:
         notification_text += f"⏰ Время: {format_date(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))}\n\n"
         notification_text += f"✅ Заказ отправлен поставщику автоматически"
         
-        # Отправляем всем админам
-        admins = self.db.execute_query('SELECT telegram_id FROM users WHERE is_admin = 1')
-        for admin in admins:
-            try:
-                # Используем метод бота для отправки
-                if hasattr(self, 'bot'):
-                    self.bot.send_message(admin[0], notification_text)
-            except Exception as e:
-                logging.info(f"Ошибка уведомления админа {admin[0]}: {e}")
+        # Отправляем всем админам (если менеджеру передан бот)
+        if hasattr(self, 'bot'):
+            from admin_alerts import get_admin_alerts
+            get_admin_alerts(self.bot, self.db).notify(notification_text)
     
     def notify_restock(self, product_id):
         """Уведомление о поступлении товара"""
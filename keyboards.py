@@ -1,42 +1,196 @@
 """
 Клавиатуры для телеграм-бота
 """
+import functools
+import json
+import threading
+import time
 
+from localization import t
+from metrics import metrics
+
+
+class FrozenMarkup(dict):
+    """Клавиатура из кэша: обычный dict плюс готовый JSON для reply_markup.
+
+    Экземпляр общий для всех отправок, изменять его нельзя.
+    """
+
+    __slots__ = ('serialized',)
+
+    def __init__(self, markup):
+        super().__init__(markup)
+        self.serialized = json.dumps(markup)
+
+
+def serialize_markup(reply_markup):
+    """reply_markup для Bot API: из кэша — без повторного json.dumps"""
+    serialized = getattr(reply_markup, 'serialized', None)
+    return serialized if serialized is not None else json.dumps(reply_markup)
+
+
+class KeyboardCache:
+    """Готовые клавиатуры по ключу (вид, язык, версия каталога).
+
+    Статические меню собираются и кодируются в JSON один раз на язык.
+    Клавиатуры каталога (catalog=True) привязаны к версии каталога. Версия
+    общая для всех процессов бота — строка catalog_state в БД
+    (publish_catalog_change); перед выдачей клавиатуры каталога она
+    сверяется не чаще раза в version_check_interval секунд. Без подключенной
+    БД и на случай изменений в обход publish_catalog_change клавиатуры
+    каталога живут не дольше catalog_ttl секунд.
+    """
+
+    def __init__(self, max_entries=2000, version_check_interval=5, catalog_ttl=300):
+        self.max_entries = max_entries
+        self.version_check_interval = version_check_interval
+        self.catalog_ttl = catalog_ttl
+        self.entries = {}
+        self.catalog_version = 0
+        self.db = None
+        self.shared_version = None
+        self.next_version_check = 0.0
+        self.catalog_expires_at = time.monotonic() + catalog_ttl
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def attach(self, db):
+        """Сверка версии каталога с общей строкой catalog_state в этой БД"""
+        self.db = db
+        self.shared_version = read_catalog_version(db)
+
+    def sync_catalog_version(self):
+        """Сброс клавиатур каталога, если другой процесс изменил каталог или истек TTL"""
+        now = time.monotonic()
+        if now < self.next_version_check:
+            return
+        self.next_version_check = now + self.version_check_interval
+        if now >= self.catalog_expires_at:
+            self.invalidate_catalog()
+            return
+        if self.db is None:
+            return
+        version = read_catalog_version(self.db)
+        if version is not None and version != self.shared_version:
+            self.shared_version = version
+            self.invalidate_catalog()
+
+    def get(self, kind, build, language=None, catalog=False):
+        """Клавиатура из кэша; build() вызывается только при промахе.
+
+        language — язык или другой вариант той же клавиатуры (аргументы).
+        """
+        if catalog:
+            self.sync_catalog_version()
+        key = (kind, language, self.catalog_version if catalog else None)
+        markup = self.entries.get(key)
+        if markup is not None:
+            self.stats['hits'] += 1
+            metrics.cache_lookup('keyboards', True)
+            return markup
+
+        self.stats['misses'] += 1
+        metrics.cache_lookup('keyboards', False)
+        built = build()
+        if built is None:
+            return None
+        markup = FrozenMarkup(built)
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                self.entries.clear()
+            self.entries[key] = markup
+        return markup
+
+    def invalidate_catalog(self):
+        """Каталог изменился: клавиатуры каталога этого процесса будут собраны заново"""
+        with self.lock:
+            self.catalog_version += 1
+            self.catalog_expires_at = time.monotonic() + self.catalog_ttl
+            self.entries = {key: markup for key, markup in self.entries.items() if key[2] is None}
+            self.stats['invalidations'] += 1
+
+    def get_stats(self):
+        return dict(self.stats, entries=len(self.entries), catalog_version=self.catalog_version,
+                    shared_version=self.shared_version)
+
+
+def read_catalog_version(db):
+    """Общая версия каталога (None, если прочитать не удалось)"""
+    rows = db.execute_query('SELECT version FROM catalog_state WHERE id = 1')
+    return rows[0][0] if rows else None
+
+
+def publish_catalog_change(db):
+    """Изменение каталога для всех процессов: увеличение общей версии и сброс своего кэша"""
+    db.execute_query('UPDATE catalog_state SET version = version + 1 WHERE id = 1')
+    keyboard_cache.invalidate_catalog()
+    if keyboard_cache.db is not None:
+        keyboard_cache.shared_version = read_catalog_version(db)
+
+
+keyboard_cache = KeyboardCache()
+
+
+def cached_keyboard(kind):
+    """Кэширование статической клавиатуры по аргументам (язык, флаги)"""
+    def decorator(build):
+        @functools.wraps(build)
+        def wrapper(*args, **kwargs):
+            variant = (args, tuple(sorted(kwargs.items()))) if args or kwargs else None
+            return keyboard_cache.get(kind, lambda: build(*args, **kwargs), variant)
+        return wrapper
+    return decorator
+
+
+@cached_keyboard('main')
 def create_main_keyboard(language='ru'):
     """Главная клавиатура"""
-    if language == 'uz':
-        return {
-            'keyboard': [
-                ['🛍 Katalog', '🛒 Savat'],
-                ['📋 Mening buyurtmalarim', '👤 Profil'],
-                ['🔍 Qidiruv', 'ℹ️ Yordam'],
-                ['📞 Biz bilan bog\'lanish'],
-                ['🧑‍💼 Sotuvchi bo\'lish']
-            ],
-            'resize_keyboard': True,
-            'one_time_keyboard': False
-        }
-    else:
-        return {
-            'keyboard': [
-                ['🛍 Каталог', '🛒 Корзина'],
-                ['📋 Мои заказы', '👤 Профиль'],
-                ['🔍 Поиск', 'ℹ️ Помощь'],
-                ['📞 Связаться с нами'],
-                ['🧑‍💼 Стать продавцом']
-            ],
-            'resize_keyboard': True,
-            'one_time_keyboard': False
-        }
+    return {
+        'keyboard': [
+            [t('btn_catalog', language=language), t('btn_cart', language=language)],
+            [t('btn_orders', language=language), t('btn_profile', language=language)],
+            [t('btn_search', language=language), t('btn_help', language=language)],
+            [t('btn_contact', language=language)],
+            [t('btn_become_seller', language=language)]
+        ],
+        'resize_keyboard': True,
+        'one_time_keyboard': False
+    }
+
+def get_category_label(category):
+    """Подпись кнопки категории (строка таблицы categories)"""
+    return f"{category[3]} {category[1]}"
+
+def get_subcategory_label(subcategory):
+    """Подпись кнопки подкатегории (id, name, emoji, ...)"""
+    return f"{subcategory[2]} {subcategory[1]}"
+
+def get_product_label(product):
+    """Подпись кнопки товара (строка таблицы products)"""
+    return f"🛍 {product[1]} - ${product[3]:.2f}"
+
+def get_catalog_label_map(kind, rows):
+    """Соответствие подпись кнопки -> (тип, id) для отрисованной клавиатуры каталога"""
+    label_getters = {
+        'category': get_category_label,
+        'subcategory': get_subcategory_label,
+        'product': get_product_label,
+    }
+    get_label = label_getters[kind]
+    labels = {}
+    for row in rows:
+        # При совпадающих подписях берется первая строка, как и в старом поиске по имени
+        labels.setdefault(get_label(row), (kind, row[0]))
+    return labels
 
 def create_categories_keyboard(categories):
     """Клавиатура с категориями"""
     keyboard = []
     
     for i in range(0, len(categories), 2):
-        row = [f"{categories[i][3]} {categories[i][1]}"]
+        row = [get_category_label(categories[i])]
         if i + 1 < len(categories):
-            row.append(f"{categories[i + 1][3]} {categories[i + 1][1]}")
+            row.append(get_category_label(categories[i + 1]))
         keyboard.append(row)
     
     keyboard.append(['🔙 Главная'])
@@ -52,9 +206,9 @@ def create_subcategories_keyboard(subcategories):
     keyboard = []
     
     for i in range(0, len(subcategories), 2):
-        row = [f"{subcategories[i][2]} {subcategories[i][1]}"]
+        row = [get_subcategory_label(subcategories[i])]
         if i + 1 < len(subcategories):
-            row.append(f"{subcategories[i + 1][2]} {subcategories[i + 1][1]}")
+            row.append(get_subcategory_label(subcategories[i + 1]))
         keyboard.append(row)
     
     keyboard.append(['🔙 К категориям', '🏠 Главная'])
@@ -69,7 +223,7 @@ def create_products_keyboard(products, show_back=True):
     keyboard = []
     
     for product in products:
-        keyboard.append([f"🛍 {product[1]} - ${product[3]:.2f}"])
+        keyboard.append([get_product_label(product)])
     
     if show_back:
         keyboard.append(['🔙 К категориям', '🏠 Главная'])
@@ -101,6 +255,7 @@ def create_product_inline_keyboard(product_id):
         ]
     }
 
+@cached_keyboard('cart')
 def create_cart_keyboard(has_items=False):
     """Клавиатура для корзины"""
     keyboard = []
@@ -144,6 +299,7 @@ def create_registration_keyboard(step, suggested_value=None):
         'one_time_keyboard': True
     }
 
+@cached_keyboard('order')
 def create_order_keyboard():
     """Клавиатура для оформления заказа"""
     return {
@@ -155,6 +311,7 @@ def create_order_keyboard():
         'one_time_keyboard': True
     }
 
+@cached_keyboard('admin')
 def create_admin_keyboard():
     """Клавиатура для администратора"""
     return {
@@ -171,6 +328,7 @@ def create_admin_keyboard():
         'one_time_keyboard': False
     }
 
+@cached_keyboard('back')
 def create_back_keyboard():
     """Простая клавиатура "Назад"""
     return {
@@ -181,6 +339,7 @@ def create_back_keyboard():
         'one_time_keyboard': False
     }
 
+@cached_keyboard('confirmation')
 def create_confirmation_keyboard():
     """Клавиатура подтверждения"""
     return {
@@ -191,6 +350,7 @@ def create_confirmation_keyboard():
         'one_time_keyboard': True
     }
 
+@cached_keyboard('search_filters')
 def create_search_filters_keyboard():
     """Клавиатура для фильтров поиска"""
     return {
@@ -210,6 +370,7 @@ def create_search_filters_keyboard():
         ]
     }
 
+@cached_keyboard('price_filter')
 def create_price_filter_keyboard():
     """Клавиатура для фильтра по цене"""
     return {
@@ -261,6 +422,7 @@ def create_order_details_keyboard(order_id):
         ]
     }
 
+@cached_keyboard('language')
 def create_language_keyboard():
     """Клавиатура выбора языка"""
     return {
@@ -272,6 +434,7 @@ def create_language_keyboard():
         'one_time_keyboard': True
     }
 
+@cached_keyboard('payment_methods')
 def create_payment_methods_keyboard(language='ru'):
     """Клавиатура способов оплаты"""
     if language == 'uz':
@@ -314,6 +477,58 @@ def create_cart_item_keyboard(cart_item_id, current_quantity):
         ]
     }
 
+def create_categories_inline_keyboard(categories):
+    """Inline-клавиатура категорий (навигация редактированием сообщения)"""
+    keyboard = []
+    
+    for i in range(0, len(categories), 2):
+        keyboard.append([
+            {'text': get_category_label(category), 'callback_data': f'open_category_{category[0]}'}
+            for category in categories[i:i + 2]
+        ])
+    
+    keyboard.append([{'text': '🛒 Корзина', 'callback_data': 'go_to_cart'}])
+    return {'inline_keyboard': keyboard}
+
+def create_subcategories_inline_keyboard(subcategories):
+    """Inline-клавиатура подкатегорий/брендов"""
+    keyboard = []
+    
+    for i in range(0, len(subcategories), 2):
+        keyboard.append([
+            {'text': get_subcategory_label(subcategory), 'callback_data': f'open_subcategory_{subcategory[0]}'}
+            for subcategory in subcategories[i:i + 2]
+        ])
+    
+    keyboard.append([{'text': '🔙 К категориям', 'callback_data': 'back_to_categories'}])
+    return {'inline_keyboard': keyboard}
+
+def create_products_inline_keyboard(products, back_callback='back_to_categories'):
+    """Inline-клавиатура товаров; back_callback — куда ведет кнопка «Назад»"""
+    keyboard = [
+        [{'text': get_product_label(product), 'callback_data': f'open_product_{product[0]}'}]
+        for product in products
+    ]
+    keyboard.append([{'text': '🔙 Назад', 'callback_data': back_callback}])
+    return {'inline_keyboard': keyboard}
+
+def create_cart_inline_keyboard(cart_items):
+    """Inline-клавиатура корзины: количество и удаление по каждой позиции"""
+    keyboard = []
+    
+    for item in cart_items:
+        keyboard.append([
+            {'text': '➖', 'callback_data': f'cart_decrease_{item[0]}'},
+            {'text': f'{item[1][:20]} × {item[3]}', 'callback_data': 'noop'},
+            {'text': '➕', 'callback_data': f'cart_increase_{item[0]}'},
+            {'text': '🗑', 'callback_data': f'cart_remove_{item[0]}'}
+        ])
+    
+    if cart_items:
+        keyboard.append([{'text': '📦 Оформить заказ', 'callback_data': 'checkout'}])
+    keyboard.append([{'text': '🛍 Продолжить покупки', 'callback_data': 'back_to_categories'}])
+    return {'inline_keyboard': keyboard}
+
 def create_admin_products_keyboard(products):
     """Клавиатура для управления товарами админом"""
     keyboard = []
@@ -331,6 +546,7 @@ def create_admin_products_keyboard(products):
     
     return {'inline_keyboard': keyboard}
 
+@cached_keyboard('notifications')
 def create_notifications_keyboard():
     """Клавиатура для управления уведомлениями"""
     return {
@@ -350,6 +566,7 @@ def create_notifications_keyboard():
         ]
     }
 
+@cached_keyboard('analytics')
 def create_analytics_keyboard():
     """Клавиатура для аналитики"""
     return {
@@ -372,6 +589,7 @@ def create_analytics_keyboard():
         ]
     }
 
+@cached_keyboard('period_selection')
 def create_period_selection_keyboard():
     """Клавиатура выбора периода для отчетов"""
     return {
@@ -395,6 +613,7 @@ def create_period_selection_keyboard():
     }
 
 
+@cached_keyboard('address_location')
 def create_address_location_keyboard():
     """Клавиатура для ввода адреса или отправки локации"""
     return {
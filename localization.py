@@ -1,6 +1,21 @@
 """
 Модуль локализации для поддержки русского и узбекского языков
 """
+import re
+from types import MappingProxyType
+
+DEFAULT_LANGUAGE = 'ru'
+
+# Замены ключевых слов в рассылках, написанных на русском
+BROADCAST_TERMS = {
+    'uz': {
+        'Скидка': 'Chegirma',
+        'Акция': 'Aksiya',
+        'Новинка': 'Yangilik',
+        'Товар': 'Mahsulot',
+    }
+}
+
 
 class Localization:
     def __init__(self):
@@ -33,6 +48,8 @@ class Localization:
                 'btn_profile': '👤 Профиль',
                 'btn_search': '🔍 Поиск',
                 'btn_help': 'ℹ️ Помощь',
+                'btn_contact': '📞 Связаться с нами',
+                'btn_become_seller': '🧑‍💼 Стать продавцом',
 
                 # Помощь
                 'help': """
@@ -129,6 +146,8 @@ Quyidagi menyudan amalni tanlang:
                 'btn_profile': '👤 Profil',
                 'btn_search': '🔍 Qidiruv',
                 'btn_help': 'ℹ️ Yordam',
+                'btn_contact': '📞 Biz bilan bog\'lanish',
+                'btn_become_seller': '🧑‍💼 Sotuvchi bo\'lish',
 
                 # Помощь
                 'help': """
@@ -197,29 +216,77 @@ Mahsulot qo'shish uchun katalogga o'ting!
                 'language_changed': '✅ Til muvaffaqiyatli o\'zgartirildi!'
             }
         }
+        self.compile()
+    
+    def compile(self):
+        """Сборка неизменяемых таблиц: по одной на язык, пропуски заполнены из русского.
+
+        Поиск перевода — один lookup в таблице языка, замены ключевых слов
+        рассылок собираются в одно регулярное выражение на язык.
+        """
+        default = self.translations[DEFAULT_LANGUAGE]
+        catalogs = {}
+        for language, texts in self.translations.items():
+            table = dict(default)
+            table.update(texts)
+            catalogs[language] = MappingProxyType(table)
+        
+        self.catalogs = MappingProxyType(catalogs)
+        self.default_catalog = catalogs[DEFAULT_LANGUAGE]
+        self.broadcast_patterns = {
+            language: (re.compile('|'.join(map(re.escape, sorted(terms, key=len, reverse=True)))), terms)
+            for language, terms in BROADCAST_TERMS.items()
+        }
     
     def get_text(self, key, language='ru'):
         """Получение переведенного текста"""
-        return self.translations.get(language, self.translations['ru']).get(key, key)
+        return self.catalogs.get(language, self.default_catalog).get(key, key)
+    
+    def get_all_texts(self, key):
+        """Все переводы ключа (для сопоставления нажатых кнопок на любом языке)"""
+        return [texts[key] for texts in self.translations.values() if key in texts]
+    
+    def localize_broadcast(self, message, language):
+        """Рассылка, написанная на русском, для языка language (замены ключевых слов)"""
+        compiled = self.broadcast_patterns.get(language)
+        if compiled is None:
+            return message
+        pattern, terms = compiled
+        return pattern.sub(lambda match: terms[match.group(0)], message)
 
 # Глобальный экземпляр локализации
 localization = Localization()
 
+def get_session_language(db, telegram_id):
+    """Язык из состояния сессии (None, если пользователь еще не встречался)"""
+    from session_store import get_session_store
+    return get_session_store(db, 'language').get(telegram_id)
+
+def remember_user_language(db, telegram_id, language):
+    """Запоминание языка в сессии (регистрация, смена языка)"""
+    from session_store import get_session_store
+    get_session_store(db, 'language')[telegram_id] = language or DEFAULT_LANGUAGE
+
 def get_user_language(db, telegram_id):
-    """Получение языка пользователя"""
+    """Получение языка пользователя: из сессии, при промахе — из БД"""
     try:
+        language = get_session_language(db, telegram_id)
+        if language:
+            return language
         user_data = db.get_user_by_telegram_id(telegram_id)
         if user_data:
-            return user_data[0][5]  # language поле
+            language = user_data[0][5] or DEFAULT_LANGUAGE  # language поле
+            remember_user_language(db, telegram_id, language)
+            return language
     except Exception:
         pass
-    return 'ru'  # По умолчанию русский
+    return DEFAULT_LANGUAGE  # По умолчанию русский
 
 def t(key, telegram_id=None, db=None, language=None):
     """Быстрая функция для получения переведенного текста"""
     if language is None and telegram_id and db:
         language = get_user_language(db, telegram_id)
     elif language is None:
-        language = 'ru'
+        language = DEFAULT_LANGUAGE
     
-    return localization.get_text(key, language)
\ No newline at end of file
+    return localization.get_text(key, language)
@@ -0,0 +1,116 @@
+"""
+Буферизованная пакетная запись журналов аудита в базу данных
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+
+class BufferedLogWriter:
+    """Асинхронная запись строк журналов пачками через executemany.
+
+    Строки копятся в ограниченной очереди и сбрасываются фоновым потоком
+    каждые batch_size строк или flush_interval секунд. При переполнении
+    очереди новые строки отбрасываются (запросы пользователей не ждут
+    журнала), число потерь считается в stats['dropped']. При завершении
+    процесса остаток очереди записывается синхронно.
+    """
+
+    def __init__(self, db, max_buffer=10000, batch_size=200, flush_interval=0.5):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = queue.Queue(maxsize=max_buffer)
+        self.flush_lock = threading.Lock()
+        self.stats = {'written': 0, 'dropped': 0, 'failed': 0}
+        self.running = True
+
+        self.worker = threading.Thread(target=self.flush_worker, name="log-writer", daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+
+    def write(self, query, params):
+        """Постановка строки в очередь. False, если строка отброшена"""
+        try:
+            self.buffer.put_nowait((query, params))
+            return True
+        except queue.Full:
+            self.stats['dropped'] += 1
+            if self.stats['dropped'] % 1000 == 1:
+                logging.info(f"Буфер журналов переполнен, отброшено строк: {self.stats['dropped']}")
+            return False
+
+    def flush_worker(self):
+        while self.running:
+            try:
+                batch = [self.buffer.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.buffer.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.write_batch(batch)
+
+    def write_batch(self, batch):
+        """Группировка по запросу и запись одной транзакцией на запрос"""
+        grouped = {}
+        for query, params in batch:
+            grouped.setdefault(query, []).append(params)
+
+        with self.flush_lock:
+            for query, rows in grouped.items():
+                result = self.db.execute_many(query, rows)
+                if result is None:
+                    self.stats['failed'] += len(rows)
+                else:
+                    self.stats['written'] += len(rows)
+
+    def flush(self):
+        """Синхронная запись всего, что сейчас в очереди"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.buffer.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write_batch(batch)
+
+    def close(self):
+        """Остановка фонового потока и запись остатка"""
+        if not self.running:
+            return
+        self.running = False
+        self.worker.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(db):
+    """Общий буферизованный writer для экземпляра DatabaseManager"""
+    with _writers_lock:
+        writer = _writers.get(id(db))
+        if writer is None:
+            try:
+                from config import LOGGING_CONFIG
+            except Exception:
+                LOGGING_CONFIG = {}
+            writer = BufferedLogWriter(
+                db,
+                max_buffer=LOGGING_CONFIG.get('audit_buffer_size', 10000),
+                batch_size=LOGGING_CONFIG.get('audit_batch_size', 200),
+                flush_interval=LOGGING_CONFIG.get('audit_flush_interval', 0.5)
+            )
+            _writers[id(db)] = writer
+        return writer
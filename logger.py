@@ -2,104 +2,284 @@
 Система логирования для продакшена
 """
 
+import atexit
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import random
 import sys
+import time
 from datetime import datetime
 from config import LOGGING_CONFIG
 
+# Стандартные атрибуты LogRecord: все остальное пришло через extra
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной JSON-строкой; поля из extra попадают в корень объекта"""
+    
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'location': f"{record.filename}:{record.lineno}",
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Пропускает только долю DEBUG-записей; доля задается по префиксу имени логгера"""
+    
+    def __init__(self, default_rate=1.0, rates=None):
+        super().__init__()
+        self.default_rate = default_rate
+        # Длинные префиксы проверяются первыми
+        self.rates = sorted((rates or {}).items(), key=lambda item: -len(item[0]))
+    
+    def get_rate(self, name):
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + '.'):
+                return rate
+        return self.default_rate
+    
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self.get_rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в потоке вызова и без ожидания очереди.
+    
+    Стандартный prepare() форматирует сообщение до постановки в очередь;
+    здесь запись передается как есть, а getMessage() и форматтеры
+    вызываются уже в потоке QueueListener. При переполнении запись
+    отбрасывается, число потерь хранится в dropped.
+    """
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sample_rates(value):
+    """'database=0.01,handlers=0.1' -> {'database': 0.01, 'handlers': 0.1}"""
+    rates = {}
+    for part in (value or '').split(','):
+        name, _, rate = part.partition('=')
+        try:
+            rates[name.strip()] = float(rate)
+        except ValueError:
+            continue
+    return rates
+
+
 class ProductionLogger:
+    """Логи пишутся в очередь; stdout и файлы обслуживает отдельный поток QueueListener"""
+    
     def __init__(self):
+        self.listener = None
         self.setup_logging()
+        atexit.register(self.stop)
     
-    def setup_logging(self):
+    @staticmethod
+    def get_log_files(worker_index=None):
+        """Файлы (основной, ошибки, безопасность); у рабочего процесса supervisor — свои.
+        
+        RotatingFileHandler не переживает запись из нескольких процессов: после
+        ротации одним процессом остальные пишут в переименованный файл.
+        """
+        log_file = LOGGING_CONFIG['file']
+        security_file = 'logs/security.log'
+        if worker_index is not None:
+            root, ext = os.path.splitext(log_file)
+            log_file = f"{root}.worker{worker_index}{ext or '.log'}"
+            security_file = f"logs/security.worker{worker_index}.log"
+        return log_file, log_file.replace('.log', '_errors.log'), security_file
+    
+    def setup_logging(self, worker_index=None):
         """Настройка системы логирования"""
+        if self.listener is not None:
+            self.stop()
+        log_file, error_file, security_file = self.get_log_files(worker_index)
+        
         # Создаем директорию для логов
-        log_dir = os.path.dirname(LOGGING_CONFIG['file']) or 'logs'
+        log_dir = os.path.dirname(log_file) or 'logs'
         os.makedirs(log_dir, exist_ok=True)
+        os.makedirs('logs', exist_ok=True)
         
         # Основной логгер
         self.logger = logging.getLogger('shop_bot')
         self.logger.setLevel(getattr(logging, LOGGING_CONFIG['level']))
+        self.logger.propagate = False
         
         # Очищаем существующие обработчики
         self.logger.handlers.clear()
         
         # Форматтер
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
-        )
+        if LOGGING_CONFIG['format'] == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+            )
         
         # Консольный вывод
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
         
-        # Файловый вывод с ротацией
+        # Файловый вывод с ротацией; файл открывается при первой записи
         file_handler = logging.handlers.RotatingFileHandler(
-            LOGGING_CONFIG['file'],
+            log_file,
             maxBytes=LOGGING_CONFIG['max_size'],
             backupCount=LOGGING_CONFIG['backup_count'],
-            encoding='utf-8'
+            encoding='utf-8',
+            delay=True
         )
         file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
         
         # Отдельный файл для ошибок
         error_handler = logging.handlers.RotatingFileHandler(
-            LOGGING_CONFIG['file'].replace('.log', '_errors.log'),
+            error_file,
             maxBytes=LOGGING_CONFIG['max_size'],
             backupCount=LOGGING_CONFIG['backup_count'],
-            encoding='utf-8'
+            encoding='utf-8',
+            delay=True
         )
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(formatter)
-        self.logger.addHandler(error_handler)
         
-        # Логгер для безопасности
-        self.security_logger = logging.getLogger('shop_bot.security')
+        # Файл безопасности получает только записи shop_bot.security
         security_handler = logging.handlers.RotatingFileHandler(
-            'logs/security.log',
+            security_file,
             maxBytes=LOGGING_CONFIG['max_size'],
             backupCount=LOGGING_CONFIG['backup_count'],
-            encoding='utf-8'
+            encoding='utf-8',
+            delay=True
         )
         security_handler.setFormatter(formatter)
-        self.security_logger.addHandler(security_handler)
+        security_handler.addFilter(logging.Filter('shop_bot.security'))
+        
+        # Поток обновлений только кладет запись в очередь
+        self.queue_handler = NonBlockingQueueHandler(queue.Queue(LOGGING_CONFIG['queue_size']))
+        self.queue_handler.addFilter(DebugSamplingFilter(
+            LOGGING_CONFIG['debug_sample_rate'],
+            parse_sample_rates(LOGGING_CONFIG['debug_sample_rates'])
+        ))
+        self.listener = logging.handlers.QueueListener(
+            self.queue_handler.queue,
+            console_handler, file_handler, error_handler, security_handler,
+            respect_handler_level=True
+        )
+        self.listener.start()
+        
+        self.logger.addHandler(self.queue_handler)
+        
+        # Модули, пишущие через logging.*, идут в ту же очередь (уровень корня не меняется)
+        root_logger = logging.getLogger()
+        root_logger.handlers = [handler for handler in root_logger.handlers if not isinstance(handler, NonBlockingQueueHandler)]
+        root_logger.addHandler(self.queue_handler)
+        
+        # Логгер для безопасности
+        self.security_logger = logging.getLogger('shop_bot.security')
         self.security_logger.setLevel(logging.INFO)
     
-    def info(self, message, extra=None):
+    def stop(self):
+        """Запись остатка очереди при завершении процесса"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+    
+    def use_worker_files(self, worker_index):
+        """Переключение рабочего процесса supervisor на его собственные файлы логов"""
+        self.setup_logging(worker_index)
+    
+    def debug(self, message, *args, extra=None):
+        """Отладочное сообщение (выборочно, см. debug_sample_rates)"""
+        self.logger.debug(message, *args, extra=extra, stacklevel=2)
+    
+    def info(self, message, *args, extra=None):
         """Информационное сообщение"""
-        self.logger.info(message, extra=extra)
+        self.logger.info(message, *args, extra=extra, stacklevel=2)
     
-    def warning(self, message, extra=None):
+    def warning(self, message, *args, extra=None):
         """Предупреждение"""
-        self.logger.warning(message, extra=extra)
+        self.logger.warning(message, *args, extra=extra, stacklevel=2)
     
-    def error(self, message, exc_info=None, extra=None):
+    def error(self, message, *args, exc_info=None, extra=None):
         """Ошибка"""
-        self.logger.error(message, exc_info=exc_info, extra=extra)
+        self.logger.error(message, *args, exc_info=exc_info, extra=extra, stacklevel=2)
     
-    def critical(self, message, exc_info=None, extra=None):
+    def critical(self, message, *args, exc_info=None, extra=None):
         """Критическая ошибка"""
-        self.logger.critical(message, exc_info=exc_info, extra=extra)
+        self.logger.critical(message, *args, exc_info=exc_info, extra=extra, stacklevel=2)
     
     def security(self, message, user_id=None, action=None):
         """Лог безопасности"""
-        extra_info = {
-            'user_id': user_id,
-            'action': action,
-            'timestamp': datetime.now().isoformat()
-        }
-        self.security_logger.info(f"SECURITY: {message}", extra=extra_info)
+        self.security_logger.info("SECURITY: %s", message, extra={'user_id': user_id, 'action': action}, stacklevel=2)
     
     def performance(self, operation, duration, details=None):
         """Лог производительности"""
-        perf_message = f"PERFORMANCE: {operation} took {duration:.3f}s"
         if details:
-            perf_message += f" - {details}"
-        self.logger.info(perf_message)
+            self.logger.info("PERFORMANCE: %s took %.3fs - %s", operation, duration, details,
+                             extra={'operation': operation, 'duration': duration}, stacklevel=2)
+        else:
+            self.logger.info("PERFORMANCE: %s took %.3fs", operation, duration,
+                             extra={'operation': operation, 'duration': duration}, stacklevel=2)
+    
+    def get_stats(self):
+        return {
+            'queued': self.queue_handler.queue.qsize(),
+            'dropped': self.queue_handler.dropped
+        }
+
+
+def measure_log_overhead(iterations=10000):
+    """Время одного вызова в потоке приложения, мкс: (info, отключенный debug).
+    
+    Записи уходят в отдельную очередь без обработчиков, поэтому меряется
+    ровно то, что платит поток обновлений, и в файлы ничего не пишется.
+    """
+    bench_logger = logging.getLogger('shop_bot.benchmark')
+    bench_logger.propagate = False
+    bench_logger.handlers = [NonBlockingQueueHandler(queue.Queue(iterations + 1))]
+    bench_logger.setLevel(logging.INFO)
+    
+    started = time.perf_counter()
+    for index in range(iterations):
+        bench_logger.info("benchmark %s of %s", index, iterations)
+    info_cost = (time.perf_counter() - started) / iterations
+    
+    started = time.perf_counter()
+    for index in range(iterations):
+        bench_logger.debug("benchmark %s of %s", index, iterations)
+    debug_cost = (time.perf_counter() - started) / iterations
+    return info_cost * 1e6, debug_cost * 1e6
 
 # Глобальный экземпляр логгера
-logger = ProductionLogger()
\ No newline at end of file
+logger = ProductionLogger()
+
+if __name__ == "__main__":
+    info_us, debug_us = measure_log_overhead()
+    logger.info("Стоимость вызова лога: info %.2f мкс, отключенный debug %.3f мкс", info_us, debug_us)
@@ -1,29 +1,35 @@
 """
 Главный файл запуска телеграм-бота интернет-магазина
 """
+import argparse
 import logging
 
 import json
 import urllib.request
 import urllib.parse
+import urllib.error
 import os
 import time
 import signal
 import sys
 import threading
+from startup import startup_profiler, import_optional, lazy_subsystem, run_parallel
 from database import DatabaseManager
 from handlers import MessageHandler
 from notifications import NotificationManager
-from utils import format_date
 from payments import PaymentProcessor
-from logistics import LogisticsManager
-from promotions import PromotionManager
-from crm import CRMManager
 from logger import logger
 from health_check import HealthMonitor
 from database_backup import DatabaseBackup
-from scheduled_posts import ScheduledPostsManager
-from config import BOT_CONFIG, BOT_TOKEN
+from router import Router
+from callback_responder import CallbackResponder
+from admin_alerts import get_admin_alerts
+from keyboards import keyboard_cache, serialize_markup, publish_catalog_change
+from counters import get_counter_aggregator
+from webhook_server import TelegramWebhookServer
+from partner_api import APIManager, PartnerAPIServer
+from metrics import metrics
+from config import BOT_CONFIG, BOT_TOKEN, API_CONFIG, MONITORING_CONFIG
 
 # Импорты с обработкой ошибок
 from datetime import datetime
@@ -45,42 +51,20 @@ except ImportError:
     WebhookManager = None
     logging.info("⚠️ WebhookManager не найден, webhook'и недоступны")
 
-try:
-    from analytics import AnalyticsManager
-except ImportError:
-    AnalyticsManager = None
-    logging.info("⚠️ AnalyticsManager не найден, аналитика недоступна")
-
-try:
-    from financial_reports import FinancialReportsManager
-except ImportError:
-    FinancialReportsManager = None
-    logging.info("⚠️ FinancialReportsManager не найден, финансовые отчеты недоступны")
-
-try:
-    from inventory_management import InventoryManager
-except ImportError:
-    InventoryManager = None
-    logging.info("⚠️ InventoryManager не найден, управление складом недоступно")
-
-try:
-    from ai_features import AIRecommendationEngine, ChatbotSupport, SmartNotificationAI
-except ImportError:
-    AIRecommendationEngine = None
-    ChatbotSupport = None
-    SmartNotificationAI = None
-    logging.info("⚠️ AI модули не найдены, AI функции недоступны")
-
-try:
-    from marketing_automation import MarketingAutomationManager
-except ImportError:
-    MarketingAutomationManager = None
-    logging.info("⚠️ MarketingAutomationManager не найден, автоматизация недоступна")
+# Модули отчетов, склада, AI, маркетинга, логистики и CRM импортируются
+# при первом обращении к подсистеме (см. lazy_subsystem ниже)
+startup_profiler.mark('import', 'main: базовые модули')
 
 class TelegramShopBot:
-    def __init__(self, token):
+    def __init__(self, token, worker_index=None, start_services=True):
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{token}"
+        # start_services=False (--profile-startup): объекты создаются, но потоки, серверы,
+        # фоновые задачи и рассылки не запускаются — бот ничего не отправляет и не меняет
+        self.start_services = start_services
+        # В режиме supervisor фоновые задачи (рассылки, бэкапы, отчеты) выполняет только worker 0
+        self.worker_index = worker_index
+        self.is_primary = worker_index in (None, 0)
+        self.base_url = f"{BOT_CONFIG['api_url']}/bot{token}"
         self.offset = 0
         self.running = True
         self.error_count = 0
@@ -89,112 +73,260 @@ class TelegramShopBot:
         self.last_data_reload = time.time()
         
         # Инициализация компонентов
-        self.db = DatabaseManager()
-        self.setup_admin_from_env()
-        self.backup_manager = DatabaseBackup(self.db.db_path)
-        self.message_handler = MessageHandler(self, self.db)
-        self.notification_manager = NotificationManager(self, self.db)
+        with startup_profiler.measure('init', 'database'):
+            self.db = DatabaseManager()
+            self.setup_admin_from_env()
+            # Версия каталога общая для всех рабочих процессов
+            keyboard_cache.attach(self.db)
+        
+        # Независимые друг от друга компоненты создаются параллельно:
+        # их конструкторы в основном ждут БД, хранилище состояний и Redis
+        core = run_parallel({
+            'message_handler': lambda: MessageHandler(self, self.db),
+            'notification_manager': lambda: NotificationManager(self, self.db),
+            'health_monitor': lambda: HealthMonitor(self.db, self, start=start_services),
+            'admin_handler': lambda: AdminHandler(self, self.db) if AdminHandler else None,
+            'security_manager': lambda: SecurityManager(self.db) if SecurityManager else None,
+        }, workers=BOT_CONFIG['startup_workers'])
+        self.message_handler = core['message_handler']
+        self.notification_manager = core['notification_manager']
+        self.health_monitor = core['health_monitor']
+        self.admin_handler = core['admin_handler']
+        self.security_manager = core['security_manager']
+        self.callback_responder = CallbackResponder(self, BOT_CONFIG['callback_ack_workers'])
         self.payment_processor = PaymentProcessor()
         
-        # Система мониторинга
-        self.health_monitor = HealthMonitor(self.db, self)
-        
-        # Инициализация админ-панели
-        if AdminHandler:
-            self.admin_handler = AdminHandler(self, self.db)
-        else:
-            self.admin_handler = None
-        
-        # Инициализация бизнес-модулей
-        self.logistics_manager = LogisticsManager(self.db)
-        self.promotion_manager = PromotionManager(self.db)
-        self.crm_manager = CRMManager(self.db)
-        
         # Связываем компоненты
         self.message_handler.notification_manager = self.notification_manager
-        self.admin_handler.notification_manager = self.notification_manager
         self.message_handler.payment_processor = self.payment_processor
-        
-        # Инициализируем безопасность
-        if SecurityManager:
-            self.security_manager = SecurityManager(self.db)
-        else:
-            self.security_manager = None
+        if self.admin_handler:
+            self.admin_handler.notification_manager = self.notification_manager
+            self.admin_handler.security_manager = self.security_manager
         
         # Инициализируем webhook'и
         if WebhookManager and self.security_manager:
-            self.webhook_manager = WebhookManager(self, self.db, self.security_manager)
+            # События оплаты обрабатывает только основной процесс, рабочие лишь записывают их
+            self.webhook_manager = WebhookManager(
+                self, self.db, self.security_manager, process_events=self.is_primary and start_services
+            )
         else:
             self.webhook_manager = None
         
-        # Запускаем аналитические отчеты
-        if AnalyticsManager:
-            self.analytics = AnalyticsManager(self.db)
-            self.analytics.schedule_analytics_reports()
-        else:
-            self.analytics = None
+        # API для партнеров (каталог и заказы)
+        self.api_manager = APIManager(
+            self.db,
+            self.security_manager,
+            catalog_cache_ttl=API_CONFIG['catalog_cache_ttl'],
+            keys_reload_interval=API_CONFIG['keys_reload_interval'],
+            max_page_size=API_CONFIG['max_page_size']
+        )
+        
+        # Фоновые задачи основного процесса (бэкапы, API, отчеты, автопосты,
+        # маркетинг, проверки склада) запускаются отдельным потоком и не
+        # задерживают прием обновлений. До их готовности атрибуты равны None.
+        self.backup_manager = None
+        self.api_server = None
+        self.marketing_automation = None
+        self.scheduled_posts = None
+        self.background_init = None
+        if self.is_primary:
+            self.background_init = threading.Thread(target=self.start_background_services, name="background-init", daemon=True)
+            self.background_init.start()
         
-        # Инициализируем финансовую отчетность
-        if FinancialReportsManager:
-            self.financial_reports = FinancialReportsManager(self.db)
-        else:
-            self.financial_reports = None
-        
-        # Инициализируем управление складом
-        if InventoryManager:
-            self.inventory_manager = InventoryManager(self.db)
-            self.inventory_manager.bot = self  # Добавляем ссылку на бота
-        else:
-            self.inventory_manager = None
+        # Настройка обработчиков сигналов
+        signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)
         
-        # Инициализируем AI функции
-        if AIRecommendationEngine:
-            self.ai_recommendations = AIRecommendationEngine(self.db)
-        else:
-            self.ai_recommendations = None
-            
-        if ChatbotSupport:
-            self.chatbot_support = ChatbotSupport(self.db)
-        else:
-            self.chatbot_support = None
-            
-        if SmartNotificationAI:
-            self.smart_notifications = SmartNotificationAI(self.db)
-        else:
-            self.smart_notifications = None
+        # Таблицы маршрутов админ-команд и callback'ов
+        self.build_update_routers()
         
-        # Инициализируем маркетинговую автоматизацию
-        if MarketingAutomationManager:
-            self.marketing_automation = MarketingAutomationManager(self.db, self.notification_manager)
-        else:
-            self.marketing_automation = None
+        # Метрики Prometheus
+        self.register_queue_metrics()
+        if MONITORING_CONFIG['metrics_enabled'] and start_services:
+            # Рабочие процессы supervisor'а слушают соседние порты: 8000, 8001, ...
+            metrics.start_server(MONITORING_CONFIG['prometheus_port'] + (worker_index or 0))
         
-        # Инициализируем систему автоматических постов
-        try:
-            from scheduled_posts import ScheduledPostsManager
-            self.scheduled_posts = ScheduledPostsManager(self, self.db)
-            # Передаем ссылку на бота в менеджер постов
-            self.scheduled_posts.bot = self
-            logger.info("✅ Система автоматических постов инициализирована")
-        except Exception as e:
-            logger.warning(f"⚠️ Автопосты недоступны (модуль schedule не установлен): {e}")
-            self.scheduled_posts = None
+        # Запускаем проверку обновлений данных
+        if start_services:
+            self.start_data_sync_monitor()
         
-        # Запускаем автоматические проверки склада ПОСЛЕ инициализации всех компонентов
-        self.schedule_inventory_checks()
+        logger.info("✅ Бот инициализирован успешно")
+    
+    # Редко используемые подсистемы создаются при первом обращении к атрибуту
+    @lazy_subsystem
+    def logistics_manager(self):
+        LogisticsManager = import_optional('logistics', 'LogisticsManager')
+        return LogisticsManager(self.db) if LogisticsManager else None
+    
+    @lazy_subsystem
+    def promotion_manager(self):
+        PromotionManager = import_optional('promotions', 'PromotionManager')
+        return PromotionManager(self.db) if PromotionManager else None
+    
+    @lazy_subsystem
+    def crm_manager(self):
+        CRMManager = import_optional('crm', 'CRMManager')
+        return CRMManager(self.db) if CRMManager else None
+    
+    @lazy_subsystem
+    def analytics(self):
+        AnalyticsManager = import_optional('analytics', 'AnalyticsManager')
+        return AnalyticsManager(self.db) if AnalyticsManager else None
+    
+    @lazy_subsystem
+    def financial_reports(self):
+        FinancialReportsManager = import_optional('financial_reports', 'FinancialReportsManager')
+        return FinancialReportsManager(self.db) if FinancialReportsManager else None
+    
+    @lazy_subsystem
+    def inventory_manager(self):
+        InventoryManager = import_optional('inventory_management', 'InventoryManager')
+        if not InventoryManager:
+            return None
+        inventory_manager = InventoryManager(self.db)
+        inventory_manager.bot = self  # Добавляем ссылку на бота
+        return inventory_manager
+    
+    @lazy_subsystem
+    def ai_recommendations(self):
+        AIRecommendationEngine = import_optional('ai_features', 'AIRecommendationEngine')
+        return AIRecommendationEngine(self.db) if AIRecommendationEngine else None
+    
+    @lazy_subsystem
+    def chatbot_support(self):
+        ChatbotSupport = import_optional('ai_features', 'ChatbotSupport')
+        return ChatbotSupport(self.db) if ChatbotSupport else None
+    
+    @lazy_subsystem
+    def smart_notifications(self):
+        SmartNotificationAI = import_optional('ai_features', 'SmartNotificationAI')
+        return SmartNotificationAI(self.db) if SmartNotificationAI else None
+    
+    LAZY_SUBSYSTEMS = [
+        'logistics_manager', 'promotion_manager', 'crm_manager', 'analytics', 'financial_reports',
+        'inventory_manager', 'ai_recommendations', 'chatbot_support', 'smart_notifications'
+    ]
+    
+    def start_background_services(self):
+        """Фоновые задачи основного процесса (поток background-init).
+
+        При start_services=False объекты только создаются — для замера времени.
+        """
+        start = self.start_services
+        
+        def start_api_server():
+            if not API_CONFIG['enabled']:
+                return None
+            api_server = PartnerAPIServer(self.api_manager, API_CONFIG['host'], API_CONFIG['port'])
+            if start:
+                api_server.start()
+            return api_server
+        
+        def start_analytics_reports():
+            if self.analytics and start:
+                self.analytics.schedule_analytics_reports()
+        
+        def start_marketing_automation():
+            MarketingAutomationManager = import_optional('marketing_automation', 'MarketingAutomationManager')
+            if not MarketingAutomationManager:
+                return None
+            return MarketingAutomationManager(self.db, self.notification_manager, start=start)
+        
+        def start_scheduled_posts():
+            try:
+                from scheduled_posts import ScheduledPostsManager
+                scheduled_posts = ScheduledPostsManager(self, self.db)
+                # Передаем ссылку на бота в менеджер постов
+                scheduled_posts.bot = self
+                if start:
+                    scheduled_posts.start()
+                logger.info("✅ Система автоматических постов инициализирована")
+                return scheduled_posts
+            except Exception as e:
+                logger.warning(f"⚠️ Автопосты недоступны (модуль schedule не установлен): {e}")
+                return None
+        
+        def start_inventory_checks():
+            # Первое обращение к inventory_manager создает его в этом потоке
+            if start:
+                self.schedule_inventory_checks()
+            else:
+                self.inventory_manager
+        
+        services = run_parallel({
+            'backup_manager': lambda: DatabaseBackup(self.db.db_path, start=start),
+            'api_server': start_api_server,
+            'analytics_reports': start_analytics_reports,
+            'marketing_automation': start_marketing_automation,
+            'scheduled_posts': start_scheduled_posts,
+            'inventory_checks': start_inventory_checks,
+        }, workers=BOT_CONFIG['startup_workers'], optional=True)
+        self.backup_manager = services['backup_manager']
+        self.api_server = services['api_server']
+        self.scheduled_posts = services['scheduled_posts']
+        self.marketing_automation = services['marketing_automation']
         
         # Инициализируем автоматизацию маркетинга только если модуль доступен
-        if self.marketing_automation:
+        if self.marketing_automation and start:
             self.setup_default_automation_rules()
+        logger.info("✅ Фоновые задачи запущены" if start else "✅ Фоновые подсистемы созданы (без запуска)")
+    
+    def build_update_routers(self):
+        """Сборка маршрутов админ-панели (пустые таблицы, если админка недоступна)"""
+        self.admin_message_router = Router('admin_messages')
+        self.admin_callback_router = Router('admin_callbacks')
         
-        # Настройка обработчиков сигналов
-        signal.signal(signal.SIGINT, self.signal_handler)
-        signal.signal(signal.SIGTERM, self.signal_handler)
-        
-        # Запускаем проверку обновлений данных
-        self.start_data_sync_monitor()
+        admin = self.admin_handler
+        if not admin:
+            return
         
-        logger.info("✅ Бот инициализирован успешно")
+        def admin_callback(method_name):
+            # Обработчики, которых может не быть в AdminHandler, уходят в общий callback
+            return lambda callback_query: getattr(admin, method_name, admin.handle_callback_query)(callback_query)
+        
+        def handle_order_management(message):
+            if admin.is_admin(message['from']['id']):
+                admin.handle_order_management(message)
+            else:
+                admin.handle_admin_command(message)
+        
+        self.admin_message_router.add_prefix('/admin', admin.handle_admin_command, 'admin_command')
+        self.admin_message_router.add_exact([
+            '📊 Статистика', '📦 Заказы', '🛠 Товары', '👥 Пользователи', '🔙 Пользовательский режим',
+            '📈 Аналитика', '🛡 Безопасность', '💰 Финансы', '📦 Склад', '🤖 AI', '🎯 Автоматизация',
+            '👥 CRM', '📢 Рассылка'
+        ], admin.handle_admin_command, 'admin_button')
+        self.admin_message_router.add_prefix('/admin_order_', handle_order_management, 'admin_order')
+        self.admin_message_router.add_prefix(['/edit_product_', '/delete_product_'], admin.handle_product_commands, 'admin_product')
+        
+        self.admin_callback_router.add_prefix(['admin_', 'change_status_', 'order_details_'], admin.handle_callback_query, 'admin_callback')
+        self.admin_callback_router.add_prefix(['analytics_', 'period_'], admin.handle_analytics_callback, 'admin_analytics')
+        self.admin_callback_router.add_prefix('export_', admin_callback('handle_export_callback'), 'admin_export')
+        self.admin_callback_router.add_prefix(['security_', 'unblock_user_'], admin_callback('handle_security_callback'), 'admin_security')
+        self.admin_callback_router.add_prefix('broadcast_', admin_callback('handle_broadcast_callback'), 'admin_broadcast')
+    
+    def register_queue_metrics(self):
+        """Глубины внутренних очередей для /metrics"""
+        metrics.register_queue('log_records', lambda: logger.get_stats()['queued'])
+        metrics.register_queue('callback_acks', self.callback_responder.ack_queue.qsize)
+        metrics.register_queue('admin_alerts', get_admin_alerts(self, self.db).send_queue.qsize)
+        metrics.register_queue('product_counters', lambda: len(get_counter_aggregator(self.db).pending))
+        if self.security_manager:
+            metrics.register_queue('audit_log', self.security_manager.audit_log.buffer.qsize)
+        if self.webhook_manager:
+            metrics.register_queue('payment_events', self.webhook_manager.event_queue.qsize)
+        # Автопосты создаются в background-init, поэтому глубина читается при каждом сборе
+        metrics.register_queue(
+            'post_delivery',
+            lambda: self.scheduled_posts.delivery_pipeline.task_queue.qsize() if self.scheduled_posts else 0
+        )
+    
+    def get_route_stats(self):
+        """Счетчики вызовов и задержек по всем маршрутам"""
+        stats = self.message_handler.get_route_stats()
+        for router in (self.admin_message_router, self.admin_callback_router):
+            stats[router.name] = router.get_stats()
+        return stats
     
     def start_data_sync_monitor(self):
         """Запуск мониторинга обновлений данных"""
@@ -294,6 +426,12 @@ class TelegramShopBot:
                 'SELECT * FROM products WHERE is_active = 1 ORDER BY name'
             )
             
+            # Кэш каталога и ключей API для партнеров; клавиатуры каталога —
+            # во всех процессах: флаг обновления видит только один из них
+            self.api_manager.invalidate_catalog()
+            publish_catalog_change(self.db)
+            self.api_manager.invalidate_api_keys()
+            
             # Перезагружаем автопосты если есть модуль
             if hasattr(self, 'scheduled_posts') and self.scheduled_posts:
                 self.scheduled_posts.load_schedule_from_database()
@@ -307,19 +445,14 @@ class TelegramShopBot:
     def notify_admins_about_update(self):
         """Уведомление админов об обновлении данных"""
         try:
-            admins = self.db.execute_query('SELECT telegram_id FROM users WHERE is_admin = 1')
-            
             update_message = "🔄 <b>Данные обновлены!</b>\n\n"
             update_message += "✅ Каталог товаров синхронизирован\n"
             update_message += "✅ Категории обновлены\n"
             update_message += "✅ Автопосты перезагружены\n\n"
             update_message += f"⏰ {datetime.now().strftime('%H:%M:%S')}"
             
-            for admin in admins:
-                try:
-                    self.send_message(admin[0], update_message)
-                except Exception as e:
-                    logger.error(f"Ошибка уведомления админа {admin[0]}: {e}")
+            # Частые обновления из веб-панели склеиваются в одно уведомление
+            get_admin_alerts(self, self.db).notify(update_message, key='data_update')
                     
         except Exception as e:
             logger.error(f"Ошибка уведомления админов: {e}")
@@ -359,6 +492,7 @@ class TelegramShopBot:
                             (admin_telegram_id,)
                         )
                         logger.info(f"✅ Права админа обновлены для {admin_name}")
+                        get_admin_alerts(self, self.db).invalidate_roster()
                     else:
                         logger.info(f"✅ Админ уже существует: {admin_name}")
                 else:
@@ -368,6 +502,7 @@ class TelegramShopBot:
                         VALUES (?, ?, 1, 'ru', CURRENT_TIMESTAMP)
                     ''', (admin_telegram_id, admin_name))
                     logger.info(f"✅ Новый админ создан: {admin_name} (ID: {admin_telegram_id})")
+                    get_admin_alerts(self, self.db).invalidate_roster()
                     
             except ValueError:
                 logger.error(f"❌ Неверный ADMIN_TELEGRAM_ID: {admin_telegram_id}")
@@ -439,7 +574,6 @@ class TelegramShopBot:
     
     def send_message(self, chat_id, text, reply_markup=None):
         """Отправка сообщения"""
-        url = f"{self.base_url}/sendMessage"
         data = {
             'chat_id': chat_id,
             'text': text,
@@ -447,23 +581,15 @@ class TelegramShopBot:
         }
         
         if reply_markup:
-            data['reply_markup'] = json.dumps(reply_markup)
+            data['reply_markup'] = serialize_markup(reply_markup)
         
-        try:
-            data_encoded = urllib.parse.urlencode(data).encode('utf-8')
-            req = urllib.request.Request(url, data=data_encoded, method='POST')
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                if not result.get('ok'):
-                    logging.info(f"Ошибка отправки сообщения: {result}")
-                return result
-        except Exception as e:
-            logging.info(f"Ошибка отправки сообщения: {e}")
-            return None
+        result = self.call_api('sendMessage', data)
+        if result is not None and not result.get('ok'):
+            logging.info(f"Ошибка отправки сообщения: {result}")
+        return result
     
     def send_photo(self, chat_id, photo_url, caption="", reply_markup=None):
         """Отправка фото"""
-        url = f"{self.base_url}/sendPhoto"
         data = {
             'chat_id': chat_id,
             'photo': photo_url,
@@ -472,19 +598,12 @@ class TelegramShopBot:
         }
         
         if reply_markup:
-            data['reply_markup'] = json.dumps(reply_markup)
+            data['reply_markup'] = serialize_markup(reply_markup)
         
-        try:
-            data_encoded = urllib.parse.urlencode(data).encode('utf-8')
-            req = urllib.request.Request(url, data=data_encoded, method='POST')
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                if not result.get('ok'):
-                    logging.info(f"Ошибка отправки фото: {result}")
-                return result
-        except Exception as e:
-            logging.info(f"Ошибка отправки фото: {e}")
-            return None
+        result = self.call_api('sendPhoto', data)
+        if result is not None and not result.get('ok'):
+            logging.info(f"Ошибка отправки фото: {result}")
+        return result
     
     def get_updates(self):
         """Получение обновлений"""
@@ -500,12 +619,114 @@ class TelegramShopBot:
             logging.info(f"Ошибка получения обновлений: {e}")
             return None
     
+    def process_update(self, update):
+        """Маршрутизация одного обновления Telegram (общая для polling и webhook)"""
+        started = time.perf_counter()
+        failed = False
+        try:
+            self.health_monitor.increment_messages()
+            
+            if not self.check_update_allowed(update):
+                return
+            
+            if 'message' in update:
+                message = update['message']
+                text = message.get('text', '')
+                telegram_id = message['from']['id']
+                
+                # Логируем сообщение
+                logger.info(f"Сообщение от {telegram_id}: {text[:50]}...")
+                
+                # Проверяем админ команды
+                if self.admin_message_router.dispatch(text, message):
+                    return
+                
+                state = self.admin_handler.admin_states.get(telegram_id) if self.admin_handler else None
+                if state:
+                    if state.startswith('adding_product_'):
+                        self.admin_handler.handle_add_product_process(message)
+                    elif state.startswith('creating_broadcast_'):
+                        self.admin_handler.handle_broadcast_creation(message)
+                elif text == '/notifications':
+                    self.show_user_notifications(message)
+                else:
+                    self.message_handler.handle_message(message)
+            elif 'callback_query' in update:
+                callback_query = update['callback_query']
+                data = callback_query['data']
+                
+                # Подтверждаем нажатие до любой работы с БД
+                self.callback_responder.answer(callback_query)
+                
+                # Проверяем админ callback'и
+                if not self.admin_callback_router.dispatch(data, callback_query):
+                    self.message_handler.handle_callback_query(callback_query)
+        except Exception as e:
+            failed = True
+            logger.error(f"Ошибка обработки обновления: {e}", exc_info=True)
+            self.health_monitor.increment_errors(str(e))
+        finally:
+            duration = time.perf_counter() - started
+            metrics.count_update(failed)
+            if duration > MONITORING_CONFIG['slow_update_threshold']:
+                logger.performance('process_update', duration, f"update_id={update.get('update_id')}")
+    
+    CART_CALLBACK_PREFIXES = ('cart_', 'add_to_cart_', 'qty_inc_', 'qty_dec_')
+    
+    def check_update_allowed(self, update):
+        """Блокировки и лимиты частоты до любой работы с БД"""
+        if not self.security_manager:
+            return True
+        
+        if 'message' in update:
+            message = update['message']
+            telegram_id = message['from']['id']
+            if self.security_manager.is_user_blocked(telegram_id):
+                return False
+            text = message.get('text', '')
+            actions = ['messages']
+            if self.message_handler.user_states.get(telegram_id) == 'searching':
+                actions.append('search')
+            elif text == '📦 Оформить заказ':
+                actions.append('orders')
+            chat_id = message['chat']['id']
+        elif 'callback_query' in update:
+            callback_query = update['callback_query']
+            telegram_id = callback_query['from']['id']
+            if self.security_manager.is_user_blocked(telegram_id):
+                return False
+            actions = ['callback']
+            if callback_query.get('data', '').startswith(self.CART_CALLBACK_PREFIXES):
+                actions.append('cart_actions')
+            chat_id = None
+        else:
+            return True
+        
+        for action in actions:
+            allowed, first_denial = self.security_manager.acquire_rate_limit(telegram_id, action)
+            if not allowed:
+                if first_denial and chat_id:
+                    self.send_message(chat_id, "⏳ Слишком много запросов. Пожалуйста, подождите немного.")
+                elif 'callback_query' in update:
+                    self.callback_responder.answer(
+                        update['callback_query'],
+                        "⏳ Слишком много запросов. Пожалуйста, подождите немного." if first_denial else None
+                    )
+                return False
+        return True
+    
     def run(self):
         """Запуск бота"""
+        if BOT_CONFIG.get('update_mode') == 'webhook':
+            return self.run_webhook()
+        
         logger.info("🛍 Телеграм-бот интернет-магазина запущен!")
         logger.info("📱 Ожидание сообщений...")
         logger.info("Нажмите Ctrl+C для остановки")
         
+        # Активный webhook блокирует getUpdates
+        self.delete_webhook()
+        
         try:
             while self.running:
                 updates = self.get_updates()
@@ -513,72 +734,14 @@ class TelegramShopBot:
                 if updates and updates.get('ok'):
                     self.error_count = 0  # Сбрасываем счетчик ошибок при успехе
                     
+                    # getUpdates уже ждет до timeout секунд, дополнительная пауза не нужна
                     for update in updates['result']:
                         self.offset = update['update_id'] + 1
-                        
-                        try:
-                            self.health_monitor.increment_messages()
-                            
-                            if 'message' in update:
-                                message = update['message']
-                                text = message.get('text', '')
-                                telegram_id = message['from']['id']
-                                
-                                # Логируем сообщение
-                                logger.info(f"Сообщение от {telegram_id}: {text[:50]}...")
-                                
-                                # Проверяем админ команды
-                                if self.admin_handler and (text.startswith('/admin') or text in ['📊 Статистика', '📦 Заказы', '🛠 Товары', '👥 Пользователи', '🔙 Пользовательский режим']):
-                                    self.admin_handler.handle_admin_command(message)
-                                elif self.admin_handler and text in ['📈 Аналитика', '🛡 Безопасность', '💰 Финансы', '📦 Склад', '🤖 AI', '🎯 Автоматизация', '👥 CRM', '📢 Рассылка']:
-                                    self.admin_handler.handle_admin_command(message)
-                                elif self.admin_handler and text.startswith('/admin_order_'):
-                                    self.admin_handler.handle_order_management(message)
-                                elif self.admin_handler and (text.startswith('/edit_product_') or text.startswith('/delete_product_')):
-                                    self.admin_handler.handle_product_commands(message)
-                                elif self.admin_handler and hasattr(self.admin_handler, 'admin_states') and self.admin_handler.admin_states.get(telegram_id):
-                                    state = self.admin_handler.admin_states.get(telegram_id, '')
-                                    if state.startswith('adding_product_'):
-                                        self.admin_handler.handle_add_product_process(message)
-                                    elif state.startswith('creating_broadcast_'):
-                                        self.admin_handler.handle_broadcast_creation(message)
-                                elif text == '/notifications':
-                                    self.show_user_notifications(message)
-                                else:
-                                    self.message_handler.handle_message(message)
-                            elif 'callback_query' in update:
-                                callback_query = update['callback_query']
-                                data = callback_query['data']
-                                telegram_id = callback_query['from']['id']
-                                
-                                # Проверяем админ callback'и
-                                if self.admin_handler and (data.startswith('admin_') or data.startswith('change_status_') or data.startswith('order_details_')):
-                                    self.admin_handler.handle_callback_query(callback_query)
-                                elif self.admin_handler and (data.startswith('analytics_') or data.startswith('period_')):
-                                    self.admin_handler.handle_analytics_callback(callback_query)
-                                elif self.admin_handler and data.startswith('export_'):
-                                    self.admin_handler.handle_export_callback(callback_query)
-                                elif self.admin_handler and (data.startswith('security_') or data.startswith('unblock_user_')):
-                                    if hasattr(self.admin_handler, 'handle_security_callback'):
-                                        self.admin_handler.handle_security_callback(callback_query)
-                                    else:
-                                        self.admin_handler.handle_callback_query(callback_query)
-                                elif self.admin_handler and data.startswith('broadcast_'):
-                                    if hasattr(self.admin_handler, 'handle_broadcast_callback'):
-                                        self.admin_handler.handle_broadcast_callback(callback_query)
-                                    else:
-                                        self.admin_handler.handle_callback_query(callback_query)
-                                else:
-                                    self.message_handler.handle_callback_query(callback_query)
-                        except Exception as e:
-                            logger.error(f"Ошибка обработки обновления: {e}", exc_info=True)
-                            self.health_monitor.increment_errors(str(e))
+                        self.process_update(update)
                 else:
                     logger.warning("getUpdates returned empty/invalid — backing off")
                     time.sleep(3)
                 
-                time.sleep(1)
-                
         except KeyboardInterrupt:
             logger.info("🛑 Бот остановлен пользователем")
         except Exception as e:
@@ -587,43 +750,93 @@ class TelegramShopBot:
             logger.info("🔄 Закрытие соединений...")
             self.running = False
     
-    def show_user_notifications(self, message):
-        """Показ уведомлений пользователя"""
-        chat_id = message['chat']['id']
-        telegram_id = message['from']['id']
-        
-        user_data = self.db.get_user_by_telegram_id(telegram_id)
-        if not user_data:
+    def run_webhook(self):
+        """Запуск в режиме webhook: Telegram сам присылает обновления"""
+        webhook_url = BOT_CONFIG.get('webhook_url')
+        if not webhook_url:
+            logger.error("❌ UPDATE_MODE=webhook, но WEBHOOK_URL не задан")
             return
         
-        user_id = user_data[0][0]
-        notifications = self.db.get_unread_notifications(user_id)
-        
-        if not notifications:
-            self.send_message(
-                chat_id,
-                "🔔 У вас нет новых уведомлений"
-            )
+        server = TelegramWebhookServer(
+            self,
+            host=BOT_CONFIG['webhook_listen_host'],
+            port=BOT_CONFIG['webhook_listen_port'],
+            path=BOT_CONFIG['webhook_path'],
+            secret_token=BOT_CONFIG.get('webhook_secret'),
+            workers=BOT_CONFIG['webhook_workers']
+        )
+        metrics.register_queue('webhook_updates', lambda: server.get_stats()['queued'])
+        server.start()
+        
+        result = self.set_webhook(webhook_url.rstrip('/') + BOT_CONFIG['webhook_path'], server.secret_token)
+        if not result or not result.get('ok'):
+            logger.error(f"❌ Не удалось установить webhook: {result}")
+            server.stop()
             return
         
-        # Показываем все уведомления
-        for notif in notifications:
-            type_emoji = {
-                'order': '📦',
-                'order_status': '📋',
-                'promotion': '🎁',
-                'system': '⚙️',
-                'info': 'ℹ️'
-            }.get(notif[4], 'ℹ️')
-            
-            notif_text = f"{type_emoji} <b>{notif[2]}</b>\n\n"
-            notif_text += f"{notif[3]}\n\n"
-            notif_text += f"📅 {format_date(notif[6])}"
-            
-            self.send_message(chat_id, notif_text)
-            
-            # Отмечаем как прочитанное
-            self.db.mark_notification_read(notif[0])
+        logger.info("🛍 Телеграм-бот интернет-магазина запущен в режиме webhook!")
+        try:
+            while self.running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("🛑 Бот остановлен пользователем")
+        finally:
+            logger.info("🔄 Закрытие соединений...")
+            server.stop()
+            self.running = False
+    
+    def call_api(self, method, data=None):
+        """Вызов метода Bot API.
+
+        Ошибки Telegram (4xx/5xx) возвращаются телом ответа с ok=false,
+        error_code и parameters.retry_after; None — сетевой сбой.
+        """
+        url = f"{self.base_url}/{method}"
+        started = time.perf_counter()
+        outcome = 'network'
+        try:
+            data_encoded = urllib.parse.urlencode(data or {}).encode('utf-8')
+            req = urllib.request.Request(url, data=data_encoded, method='POST')
+            with urllib.request.urlopen(req, timeout=BOT_CONFIG['request_timeout']) as response:
+                result = json.loads(response.read().decode('utf-8'))
+                outcome = 'ok' if result.get('ok') else str(result.get('error_code', 'error'))
+                return result
+        except urllib.error.HTTPError as e:
+            # 429 и прочие ошибки Telegram приходят HTTP-статусом
+            outcome = str(e.code)
+            logging.info(f"Ошибка вызова {method}: {e}")
+            try:
+                return json.loads(e.read().decode('utf-8'))
+            except Exception:
+                return {'ok': False, 'error_code': e.code, 'description': str(e)}
+        except Exception as e:
+            logging.info(f"Ошибка вызова {method}: {e}")
+            return None
+        finally:
+            metrics.observe_telegram(method, time.perf_counter() - started, outcome)
+    
+    def set_webhook(self, url, secret_token=None):
+        """Регистрация webhook в Telegram"""
+        data = {
+            'url': url,
+            'allowed_updates': json.dumps(['message', 'callback_query']),
+            'max_connections': BOT_CONFIG['webhook_workers'] * 10
+        }
+        if secret_token:
+            data['secret_token'] = secret_token
+        return self.call_api('setWebhook', data)
+    
+    def delete_webhook(self):
+        """Удаление webhook (обязательно перед getUpdates)"""
+        return self.call_api('deleteWebhook')
+    
+    def get_webhook_info(self):
+        """Текущее состояние webhook"""
+        return self.call_api('getWebhookInfo')
+    
+    def show_user_notifications(self, message):
+        """Показ уведомлений пользователя (постраничные входящие MessageHandler)"""
+        self.message_handler.show_user_notifications(message)
     
     def handle_webhook(self, provider, payload, signature=None):
         """Обработка входящих webhook'ов"""
@@ -633,52 +846,99 @@ class TelegramShopBot:
     
     def get_api_data(self, endpoint, api_key, params=None):
         """Обработка API запросов"""
-        if not self.webhook_manager:
-            return {'error': 'API manager not available'}
-            
-        try:
-            from webhooks import APIManager
-            api_manager = APIManager(self.db, self.security_manager)
-        except ImportError:
-            return {'error': 'API manager not available'}
-        
+        params = params or {}
         if endpoint == 'products':
-            return api_manager.get_products_api(
+            return self.api_manager.get_products_api(
                 api_key,
-                params.get('category_id') if params else None,
-                params.get('limit', 50) if params else 50
+                params.get('category_id'),
+                params.get('limit', 50)
             )
         elif endpoint == 'create_order':
-            return api_manager.create_order_api(
+            return self.api_manager.create_order_api(
                 api_key,
-                params['user_data'],
-                params['items'],
-                params['delivery_address']
+                params.get('user_data'),
+                params.get('items'),
+                params.get('delivery_address')
             )
         else:
             return {'error': 'Unknown endpoint'}
     
     def edit_message_reply_markup(self, chat_id, message_id, reply_markup):
         """Редактирование клавиатуры сообщения"""
-        url = f"{self.base_url}/editMessageReplyMarkup"
         data = {
             'chat_id': chat_id,
             'message_id': message_id,
-            'reply_markup': json.dumps(reply_markup)
+            'reply_markup': serialize_markup(reply_markup)
         }
         
-        try:
-            data_encoded = urllib.parse.urlencode(data).encode('utf-8')
-            req = urllib.request.Request(url, data=data_encoded, method='POST')
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return result.get('ok', False)
-        except Exception as e:
-            logging.info(f"Ошибка редактирования клавиатуры: {e}")
-            return False
+        result = self.call_api('editMessageReplyMarkup', data)
+        return bool(result and result.get('ok', False))
+    
+    def edit_message_text(self, chat_id, message_id, text, reply_markup=None):
+        """Замена текста (и inline-клавиатуры) отправленного сообщения"""
+        data = {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'text': text,
+            'parse_mode': 'HTML'
+        }
+        
+        if reply_markup:
+            data['reply_markup'] = serialize_markup(reply_markup)
+        
+        result = self.call_api('editMessageText', data)
+        return bool(result and result.get('ok', False))
+    
+    def edit_message_media(self, chat_id, message_id, photo_url, caption="", reply_markup=None):
+        """Замена фото и подписи отправленного сообщения"""
+        data = {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'media': json.dumps({
+                'type': 'photo',
+                'media': photo_url,
+                'caption': caption,
+                'parse_mode': 'HTML'
+            })
+        }
+        
+        if reply_markup:
+            data['reply_markup'] = serialize_markup(reply_markup)
+        
+        result = self.call_api('editMessageMedia', data)
+        return bool(result and result.get('ok', False))
+    
+    def answer_callback_query(self, callback_query_id, text=None, show_alert=False):
+        """Ответ на нажатие inline-кнопки (убирает индикатор загрузки)"""
+        data = {'callback_query_id': callback_query_id}
+        if text:
+            data['text'] = text
+            data['show_alert'] = 'true' if show_alert else 'false'
+        
+        result = self.call_api('answerCallbackQuery', data)
+        return bool(result and result.get('ok', False))
+
+def profile_startup(token):
+    """Отчет о времени импорта и инициализации подсистем (без приема обновлений)"""
+    with startup_profiler.measure('init', 'TelegramShopBot (до приема обновлений)'):
+        bot = TelegramShopBot(token, start_services=False)
+    if bot.background_init:
+        bot.background_init.join()
+    # Ленивые подсистемы создаются здесь, чтобы отчет показал их стоимость
+    for name in TelegramShopBot.LAZY_SUBSYSTEMS:
+        getattr(bot, name)
+    bot.running = False
+    startup_profiler.log_report()
 
 def main():
     """Главная функция"""
+    parser = argparse.ArgumentParser(description=BOT_CONFIG['description'])
+    parser.add_argument('--workers', type=int, default=BOT_CONFIG['workers'],
+                        help='число процессов обработки обновлений (по умолчанию BOT_WORKERS)')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='инициализировать все подсистемы, вывести время импорта и запуска каждой и выйти')
+    args = parser.parse_args()
+    
     # Получение токена
     # Способ 1: Через переменную окружения (рекомендуется)
     token = BOT_TOKEN
@@ -696,10 +956,18 @@ def main():
         logging.info("\n🔗 Подробная инструкция в README.md")
         return
     
+    if args.profile_startup:
+        profile_startup(token)
+        return
+    
     # Запуск бота
     try:
-        bot = TelegramShopBot(token)
-        bot.run()
+        if args.workers > 1:
+            from supervisor import UpdateSupervisor
+            UpdateSupervisor(token, args.workers, BOT_CONFIG['worker_queue_size']).run()
+        else:
+            bot = TelegramShopBot(token)
+            bot.run()
     except Exception as e:
         logging.info(f"❌ Ошибка запуска бота: {e}")
 
@@ -5,16 +5,19 @@ import logging
 
 from datetime import datetime, timedelta
 from utils import format_price, format_date
+from keyboards import publish_catalog_change
+from admin_alerts import get_admin_alerts
 import json
 import threading
 import time
 
 class MarketingAutomationManager:
-    def __init__(self, db, notification_manager):
+    def __init__(self, db, notification_manager, start=True):
         self.db = db
         self.notification_manager = notification_manager
         self.automation_rules = {}
-        self.start_automation_engine()
+        if start:
+            self.start_automation_engine()
     
     def start_automation_engine(self):
         """Запуск движка автоматизации"""
@@ -253,12 +256,7 @@ class MarketingAutomationManager:
         admin_message += f"💰 Скидка: {promo_config.get('discount_value', 10)}%\n"
         admin_message += f"🎯 Правило: {rule_id}"
         
-        admins = self.db.execute_query('SELECT telegram_id FROM users WHERE is_admin = 1')
-        for admin in admins:
-            try:
-                self.notification_manager.bot.send_message(admin[0], admin_message)
-            except Exception as e:
-                logging.info(f"Ошибка уведомления админа о промокоде: {e}")
+        get_admin_alerts(self.notification_manager.bot, self.db).notify(admin_message)
     
     def execute_price_update_action(self, rule_id, action):
         """Автоматическое обновление цен"""
@@ -299,6 +297,9 @@ class MarketingAutomationManager:
                     'UPDATE products SET price = ? WHERE id = ?',
                     (new_price, product_id)
                 )
+        
+        # Цены входят в подписи кнопок товаров; репрайсинг идет только в основном процессе
+        publish_catalog_change(self.db)
     
     def execute_personalized_offer_action(self, rule_id, action):
         """Создание персональных предложений"""
@@ -0,0 +1,126 @@
+"""
+Метрики Prometheus для горячих путей бота
+"""
+import logging
+import re
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+except ImportError:
+    Counter = Gauge = Histogram = start_http_server = None
+    logging.info("⚠️ prometheus-client не установлен, метрики отключены")
+
+# Границы гистограмм в секундах: от сотен микросекунд (запросы к БД) до секунд (Telegram)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+TABLE_RE = re.compile(r'\b(?:FROM|INTO|TABLE|ON)\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.IGNORECASE)
+UPDATE_RE = re.compile(r'^\s*UPDATE\s+(\w+)', re.IGNORECASE)
+
+
+class Metrics:
+    """Набор метрик процесса; без prometheus-client все методы ничего не делают.
+
+    Имена запросов к БД («SELECT products») вычисляются один раз на текст
+    запроса и кэшируются, глубины очередей читаются функциями в момент
+    сбора метрик, а не обновляются на горячем пути.
+    """
+
+    def __init__(self):
+        self.enabled = Histogram is not None
+        self.statement_names = {}
+        self.statement_names_limit = 5000
+        self.server_started = False
+        if not self.enabled:
+            return
+
+        self.update_latency = Histogram(
+            'shop_bot_update_seconds', 'Время обработки обновления по маршруту',
+            ['route'], buckets=LATENCY_BUCKETS
+        )
+        self.updates_total = Counter('shop_bot_updates_total', 'Обработанные обновления')
+        self.update_errors = Counter('shop_bot_update_errors_total', 'Ошибки обработки обновлений')
+        self.db_latency = Histogram(
+            'shop_bot_db_query_seconds', 'Время запроса к БД по имени запроса',
+            ['statement'], buckets=LATENCY_BUCKETS
+        )
+        self.db_errors = Counter('shop_bot_db_errors_total', 'Ошибки запросов к БД', ['statement'])
+        self.telegram_latency = Histogram(
+            'shop_bot_telegram_api_seconds', 'Время вызова Telegram Bot API',
+            ['method'], buckets=LATENCY_BUCKETS
+        )
+        self.telegram_results = Counter(
+            'shop_bot_telegram_api_results_total', 'Результаты вызовов Bot API (ok, 429, 403, network...)',
+            ['method', 'result']
+        )
+        self.queue_depth = Gauge('shop_bot_queue_depth', 'Глубина внутренних очередей', ['queue'])
+        self.cache_requests = Counter(
+            'shop_bot_cache_requests_total', 'Обращения к кэшам', ['cache', 'result']
+        )
+        self.job_duration = Histogram(
+            'shop_bot_job_seconds', 'Длительность фоновых задач', ['job'], buckets=JOB_BUCKETS
+        )
+
+    def start_server(self, port):
+        """HTTP endpoint /metrics на отдельном порту"""
+        if not self.enabled or self.server_started:
+            return False
+        try:
+            start_http_server(port)
+            self.server_started = True
+            logging.info(f"Метрики Prometheus доступны на порту {port}")
+            return True
+        except Exception as e:
+            logging.info(f"Ошибка запуска сервера метрик: {e}")
+            return False
+
+    def statement_name(self, query):
+        """'SELECT ... FROM products ...' -> 'SELECT products'"""
+        name = self.statement_names.get(query)
+        if name is None:
+            verb = query.split(None, 1)[0].upper() if query.strip() else ''
+            match = UPDATE_RE.match(query) if verb == 'UPDATE' else TABLE_RE.search(query)
+            name = f"{verb} {match.group(1).lower()}" if match else verb
+            if len(self.statement_names) >= self.statement_names_limit:
+                self.statement_names.clear()
+            self.statement_names[query] = name
+        return name
+
+    def observe_update(self, route, duration):
+        if self.enabled:
+            self.update_latency.labels(route).observe(duration)
+
+    def count_update(self, failed=False):
+        if self.enabled:
+            self.updates_total.inc()
+            if failed:
+                self.update_errors.inc()
+
+    def observe_db(self, query, duration, failed=False):
+        if not self.enabled:
+            return
+        statement = self.statement_name(query)
+        self.db_latency.labels(statement).observe(duration)
+        if failed:
+            self.db_errors.labels(statement).inc()
+
+    def observe_telegram(self, method, duration, result):
+        if self.enabled:
+            self.telegram_latency.labels(method).observe(duration)
+            self.telegram_results.labels(method, result).inc()
+
+    def register_queue(self, name, depth_function):
+        """Глубина очереди, читаемая при каждом сборе метрик"""
+        if self.enabled:
+            self.queue_depth.labels(name).set_function(depth_function)
+
+    def cache_lookup(self, cache, hit):
+        if self.enabled:
+            self.cache_requests.labels(cache, 'hit' if hit else 'miss').inc()
+
+    def observe_job(self, job, duration):
+        if self.enabled:
+            self.job_duration.labels(job).observe(duration)
+
+
+metrics = Metrics()
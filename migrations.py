@@ -0,0 +1,233 @@
+"""
+Версионные миграции схемы базы данных (SQLite и Postgres)
+"""
+import logging
+import os
+import re
+import threading
+
+# Ключ pg_advisory_xact_lock: миграции нескольких процессов выполняются по очереди
+POSTGRES_LOCK_ID = 720497431
+
+RATING_COLUMNS = ['rating_sum', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+AUTOINCREMENT_RE = re.compile(r'INTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT', re.IGNORECASE)
+INSERT_OR_IGNORE_RE = re.compile(r'^\s*INSERT\s+OR\s+IGNORE\s+INTO', re.IGNORECASE)
+
+
+class PostgresCursor:
+    """Курсор psycopg2, принимающий SQL в диалекте SQLite.
+
+    Схема в DatabaseManager.create_tables написана для SQLite; для
+    Postgres те же скрипты переводятся на лету: AUTOINCREMENT -> SERIAL,
+    INSERT OR IGNORE -> ON CONFLICT DO NOTHING, ? -> %s.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    @staticmethod
+    def translate(sql):
+        from database import _convert_placeholders, _normalize_sql
+        sql = AUTOINCREMENT_RE.sub('SERIAL PRIMARY KEY', sql)
+        if INSERT_OR_IGNORE_RE.match(sql):
+            sql = INSERT_OR_IGNORE_RE.sub('INSERT INTO', sql).rstrip().rstrip(';') + ' ON CONFLICT DO NOTHING'
+        return _convert_placeholders(_normalize_sql(sql))
+
+    def execute(self, sql, params=None):
+        return self.cursor.execute(self.translate(sql), params or None)
+
+    def executemany(self, sql, rows):
+        return self.cursor.executemany(self.translate(sql), rows)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+def column_exists(db, cursor, table, column):
+    if db.driver == 'postgres':
+        cursor.execute(
+            'SELECT 1 FROM information_schema.columns WHERE table_name = ? AND column_name = ?',
+            (table, column)
+        )
+        return cursor.fetchone() is not None
+    cursor.execute(f'PRAGMA table_info({table})')
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def add_columns(db, cursor, table, columns):
+    """ALTER TABLE ... ADD COLUMN для отсутствующих колонок; возвращает добавленные"""
+    added = []
+    for name, definition in columns:
+        if not column_exists(db, cursor, table, name):
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+            added.append(name)
+    return added
+
+
+def migration_base_schema(db, cursor):
+    # Таблицы и индексы; на базах, созданных до миграций, — IF NOT EXISTS без изменений
+    db.create_tables(cursor)
+    if db.is_database_empty(cursor):
+        db.create_test_data(cursor)
+
+
+def migration_user_role(db, cursor):
+    add_columns(db, cursor, 'users', [('role', 'TEXT')])
+
+
+def migration_rating_aggregates(db, cursor):
+    added = add_columns(db, cursor, 'products', [(column, 'INTEGER DEFAULT 0') for column in RATING_COLUMNS])
+    if added:
+        # Однократный пересчет по уже существующим отзывам
+        histogram = ', '.join(
+            f"rating_{star} = (SELECT COUNT(*) FROM reviews r WHERE r.product_id = products.id AND r.rating = {star})"
+            for star in range(1, 6)
+        )
+        cursor.execute(f'''
+            UPDATE products SET
+                rating_sum = COALESCE((SELECT SUM(r.rating) FROM reviews r WHERE r.product_id = products.id), 0),
+                rating_count = (SELECT COUNT(*) FROM reviews r WHERE r.product_id = products.id),
+                {histogram}
+        ''')
+
+
+def migration_order_coordinates(db, cursor):
+    # create_order пишет координаты доставки, а в исходной схеме orders их нет
+    add_columns(db, cursor, 'orders', [('latitude', 'REAL'), ('longitude', 'REAL')])
+
+
+def migration_delivery_claims(db, cursor):
+    # Время захвата строки рассылки загрузчиком (PostDeliveryPipeline)
+    add_columns(db, cursor, 'post_delivery_queue', [('claimed_at', 'REAL')])
+
+
+def migration_catalog_version(db, cursor):
+    # Общая для всех процессов версия каталога: по ней сбрасываются кэши клавиатур
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_state (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO catalog_state (id, version) VALUES (1, 0)')
+
+
+def migration_payment_side_effects(db, cursor):
+    # Шаги после оплаты отмечаются отдельно, чтобы повтор события доделал недостающие
+    added = add_columns(db, cursor, 'orders', [
+        ('payment_cart_cleared', 'INTEGER DEFAULT 0'),
+        ('payment_notified', 'INTEGER DEFAULT 0'),
+    ])
+    if added:
+        # Для уже оплаченных заказов шаги считаются выполненными
+        cursor.execute('''
+            UPDATE orders SET payment_cart_cleared = 1, payment_notified = 1
+            WHERE payment_status = 'paid'
+        ''')
+
+
+# Порядок менять нельзя; новое изменение схемы — новая миграция в конце списка
+MIGRATIONS = [
+    (1, 'Базовая схема и начальные данные', migration_base_schema),
+    (2, 'Роль пользователя (users.role)', migration_user_role),
+    (3, 'Агрегаты рейтинга товаров', migration_rating_aggregates),
+    (4, 'Координаты доставки заказа', migration_order_coordinates),
+    (5, 'Время захвата строк рассылки', migration_delivery_claims),
+    (6, 'Общая версия каталога', migration_catalog_version),
+    (7, 'Шаги подтверждения оплаты заказа', migration_payment_side_effects),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+def get_schema_version(conn):
+    """Текущая версия схемы (0 — таблицы schema_version еще нет)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT MAX(version) FROM schema_version')
+        row = cursor.fetchone()
+        return row[0] or 0
+    except Exception:
+        conn.rollback()
+        return 0
+
+
+def apply_migrations(db, conn):
+    """Применение недостающих миграций одной транзакцией под блокировкой"""
+    if db.driver == 'postgres':
+        cursor = PostgresCursor(conn.cursor())
+        cursor.cursor.execute('SELECT pg_advisory_xact_lock(%s)', (POSTGRES_LOCK_ID,))
+    else:
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        # Второй процесс ждет, пока первый закончит миграции
+        cursor.execute('PRAGMA busy_timeout = 60000')
+        cursor.execute('BEGIN IMMEDIATE')
+
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('SELECT MAX(version) FROM schema_version')
+        current = cursor.fetchone()[0] or 0
+        applied = []
+        for version, description, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            migration(db, cursor)
+            cursor.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            applied.append((version, description))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for version, description in applied:
+        logging.info(f"✅ Миграция {version} применена: {description}")
+    return applied
+
+
+def migrate(db):
+    """Схема в актуальной версии; в процессе проверяется один раз на базу"""
+    key = (db.driver, db.db_url if db.driver == 'postgres' else os.path.abspath(db.db_path))
+    if key in _migrated:
+        return
+    with _migrated_lock:
+        if key in _migrated:
+            return
+        try:
+            conn = db._connect()
+            try:
+                if get_schema_version(conn) < LATEST_VERSION:
+                    apply_migrations(db, conn)
+            finally:
+                conn.close()
+            _migrated.add(key)
+        except Exception as e:
+            logging.info(f"Ошибка миграции базы данных: {e}")
+
+
+def main():
+    """Применение миграций без запуска бота (перед выкладкой)"""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    from database import DatabaseManager
+    db = DatabaseManager()
+    conn = db._connect()
+    try:
+        logging.info(f"Версия схемы: {get_schema_version(conn)} (последняя: {LATEST_VERSION})")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import logging
 
 from datetime import datetime, timedelta
 from utils import format_date, format_price
+from admin_alerts import get_admin_alerts
 import threading
 import time
 
@@ -149,30 +150,20 @@ class NotificationManager:
         
         notification_text += f"\n👆 /admin_order_{order[0]} - управление заказом"
         
-        # Отправляем всем админам
-        admins = self.db.execute_query(
-            'SELECT telegram_id FROM users WHERE is_admin = 1'
-        )
+        # Отправляем всем админам (в фоне, без запроса списка админов на каждый заказ)
+        alerts = get_admin_alerts(self.bot, self.db)
+        if not alerts.notify(notification_text, key=f'new_order_{order[0]}'):
+            return
         
-        for admin in admins:
-            try:
-                self.bot.send_message(admin[0], notification_text)
-                
-                # Получаем ID админа в базе
-                admin_user = self.db.execute_query(
-                    'SELECT id FROM users WHERE telegram_id = ?',
-                    (admin[0],)
+        for admin_user_id, _ in alerts.get_admins():
+            if admin_user_id:
+                # Отправляем push-уведомление
+                self.send_instant_push(
+                    admin_user_id,
+                    f"Новый заказ #{order[0]}",
+                    f"Заказ на сумму {format_price(order[2])} от {user[0]}",
+                    'order'
                 )
-                if admin_user:
-                    # Отправляем push-уведомление
-                    self.send_instant_push(
-                        admin_user[0][0],
-                        f"Новый заказ #{order[0]}",
-                        f"Заказ на сумму {format_price(order[2])} от {user[0]}",
-                        'order'
-                    )
-            except Exception as e:
-                logging.info(f"Ошибка отправки уведомления админу {admin[0]}: {e}")
     
     def send_order_status_notification(self, order_id, new_status):
         """Уведомление клиенту об изменении статуса заказа"""
@@ -258,15 +249,7 @@ class NotificationManager:
         alert_text += "\n📋 Рекомендуется пополнить склад!"
         
         # Отправляем всем админам
-        admins = self.db.execute_query(
-            'SELECT telegram_id FROM users WHERE is_admin = 1'
-        )
-        
-        for admin in admins:
-            try:
-                self.bot.send_message(admin[0], alert_text)
-            except Exception as e:
-                logging.info(f"Ошибка отправки уведомления о складе админу {admin[0]}: {e}")
+        get_admin_alerts(self.bot, self.db).notify(alert_text)
     
     def send_daily_summary(self):
         """Ежедневная сводка для админов"""
@@ -310,15 +293,7 @@ class NotificationManager:
                 summary_text += f"{i}. {name} - {sold} шт.\n"
         
         # Отправляем админам
-        admins = self.db.execute_query(
-            'SELECT telegram_id FROM users WHERE is_admin = 1'
-        )
-        
-        for admin in admins:
-            try:
-                self.bot.send_message(admin[0], summary_text)
-            except Exception as e:
-                logging.info(f"Ошибка отправки сводки админу {admin[0]}: {e}")
+        get_admin_alerts(self.bot, self.db).notify(summary_text, key=f'daily_summary_{today}')
     
     def send_promotional_broadcast(self, message_text, target_group='all'):
         """Рассылка промо-сообщений"""
@@ -347,11 +322,14 @@ class NotificationManager:
         
         success_count = 0
         error_count = 0
+        # Текст готовится один раз на язык, а не на получателя
+        variants = {}
         
         for user in users:
             try:
-                # Можно добавить локализацию сообщения по языку пользователя
-                localized_message = self.localize_broadcast_message(message_text, user[2])
+                localized_message = variants.get(user[2])
+                if localized_message is None:
+                    localized_message = variants[user[2]] = self.localize_broadcast_message(message_text, user[2])
                 self.bot.send_message(user[0], localized_message)
                 success_count += 1
             except Exception as e:
@@ -362,14 +340,8 @@ class NotificationManager:
     
     def localize_broadcast_message(self, message, language):
         """Локализация рассылочного сообщения"""
-        if language == 'uz':
-            # Простая замена ключевых слов для узбекского
-            message = message.replace('Скидка', 'Chegirma')
-            message = message.replace('Акция', 'Aksiya')
-            message = message.replace('Новинка', 'Yangilik')
-            message = message.replace('Товар', 'Mahsulot')
-        
-        return message
+        from localization import localization
+        return localization.localize_broadcast(message, language)
     
     def check_and_send_birthday_notifications(self):
         """Проверка и отправка поздравлений с днем рождения"""
@@ -538,13 +510,16 @@ class NotificationManager:
             ''', (campaign_data.get('category_id'),))
         
         success_count = 0
+        variants = {}
         for user in target_users:
             try:
-                # Локализуем сообщение
-                localized_message = self.localize_broadcast_message(
-                    campaign_data['message'], 
-                    user[2]
-                )
+                # Локализуем сообщение (один раз на язык)
+                localized_message = variants.get(user[2])
+                if localized_message is None:
+                    localized_message = variants[user[2]] = self.localize_broadcast_message(
+                        campaign_data['message'],
+                        user[2]
+                    )
                 
                 self.bot.send_message(user[0], localized_message)
                 success_count += 1
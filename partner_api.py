@@ -0,0 +1,383 @@
+"""
+HTTP API для партнеров: каталог товаров и создание заказов
+"""
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics import metrics
+from rate_limiter import LRUTTLStore
+
+
+class APIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class APIManager:
+    """Проверка ключей и формирование ответов API.
+
+    Ключи из api_keys держатся в памяти и перечитываются раз в
+    keys_reload_interval секунд. Страницы каталога хранятся уже
+    сериализованными вместе с ETag, так что повторный запрос партнера
+    обходится без БД и без json.dumps, а при совпадении If-None-Match
+    отвечает 304 без тела. Кэш сбрасывается при обновлении данных
+    (invalidate_catalog) и по TTL.
+    """
+
+    PRODUCT_FIELDS = (
+        'id, name, description, price, original_price, category_id, subcategory_id, '
+        'brand, image_url, stock, rating_sum, rating_count'
+    )
+
+    def __init__(self, db, security_manager=None, catalog_cache_ttl=30, keys_reload_interval=60,
+                 max_page_size=100, cache_max_pages=1000):
+        self.db = db
+        self.security = security_manager
+        self.catalog_cache_ttl = catalog_cache_ttl
+        self.keys_reload_interval = keys_reload_interval
+        self.max_page_size = max_page_size
+        self.catalog_cache = LRUTTLStore(max_keys=cache_max_pages)
+        self.catalog_version = 0
+        self.api_keys = {}
+        self.keys_loaded_at = 0
+        self.keys_lock = threading.Lock()
+
+    def load_api_keys(self):
+        """Чтение активных ключей: api_key -> (id, имя, права)"""
+        rows = self.db.execute_query(
+            'SELECT id, key_name, api_key, permissions FROM api_keys WHERE is_active = 1'
+        )
+        if rows is None:
+            return False
+        self.api_keys = {
+            api_key: (key_id, key_name, self.parse_permissions(permissions))
+            for key_id, key_name, api_key, permissions in rows
+        }
+        self.keys_loaded_at = time.monotonic()
+        return True
+
+    @staticmethod
+    def parse_permissions(permissions):
+        """JSON-список или строка через запятую; пусто — только чтение каталога"""
+        if not permissions:
+            return frozenset(['products'])
+        try:
+            parsed = json.loads(permissions)
+            if isinstance(parsed, str):
+                parsed = [parsed]
+        except ValueError:
+            parsed = permissions.split(',')
+        return frozenset(item.strip() for item in parsed if item and item.strip())
+
+    def validate_api_key(self, api_key, permission):
+        """Данные ключа или APIError"""
+        if time.monotonic() - self.keys_loaded_at > self.keys_reload_interval:
+            with self.keys_lock:
+                if time.monotonic() - self.keys_loaded_at > self.keys_reload_interval:
+                    self.load_api_keys()
+
+        key_info = self.api_keys.get(api_key) if api_key else None
+        if not key_info:
+            raise APIError(401, 'Invalid API key')
+        permissions = key_info[2]
+        if permission not in permissions and '*' not in permissions:
+            raise APIError(403, 'Permission denied')
+        return key_info
+
+    def invalidate_api_keys(self):
+        self.keys_loaded_at = 0
+
+    def invalidate_catalog(self):
+        """Сброс кэша каталога (после изменения товаров)"""
+        self.catalog_version += 1
+
+    def get_products_page(self, category_id=None, limit=50, offset=0):
+        """(тело ответа в байтах, ETag) для страницы каталога"""
+        limit = max(1, min(int(limit), self.max_page_size))
+        offset = max(0, int(offset))
+        category_id = int(category_id) if category_id else None
+        cache_key = ('products', self.catalog_version, category_id, limit, offset)
+
+        cached = self.catalog_cache.get(cache_key)
+        metrics.cache_lookup('partner_catalog', bool(cached))
+        if cached:
+            return cached
+
+        query = f'SELECT {self.PRODUCT_FIELDS} FROM products WHERE is_active = 1'
+        params = []
+        if category_id:
+            query += ' AND category_id = ?'
+            params.append(category_id)
+        query += ' ORDER BY id LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+
+        rows = self.db.execute_query(query, tuple(params))
+        if rows is None:
+            raise APIError(503, 'Database unavailable')
+
+        body = {
+            'products': [self.serialize_product(row) for row in rows],
+            'limit': limit,
+            'offset': offset,
+            'next_offset': offset + limit if len(rows) == limit else None
+        }
+        return self.cache_response(cache_key, body)
+
+    def get_product(self, product_id):
+        """(тело ответа, ETag) для одного товара"""
+        cache_key = ('product', self.catalog_version, int(product_id))
+        cached = self.catalog_cache.get(cache_key)
+        metrics.cache_lookup('partner_catalog', bool(cached))
+        if cached:
+            return cached
+
+        rows = self.db.execute_query(
+            f'SELECT {self.PRODUCT_FIELDS} FROM products WHERE id = ? AND is_active = 1',
+            (int(product_id),)
+        )
+        if rows is None:
+            raise APIError(503, 'Database unavailable')
+        if not rows:
+            raise APIError(404, 'Product not found')
+        return self.cache_response(cache_key, {'product': self.serialize_product(rows[0])})
+
+    def cache_response(self, cache_key, body):
+        payload = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        self.catalog_cache.set(cache_key, (payload, etag), self.catalog_cache_ttl)
+        return payload, etag
+
+    @staticmethod
+    def serialize_product(row):
+        (product_id, name, description, price, original_price, category_id, subcategory_id,
+         brand, image_url, stock, rating_sum, rating_count) = row
+        return {
+            'id': product_id,
+            'name': name,
+            'description': description,
+            'price': price,
+            'original_price': original_price,
+            'category_id': category_id,
+            'subcategory_id': subcategory_id,
+            'brand': brand,
+            'image_url': image_url,
+            'in_stock': (stock or 0) > 0,
+            'rating': round(rating_sum / rating_count, 2) if rating_count else None,
+            'reviews_count': rating_count or 0
+        }
+
+    def create_order(self, user_data, items, delivery_address, payment_method='partner_api'):
+        """Создание заказа по ценам из БД. Возвращает словарь ответа"""
+        if not items or not delivery_address:
+            raise APIError(400, 'items and delivery_address are required')
+        if not isinstance(delivery_address, str):
+            raise APIError(400, 'delivery_address must be a string')
+        if user_data is not None and not isinstance(user_data, dict):
+            raise APIError(400, 'user_data must be an object')
+        telegram_id = user_data.get('telegram_id') if user_data else None
+        if not telegram_id:
+            raise APIError(400, 'user_data.telegram_id is required')
+
+        quantities = {}
+        try:
+            for item in items:
+                product_id = int(item['product_id'])
+                quantity = int(item.get('quantity', 1))
+                if quantity <= 0:
+                    raise ValueError
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+        except (KeyError, TypeError, ValueError):
+            raise APIError(400, 'Invalid items')
+
+        placeholders = ','.join('?' * len(quantities))
+        products = self.db.execute_query(
+            f'SELECT id, price, stock FROM products WHERE is_active = 1 AND id IN ({placeholders})',
+            tuple(quantities)
+        )
+        if products is None:
+            raise APIError(503, 'Database unavailable')
+        products = {row[0]: row for row in products}
+
+        total_amount = 0
+        order_items = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if not product:
+                raise APIError(404, f'Product {product_id} not found')
+            if (product[2] or 0) < quantity:
+                raise APIError(409, f'Not enough stock for product {product_id}')
+            total_amount += product[1] * quantity
+            order_items.append((product_id, quantity, product[1]))
+
+        user_id = self.db.add_user(
+            telegram_id, user_data.get('name') or str(telegram_id),
+            user_data.get('phone'), user_data.get('email')
+        )
+        if not user_id:
+            raise APIError(503, 'Could not create user')
+
+        # Заказ и позиции пишутся одной транзакцией, продажи попадают в счетчики товаров
+        order_id = self.db.place_order(user_id, total_amount, delivery_address, payment_method, order_items)
+        if not order_id:
+            raise APIError(503, 'Could not create order')
+
+        return {'order_id': order_id, 'total_amount': total_amount, 'status': 'pending'}
+
+    def get_products_api(self, api_key, category_id=None, limit=50):
+        """Список товаров для вызова из кода бота"""
+        try:
+            self.validate_api_key(api_key, 'products')
+            payload, _ = self.get_products_page(category_id, limit)
+            return json.loads(payload)
+        except APIError as e:
+            return {'error': e.message}
+
+    def create_order_api(self, api_key, user_data, items, delivery_address):
+        """Создание заказа для вызова из кода бота"""
+        try:
+            self.validate_api_key(api_key, 'orders')
+            return self.create_order(user_data, items, delivery_address)
+        except APIError as e:
+            return {'error': e.message}
+
+
+class PartnerAPIServer:
+    """REST API поверх APIManager на стандартном HTTP-сервере.
+
+    GET  /api/v1/products?category_id=&limit=&offset=
+    GET  /api/v1/products/<id>
+    POST /api/v1/orders
+    Ключ передается в заголовке X-API-Key или Authorization: Bearer <ключ>.
+    """
+
+    PREFIX = '/api/v1'
+
+    def __init__(self, api_manager, host='0.0.0.0', port=8081):
+        self.api = api_manager
+        self.host = host
+        self.port = port
+        self.server = None
+        self.stats = {'requests': 0, 'not_modified': 0, 'errors': 0}
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), self.create_handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="partner-api", daemon=True).start()
+        logging.info(f"API для партнеров запущен на {self.host}:{self.port}{self.PREFIX}")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @staticmethod
+    def etag_matches(if_none_match, etag):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        candidates = [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')]
+        return any(hmac.compare_digest(tag, etag) for tag in candidates)
+
+    def create_handler(self):
+        api_server = self
+        api = self.api
+
+        class PartnerAPIHandler(BaseHTTPRequestHandler):
+            def get_api_key(self):
+                api_key = self.headers.get('X-API-Key')
+                if not api_key:
+                    authorization = self.headers.get('Authorization', '')
+                    if authorization.startswith('Bearer '):
+                        api_key = authorization[7:].strip()
+                return api_key
+
+            def send_json(self, status, payload, etag=None):
+                if isinstance(payload, dict):
+                    payload = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                if etag:
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', f'private, max-age={api.catalog_cache_ttl}')
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_cached(self, payload, etag):
+                if api_server.etag_matches(self.headers.get('If-None-Match'), etag):
+                    api_server.stats['not_modified'] += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_json(200, payload, etag)
+
+            def handle_api(self, method):
+                api_server.stats['requests'] += 1
+                parsed = urllib.parse.urlparse(self.path)
+                path = parsed.path.rstrip('/')
+                params = dict(urllib.parse.parse_qsl(parsed.query))
+                try:
+                    if not path.startswith(api_server.PREFIX):
+                        raise APIError(404, 'Not found')
+                    route = path[len(api_server.PREFIX):]
+
+                    if method == 'GET' and route == '/products':
+                        api.validate_api_key(self.get_api_key(), 'products')
+                        try:
+                            page = api.get_products_page(
+                                params.get('category_id'), params.get('limit', 50), params.get('offset', 0)
+                            )
+                        except ValueError:
+                            raise APIError(400, 'Invalid query parameters')
+                        self.send_cached(*page)
+                    elif method == 'GET' and route.startswith('/products/'):
+                        api.validate_api_key(self.get_api_key(), 'products')
+                        product_id = route[len('/products/'):]
+                        if not product_id.isdigit():
+                            raise APIError(404, 'Not found')
+                        self.send_cached(*api.get_product(product_id))
+                    elif method == 'POST' and route == '/orders':
+                        api.validate_api_key(self.get_api_key(), 'orders')
+                        try:
+                            length = int(self.headers.get('Content-Length', 0))
+                            data = json.loads(self.rfile.read(length).decode('utf-8'))
+                        except (ValueError, UnicodeDecodeError):
+                            raise APIError(400, 'Invalid JSON')
+                        if not isinstance(data, dict):
+                            raise APIError(400, 'Request body must be a JSON object')
+                        result = api.create_order(
+                            data.get('user_data'), data.get('items'), data.get('delivery_address')
+                        )
+                        self.send_json(201, result)
+                    else:
+                        raise APIError(404, 'Not found')
+                except APIError as e:
+                    api_server.stats['errors'] += 1
+                    self.send_json(e.status, {'error': e.message})
+                except Exception as e:
+                    api_server.stats['errors'] += 1
+                    logging.info(f"Ошибка API для партнеров: {e}")
+                    self.send_json(500, {'error': 'Internal error'})
+
+            def do_GET(self):
+                self.handle_api('GET')
+
+            def do_POST(self):
+                self.handle_api('POST')
+
+            def log_message(self, format, *args):
+                pass  # Отключаем логи HTTP сервера
+
+        return PartnerAPIHandler
@@ -0,0 +1,393 @@
+"""
+Конвейер массовой доставки запланированных постов
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+
+class PostDeliveryPipeline:
+    """Очередь доставки в БД + пул отправщиков с общим ограничением скорости.
+
+    Список получателей сохраняется в post_delivery_queue до начала отправки,
+    поэтому после перезапуска недоставленные строки подхватываются заново.
+    Загрузчик захватывает строки в БД (pending -> queued), так что две
+    запущенные очереди не отправят одну строку дважды. Запускается одна
+    очередь — в основном процессе бота; веб-панель только ставит рассылки
+    через enqueue_delivery. Доставка «как минимум один раз»: строки,
+    захваченные упавшим процессом, возвращаются в pending через claim_lease
+    секунд после захвата. Захват строк, которые этот процесс еще держит
+    (в очереди отправки или в ожидании после 429), продлевается перед
+    каждым возвратом.
+    """
+
+    def __init__(self, bot, db, workers=4, messages_per_second=25, max_attempts=3, batch_size=200,
+                 claim_lease=600):
+        self.bot = bot
+        self.db = db
+        self.workers = workers
+        self.send_interval = 1.0 / messages_per_second if messages_per_second else 0
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.claim_lease = claim_lease
+        self.next_lease_check = 0.0
+
+        self.task_queue = queue.Queue(maxsize=batch_size * 2)
+        self.result_queue = queue.Queue()
+        self.wakeup_event = threading.Event()
+
+        self.state_lock = threading.Lock()
+        self.rate_lock = threading.Lock()
+        self.next_send_at = 0.0
+        # delivery_id -> число захваченных строк без записанного результата
+        self.in_flight = {}
+        # id строк post_delivery_queue, захваченных этим процессом и еще не записанных
+        self.held_rows = set()
+        self.payloads = {}
+        self.started = False
+
+    def start(self):
+        """Запуск загрузчика, отправщиков и записи результатов"""
+        if self.started:
+            return
+        self.started = True
+
+        for index in range(self.workers):
+            threading.Thread(target=self.sender_worker, name=f"post-sender-{index}", daemon=True).start()
+        threading.Thread(target=self.loader_worker, name="post-loader", daemon=True).start()
+        threading.Thread(target=self.result_worker, name="post-results", daemon=True).start()
+
+        unfinished = self.db.execute_query(
+            "SELECT COUNT(*) FROM post_deliveries WHERE status = 'running'"
+        )
+        if unfinished and unfinished[0][0]:
+            logging.info(f"Возобновление незавершенных рассылок: {unfinished[0][0]}")
+        self.wakeup_event.set()
+
+    def enqueue_delivery(self, post_id, time_period, message_text, image_url, keyboard, recipients):
+        """Материализация списка получателей и постановка рассылки в очередь.
+
+        Рассылка создается в статусе pending и становится running только после
+        записи всех получателей — иначе загрузчик мог бы завершить ее пустой.
+        """
+        delivery_id = self.db.execute_query('''
+            INSERT INTO post_deliveries (
+                post_id, time_period, message_text, image_url, keyboard_json, status, started_at
+            ) VALUES (?, ?, ?, ?, ?, 'pending', ?)
+        ''', (
+            post_id, time_period, message_text, image_url,
+            json.dumps(keyboard) if keyboard else None,
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+        ))
+        if not delivery_id:
+            return None
+
+        rows = []
+        seen = set()
+        for recipient in recipients:
+            telegram_id = recipient[0] if isinstance(recipient, (list, tuple)) else recipient.get('telegram_id')
+            if telegram_id and telegram_id not in seen:
+                seen.add(telegram_id)
+                rows.append((delivery_id, telegram_id))
+
+        if self.db.execute_many(
+            'INSERT INTO post_delivery_queue (delivery_id, telegram_id) VALUES (?, ?)',
+            rows
+        ) is None:
+            logging.info(f"Рассылка {delivery_id} поста {post_id}: не удалось записать получателей")
+            self.db.execute_query(
+                "UPDATE post_deliveries SET status = 'failed', finished_at = ? WHERE id = ?",
+                (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()), delivery_id)
+            )
+            return None
+        self.db.execute_query(
+            "UPDATE post_deliveries SET total_count = ?, status = 'running' WHERE id = ?",
+            (len(rows), delivery_id)
+        )
+
+        logging.info(f"Рассылка {delivery_id} поста {post_id}: в очереди {len(rows)} получателей")
+        self.wakeup_event.set()
+        return delivery_id
+
+    def get_payload(self, delivery_id):
+        """Текст, картинка и клавиатура рассылки (кэшируются в памяти)"""
+        payload = self.payloads.get(delivery_id)
+        if payload is None:
+            row = self.db.execute_query(
+                'SELECT message_text, image_url, keyboard_json FROM post_deliveries WHERE id = ?',
+                (delivery_id,)
+            )
+            if not row:
+                return None
+            message_text, image_url, keyboard_json = row[0]
+            payload = (message_text, image_url, json.loads(keyboard_json) if keyboard_json else None)
+            self.payloads[delivery_id] = payload
+        return payload
+
+    def renew_claims(self):
+        """Продление захвата строк, которые этот процесс еще не отправил. False — ошибка БД"""
+        with self.state_lock:
+            held = list(self.held_rows)
+        now = time.time()
+        return self.db.execute_many(
+            "UPDATE post_delivery_queue SET claimed_at = ? WHERE id = ? AND status = 'queued'",
+            [(now, queue_id) for queue_id in held]
+        ) is not None
+
+    def release_expired_claims(self):
+        """Возврат в pending строк, захваченных давнее claim_lease (процесс упал до отправки)"""
+        if not self.renew_claims():
+            # Без продления можно вернуть строки, которые еще отправляются
+            return
+        released = self.db.execute_query(
+            "UPDATE post_delivery_queue SET status = 'pending' WHERE status = 'queued' AND claimed_at < ?",
+            (time.time() - self.claim_lease,)
+        )
+        if released:
+            logging.info(f"Возвращено в очередь рассылки строк с истекшим захватом: {released}")
+
+    def loader_worker(self):
+        """Подгрузка ожидающих строк очереди пачками"""
+        while True:
+            try:
+                if time.monotonic() >= self.next_lease_check:
+                    self.next_lease_check = time.monotonic() + 60
+                    self.release_expired_claims()
+
+                running = self.db.execute_query(
+                    "SELECT id FROM post_deliveries WHERE status = 'running' ORDER BY id"
+                ) or []
+                loaded_any = False
+
+                for (delivery_id,) in running:
+                    rows = self.db.claim_delivery_rows(delivery_id, self.batch_size)
+                    if rows is None:
+                        continue
+                    if not rows:
+                        self.try_finish_delivery(delivery_id)
+                        continue
+
+                    loaded_any = True
+                    with self.state_lock:
+                        self.in_flight[delivery_id] = self.in_flight.get(delivery_id, 0) + len(rows)
+                        self.held_rows.update(queue_id for queue_id, telegram_id in rows)
+                    for queue_id, telegram_id in rows:
+                        self.task_queue.put((delivery_id, queue_id, telegram_id))
+
+                if not loaded_any:
+                    self.wakeup_event.wait(5)
+                    self.wakeup_event.clear()
+            except Exception as e:
+                logging.info(f"Ошибка загрузчика рассылок: {e}")
+                time.sleep(5)
+
+    def wait_for_rate_slot(self):
+        """Общий для всех отправщиков интервал между сообщениями"""
+        if not self.send_interval:
+            return
+        with self.rate_lock:
+            now = time.monotonic()
+            send_at = max(now, self.next_send_at)
+            self.next_send_at = send_at + self.send_interval
+        delay = send_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_retry_delay(self, result, attempts):
+        """Пауза перед повтором отправки или None, если ошибка окончательна.
+
+        Повторяются сетевые сбои (None), 429 — после retry_after, общего для
+        всех отправщиков, — и 5xx. Остальные ответы (400 — чат не найден,
+        403 — бот заблокирован) окончательны.
+        """
+        if result is None:
+            return attempts
+        error_code = result.get('error_code') or 0
+        if error_code == 429:
+            retry_after = (result.get('parameters') or {}).get('retry_after') or attempts
+            with self.rate_lock:
+                self.next_send_at = max(self.next_send_at, time.monotonic() + retry_after)
+            return retry_after
+        if error_code >= 500:
+            return attempts
+        return None
+
+    def sender_worker(self):
+        """Отправка сообщений получателям"""
+        while True:
+            delivery_id, queue_id, telegram_id = self.task_queue.get()
+            status, attempts, error_message = 'failed', 0, None
+            try:
+                payload = self.get_payload(delivery_id)
+                if payload is None:
+                    error_message = 'delivery not found'
+                else:
+                    message_text, image_url, keyboard = payload
+                    while attempts < self.max_attempts:
+                        attempts += 1
+                        self.wait_for_rate_slot()
+                        if image_url:
+                            result = self.bot.send_photo(telegram_id, image_url, message_text, keyboard)
+                        else:
+                            result = self.bot.send_message(telegram_id, message_text, keyboard)
+
+                        if result and result.get('ok'):
+                            status, error_message = 'sent', None
+                            break
+                        error_message = (result or {}).get('description', 'send failed')
+                        delay = self.get_retry_delay(result, attempts)
+                        if delay is None:
+                            break
+                        time.sleep(delay)
+            except Exception as e:
+                error_message = str(e)
+                logging.info(f"Ошибка отправки поста пользователю {telegram_id}: {e}")
+            finally:
+                self.result_queue.put((delivery_id, queue_id, status, attempts, error_message))
+                self.task_queue.task_done()
+
+    def result_worker(self):
+        """Пакетная запись статусов получателей"""
+        while True:
+            batch = []
+            try:
+                batch.append(self.result_queue.get())
+                deadline = time.monotonic() + 1
+                while len(batch) < self.batch_size and time.monotonic() < deadline:
+                    try:
+                        batch.append(self.result_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                self.flush_results(batch)
+            except Exception as e:
+                logging.info(f"Ошибка записи результатов рассылки: {e}")
+
+    def flush_results(self, batch):
+        current_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+        if self.db.execute_many('''
+            UPDATE post_delivery_queue
+            SET status = ?, attempts = ?, error_message = ?, sent_at = ?
+            WHERE id = ?
+        ''', [
+            (status, attempts, error_message, current_time, queue_id)
+            for delivery_id, queue_id, status, attempts, error_message in batch
+        ]) is None:
+            # Строки остаются queued — повторяем запись, а не отправку
+            time.sleep(1)
+            for result in batch:
+                self.result_queue.put(result)
+            return
+
+        totals = {}
+        for delivery_id, queue_id, status, attempts, error_message in batch:
+            sent, errors = totals.get(delivery_id, (0, 0))
+            if status == 'sent':
+                sent += 1
+            else:
+                errors += 1
+            totals[delivery_id] = (sent, errors)
+
+        self.db.execute_many('''
+            UPDATE post_deliveries
+            SET sent_count = sent_count + ?, error_count = error_count + ?
+            WHERE id = ?
+        ''', [(sent, errors, delivery_id) for delivery_id, (sent, errors) in totals.items()])
+
+        finished = []
+        with self.state_lock:
+            self.held_rows.difference_update(queue_id for delivery_id, queue_id, status, attempts, error_message in batch)
+            for delivery_id, (sent, errors) in totals.items():
+                self.in_flight[delivery_id] = self.in_flight.get(delivery_id, 0) - sent - errors
+                if self.in_flight[delivery_id] <= 0:
+                    finished.append(delivery_id)
+        if finished:
+            self.wakeup_event.set()
+
+    def try_finish_delivery(self, delivery_id):
+        """Завершение рассылки, когда в очереди не осталось строк"""
+        with self.state_lock:
+            if self.in_flight.get(delivery_id, 0) > 0:
+                return
+
+        pending = self.db.execute_query(
+            "SELECT COUNT(*) FROM post_delivery_queue WHERE delivery_id = ? AND status IN ('pending', 'queued')",
+            (delivery_id,)
+        )
+        if pending is None or pending[0][0]:
+            return
+
+        stats = self.db.execute_query('''
+            SELECT post_id, time_period, sent_count, error_count
+            FROM post_deliveries WHERE id = ?
+        ''', (delivery_id,))
+        if not stats:
+            return
+        post_id, time_period, sent_count, error_count = stats[0]
+
+        current_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+        self.db.execute_query(
+            "UPDATE post_deliveries SET status = 'completed', finished_at = ? WHERE id = ?",
+            (current_time, delivery_id)
+        )
+        # Совместимость со сводной статистикой веб-панели
+        self.db.execute_query('''
+            INSERT INTO post_statistics (
+                post_id, time_period, sent_count, error_count, sent_at
+            ) VALUES (?, ?, ?, ?, ?)
+        ''', (post_id, time_period, sent_count, error_count, current_time))
+
+        with self.state_lock:
+            self.in_flight.pop(delivery_id, None)
+            self.payloads.pop(delivery_id, None)
+
+        logging.info(f"📊 Рассылка {delivery_id} поста {post_id} ({time_period}): отправлено {sent_count}, ошибок {error_count}")
+
+
+def get_delivery_progress(db, limit=10):
+    """Прогресс последних рассылок: скорость отправки и оценка времени до конца"""
+    deliveries = db.execute_query('''
+        SELECT d.id, d.post_id, sp.title, d.time_period, d.status,
+               d.total_count, d.sent_count, d.error_count, d.started_at, d.finished_at
+        FROM post_deliveries d
+        LEFT JOIN scheduled_posts sp ON d.post_id = sp.id
+        ORDER BY d.id DESC
+        LIMIT ?
+    ''', (limit,)) or []
+
+    progress = []
+    now = time.time()
+    for row in deliveries:
+        delivery_id, post_id, title, time_period, status, total, sent, errors, started_at, finished_at = row
+        processed = (sent or 0) + (errors or 0)
+        elapsed = None
+        try:
+            started_ts = time.mktime(time.strptime(str(started_at)[:19], '%Y-%m-%d %H:%M:%S'))
+            if finished_at:
+                end_ts = time.mktime(time.strptime(str(finished_at)[:19], '%Y-%m-%d %H:%M:%S'))
+            else:
+                end_ts = now
+            elapsed = max(end_ts - started_ts, 1)
+        except (TypeError, ValueError):
+            pass
+
+        throughput = processed / elapsed if elapsed else 0
+        remaining = max((total or 0) - processed, 0)
+        eta_seconds = int(remaining / throughput) if throughput and status == 'running' else None
+
+        progress.append({
+            'id': delivery_id,
+            'post_id': post_id,
+            'title': title,
+            'time_period': time_period,
+            'status': status,
+            'total': total or 0,
+            'sent': sent or 0,
+            'errors': errors or 0,
+            'percent': round(processed * 100 / total, 1) if total else 100.0,
+            'throughput': round(throughput, 2),
+            'eta_seconds': eta_seconds,
+            'started_at': started_at,
+        })
+    return progress
@@ -0,0 +1,278 @@
+"""
+Профилирование SQL-запросов: статистика по отпечаткам и журнал медленных запросов
+"""
+import argparse
+import collections
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+
+class QueryStats:
+    """Счетчики одного отпечатка; p95 считается по последним samples_size замерам"""
+
+    __slots__ = ('count', 'total', 'max', 'rows', 'samples', 'sql')
+
+    def __init__(self, sql, samples_size):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = collections.deque(maxlen=samples_size)
+        self.sql = sql
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class QueryProfiler:
+    """Профилировщик для DatabaseManager.execute_query.
+
+    Запрос нормализуется в отпечаток (литералы и списки IN заменяются на ?,
+    пробелы схлопываются); отпечаток кэшируется по исходной строке, поэтому
+    горячий путь — lookup в dict и обновление счетчиков. Запросы дольше
+    slow_query_ms пишутся в лог вместе с EXPLAIN QUERY PLAN; план строится
+    в фоновом потоке не чаще раза в explain_interval на отпечаток. Снимок
+    статистики периодически сохраняется в query_profile, откуда его читают
+    CLI и веб-панель.
+    """
+
+    def __init__(self, db, source, slow_query_ms=100, flush_interval=60, samples_size=512, explain_interval=600):
+        self.db = db
+        self.source = source
+        self.slow_query_seconds = slow_query_ms / 1000.0
+        self.flush_interval = flush_interval
+        self.samples_size = samples_size
+        self.explain_interval = explain_interval
+        self.stats = {}
+        self.fingerprints = {}
+        self.plans = {}
+        self.explained_at = {}
+        self.lock = threading.Lock()
+        self.explain_queue = queue.Queue(maxsize=100)
+        self.dirty = False
+
+        threading.Thread(target=self.explain_worker, name="query-explain", daemon=True).start()
+        if flush_interval:
+            threading.Thread(target=self.flush_worker, name="query-profile-flush", daemon=True).start()
+
+    @staticmethod
+    def normalize(sql):
+        sql = STRING_RE.sub('?', sql)
+        sql = NUMBER_RE.sub('?', sql)
+        sql = IN_LIST_RE.sub('IN (?...)', sql)
+        return SPACE_RE.sub(' ', sql).strip()
+
+    def fingerprint(self, sql):
+        fingerprint = self.fingerprints.get(sql)
+        if fingerprint is None:
+            fingerprint = self.normalize(sql)
+            if len(self.fingerprints) > 10000:
+                self.fingerprints.clear()
+            self.fingerprints[sql] = fingerprint
+        return fingerprint
+
+    def record(self, sql, params, duration, rows):
+        """Учет одного выполнения запроса"""
+        fingerprint = self.fingerprint(sql)
+        with self.lock:
+            stat = self.stats.get(fingerprint)
+            if stat is None:
+                stat = self.stats[fingerprint] = QueryStats(sql, self.samples_size)
+            stat.count += 1
+            stat.total += duration
+            stat.rows += rows or 0
+            stat.samples.append(duration)
+            if duration > stat.max:
+                stat.max = duration
+            self.dirty = True
+
+        if duration >= self.slow_query_seconds:
+            self.log_slow_query(fingerprint, sql, params, duration)
+
+    def log_slow_query(self, fingerprint, sql, params, duration):
+        now = time.monotonic()
+        if now - self.explained_at.get(fingerprint, -self.explain_interval) < self.explain_interval:
+            logging.warning(f"Медленный запрос {duration * 1000:.1f} мс: {fingerprint[:300]}")
+            return
+        self.explained_at[fingerprint] = now
+        try:
+            self.explain_queue.put_nowait((fingerprint, sql, params, duration))
+        except queue.Full:
+            pass
+
+    def explain_worker(self):
+        while True:
+            fingerprint, sql, params, duration = self.explain_queue.get()
+            plan = self.explain(sql, params)
+            if plan:
+                self.plans[fingerprint] = plan
+            logging.warning(
+                f"Медленный запрос {duration * 1000:.1f} мс: {fingerprint[:300]}\n"
+                f"План: {plan or 'недоступен'}"
+            )
+
+    def explain(self, sql, params):
+        """EXPLAIN QUERY PLAN (SQLite) или EXPLAIN (Postgres) отдельным соединением"""
+        try:
+            from database import _convert_placeholders
+            conn = self.db._connect()
+            try:
+                cursor = conn.cursor()
+                prefix = 'EXPLAIN ' if self.db.driver == 'postgres' else 'EXPLAIN QUERY PLAN '
+                cursor.execute(_convert_placeholders(prefix + sql.strip()), params or ())
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+            # SQLite: (id, parent, notused, detail); Postgres: (строка плана,)
+            return '; '.join(str(row[-1]) for row in rows)
+        except Exception as e:
+            return f"ошибка EXPLAIN: {e}"
+
+    def report(self, top_n=20, order_by='total'):
+        """Топ отпечатков: список словарей, order_by — total, p95, count или max"""
+        with self.lock:
+            rows = [
+                {
+                    'fingerprint': fingerprint,
+                    'count': stat.count,
+                    'total_ms': stat.total * 1000,
+                    'avg_ms': stat.total * 1000 / stat.count,
+                    'p95_ms': stat.percentile(0.95) * 1000,
+                    'max_ms': stat.max * 1000,
+                    'rows': stat.rows,
+                    'plan': self.plans.get(fingerprint)
+                }
+                for fingerprint, stat in self.stats.items() if stat.count
+            ]
+        key = {'total': 'total_ms', 'p95': 'p95_ms', 'count': 'count', 'max': 'max_ms'}.get(order_by, 'total_ms')
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:top_n]
+
+    def flush_worker(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self.dirty:
+                self.flush()
+
+    def flush(self):
+        """Сохранение снимка статистики в query_profile (минуя профилируемый execute_query)"""
+        self.dirty = False
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [
+            (self.source, row['fingerprint'], row['count'], row['total_ms'], row['p95_ms'],
+             row['max_ms'], row['rows'], row['plan'], now)
+            for row in self.report(top_n=None)
+        ]
+        if not rows:
+            return
+        try:
+            from database import _convert_placeholders
+            conn = self.db._connect()
+            try:
+                cursor = conn.cursor()
+                cursor.executemany(_convert_placeholders('''
+                    INSERT INTO query_profile (
+                        source, fingerprint, count, total_ms, p95_ms, max_ms, rows_total, plan, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (source, fingerprint) DO UPDATE SET
+                        count = excluded.count, total_ms = excluded.total_ms, p95_ms = excluded.p95_ms,
+                        max_ms = excluded.max_ms, rows_total = excluded.rows_total,
+                        plan = COALESCE(excluded.plan, query_profile.plan), updated_at = excluded.updated_at
+                '''), rows)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.info(f"Ошибка сохранения профиля запросов: {e}")
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+# Номер рабочего процесса supervisor: у каждого свой source, снимки не перезаписывают друг друга
+_worker_index = None
+
+
+def get_profile_source():
+    source = os.getenv('DB_PROFILE_SOURCE') or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+    if _worker_index is not None:
+        source = f"{source}.worker{_worker_index}"
+    return source
+
+
+def use_worker_source(worker_index):
+    """Источник профиля рабочего процесса supervisor (main.worker<N>)"""
+    global _worker_index
+    with _profiler_lock:
+        _worker_index = worker_index
+        if _profiler is not None:
+            _profiler.source = get_profile_source()
+
+
+def get_profiler(db):
+    """Общий профилировщик процесса или None, если профилирование выключено"""
+    global _profiler
+    from config import DATABASE_CONFIG
+    if not DATABASE_CONFIG.get('profiling'):
+        return None
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = QueryProfiler(
+                db,
+                get_profile_source(),
+                slow_query_ms=DATABASE_CONFIG['slow_query_ms'],
+                flush_interval=DATABASE_CONFIG['profile_flush_interval']
+            )
+        return _profiler
+
+
+def load_profile_report(db, top_n=20, order_by='total', source=None):
+    """Топ отпечатков из query_profile (для CLI и веб-панели)"""
+    columns = {'total': 'total_ms', 'p95': 'p95_ms', 'count': 'count', 'max': 'max_ms'}
+    order_column = columns.get(order_by, 'total_ms')
+    query = 'SELECT source, fingerprint, count, total_ms, p95_ms, max_ms, rows_total, plan, updated_at FROM query_profile'
+    params = []
+    if source:
+        query += ' WHERE source = ?'
+        params.append(source)
+    query += f' ORDER BY {order_column} DESC LIMIT ?'
+    params.append(top_n)
+    return db.execute_query(query, tuple(params)) or []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Топ SQL-запросов по данным профилировщика')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--order', choices=['total', 'p95', 'count', 'max'], default='total')
+    parser.add_argument('--source', help='main, main.worker1, run, ... (по умолчанию все процессы)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    from database import DatabaseManager
+    rows = load_profile_report(DatabaseManager(), args.top, args.order, args.source)
+    if not rows:
+        logging.info("Нет данных. Включите DB_PROFILING=true и дайте боту поработать.")
+        return
+
+    logging.info(f"{'источник':<14} {'вызовы':>8} {'всего мс':>10} {'p95 мс':>8} {'max мс':>8} {'строк':>8}  запрос")
+    for source, fingerprint, count, total_ms, p95_ms, max_ms, rows_total, plan, updated_at in rows:
+        logging.info(f"{source:<14} {count:>8} {total_ms:>10.1f} {p95_ms:>8.2f} {max_ms:>8.2f} {rows_total:>8}  {fingerprint[:120]}")
+        if plan:
+            logging.info(f"{'':<14} план: {plan[:200]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Ограничение частоты запросов (GCRA) с ограниченным по памяти хранилищем ключей
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUTTLStore:
+    """Словарь с вытеснением по давности использования и сроку жизни записей"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.data[key] = (value, now + ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_keys:
+                self.data.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.data.pop(key, None)
+            return entry[0] if entry else None
+
+    def __len__(self):
+        return len(self.data)
+
+
+class MemoryGCRABackend:
+    """GCRA в памяти процесса: на ключ хранится одно число (TAT)"""
+
+    def __init__(self, max_keys=100000):
+        self.store = LRUTTLStore(max_keys)
+        self.lock = threading.Lock()
+
+    def acquire(self, key, emission_interval, tolerance):
+        """Возвращает (разрешено, через сколько секунд повторить)"""
+        now = time.monotonic()
+        with self.lock:
+            tat = self.store.get(key, now)
+            tat = now if tat is None or tat < now else tat
+            allow_at = tat - tolerance
+            if now < allow_at:
+                return False, allow_at - now
+            new_tat = tat + emission_interval
+            # Запись живет, пока влияет на решение
+            self.store.set(key, new_tat, new_tat - now, now)
+            return True, 0.0
+
+
+class RedisGCRABackend:
+    """GCRA в Redis: общее состояние для нескольких процессов бота"""
+
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local emission_interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local allow_at = tat - tolerance
+if now < allow_at then
+    return tostring(allow_at - now)
+end
+local new_tat = tat + emission_interval
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+    def __init__(self, redis_config, key_prefix='rl:'):
+        import redis
+        self.client = redis.Redis(
+            host=redis_config['host'],
+            port=redis_config['port'],
+            db=redis_config['db'],
+            password=redis_config.get('password'),
+            socket_timeout=1
+        )
+        self.key_prefix = key_prefix
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def acquire(self, key, emission_interval, tolerance):
+        retry_after = float(self.script(
+            keys=[self.key_prefix + key],
+            args=[time.time(), emission_interval, tolerance]
+        ))
+        return retry_after <= 0, retry_after
+
+
+class RateLimiter:
+    """Лимиты вида {действие: (количество, период в секундах)}.
+
+    GCRA допускает всплеск до `количество` запросов, после чего пропускает
+    не чаще одного запроса в period/количество секунд — это эквивалент
+    скользящего окна без хранения списка отметок времени.
+    """
+
+    def __init__(self, limits, backend=None):
+        self.limits = {}
+        for action, (count, period) in limits.items():
+            self.set_limit(action, count, period)
+        self.backend = backend or MemoryGCRABackend()
+        self.fallback = MemoryGCRABackend() if not isinstance(self.backend, MemoryGCRABackend) else None
+
+    def set_limit(self, action, count, period):
+        emission_interval = period / float(count)
+        self.limits[action] = (emission_interval, period - emission_interval)
+
+    def check(self, user_id, action):
+        """True, если действие разрешено (неизвестные действия не ограничиваются)"""
+        allowed, _ = self.acquire(user_id, action)
+        return allowed
+
+    def acquire(self, user_id, action):
+        limit = self.limits.get(action)
+        if not limit:
+            return True, 0.0
+        emission_interval, tolerance = limit
+        key = f"{user_id}:{action}"
+        try:
+            return self.backend.acquire(key, emission_interval, tolerance)
+        except Exception as e:
+            if not self.fallback:
+                raise
+            # Redis недоступен — ограничиваем локально, а не пропускаем всё
+            logging.info(f"Ошибка общего хранилища лимитов, используется локальное: {e}")
+            return self.fallback.acquire(key, emission_interval, tolerance)
+
+
+def create_rate_limit_backend(redis_config=None, max_keys=100000):
+    """Redis, если включен в REDIS_CONFIG и доступен, иначе память процесса"""
+    if redis_config and redis_config.get('enabled'):
+        try:
+            backend = RedisGCRABackend(redis_config)
+            backend.client.ping()
+            return backend
+        except Exception as e:
+            logging.info(f"Redis для лимитов недоступен, используется память процесса: {e}")
+    return MemoryGCRABackend(max_keys)
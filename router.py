@@ -0,0 +1,103 @@
+"""
+Маршрутизация текстовых сообщений и callback-данных
+"""
+import threading
+import time
+
+from metrics import metrics
+
+
+class Router:
+    """Таблица маршрутов: точные совпадения через dict, префиксы через trie.
+
+    Маршруты регистрируются один раз при старте. Поиск точного совпадения —
+    один lookup в dict, поиск префикса — проход по trie не длиннее самого
+    длинного зарегистрированного префикса (побеждает самый длинный префикс),
+    поэтому стоимость маршрутизации не растет с числом кнопок и языков.
+    """
+
+    TERMINAL = object()
+
+    def __init__(self, name):
+        self.name = name
+        self.exact_routes = {}
+        self.prefix_trie = {}
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def add_exact(self, keys, handler, route_name):
+        """Регистрация маршрута для точных значений (строка или список)"""
+        if isinstance(keys, str):
+            keys = [keys]
+        for key in keys:
+            if key and key not in self.exact_routes:
+                self.exact_routes[key] = (route_name, handler)
+        return self
+
+    def add_prefix(self, prefixes, handler, route_name):
+        """Регистрация маршрута для префиксов (строка или список)"""
+        if isinstance(prefixes, str):
+            prefixes = [prefixes]
+        for prefix in prefixes:
+            if not prefix:
+                continue
+            node = self.prefix_trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            # Первый зарегистрированный маршрут для префикса сохраняется
+            node.setdefault(self.TERMINAL, (route_name, handler))
+        return self
+
+    def resolve(self, key):
+        """Поиск маршрута: сначала точное совпадение, затем самый длинный префикс"""
+        route = self.exact_routes.get(key)
+        if route:
+            return route
+
+        node = self.prefix_trie
+        match = None
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                break
+            if self.TERMINAL in node:
+                match = node[self.TERMINAL]
+        return match
+
+    def dispatch(self, key, *args):
+        """Вызов обработчика для key. Возвращает False, если маршрут не найден"""
+        route = self.resolve(key or '')
+        if not route:
+            return False
+
+        route_name, handler = route
+        started = time.perf_counter()
+        try:
+            handler(*args)
+        finally:
+            self.record(route_name, time.perf_counter() - started)
+        return True
+
+    def record(self, route_name, duration):
+        """Счетчики вызовов и времени обработки маршрута"""
+        metrics.observe_update(f"{self.name}:{route_name}", duration)
+        with self.stats_lock:
+            stat = self.stats.get(route_name)
+            if stat is None:
+                stat = self.stats[route_name] = {'count': 0, 'total_time': 0.0, 'max_time': 0.0}
+            stat['count'] += 1
+            stat['total_time'] += duration
+            if duration > stat['max_time']:
+                stat['max_time'] = duration
+
+    def get_stats(self):
+        """Снимок счетчиков: route -> count, avg_ms, max_ms"""
+        with self.stats_lock:
+            return {
+                route_name: {
+                    'count': stat['count'],
+                    'avg_ms': round(stat['total_time'] * 1000 / stat['count'], 2) if stat['count'] else 0,
+                    'max_ms': round(stat['max_time'] * 1000, 2),
+                }
+                for route_name, stat in self.stats.items()
+            }
@@ -6,6 +6,8 @@ import logging
 import threading
 import time
 from logger import logger
+from metrics import metrics
+from post_delivery import PostDeliveryPipeline
 
 # Простой планировщик без внешних зависимостей
 class SimpleScheduler:
@@ -23,10 +25,13 @@ class SimpleScheduler:
         
         for job in self.jobs:
             if job.should_run(current_time, current_date):
+                started = time.perf_counter()
                 try:
                     job.run()
                 except Exception as e:
                     logging.info(f"Ошибка выполнения задачи: {e}")
+                finally:
+                    metrics.observe_job(getattr(job.job_func, '__name__', 'scheduled_job'), time.perf_counter() - started)
     
     def clear(self):
         self.jobs.clear()
@@ -85,6 +90,17 @@ class ScheduledPostsManager:
             BOT_CONFIG = {}
         cfg_channel = getenv('POST_CHANNEL_ID') or BOT_CONFIG.get('post_channel_id')
         self.channel_id = str(cfg_channel or '-1002566537425')  # можно задать @username или -100...
+        try:
+            from config import POST_DELIVERY_CONFIG
+        except Exception:
+            POST_DELIVERY_CONFIG = {}
+        # Потоки рассылки и планировщик запускает только основной процесс бота (start);
+        # веб-панель лишь ставит рассылки в очередь через delivery_pipeline.enqueue_delivery
+        self.delivery_pipeline = PostDeliveryPipeline(bot, db, **POST_DELIVERY_CONFIG)
+    
+    def start(self):
+        """Запуск очереди рассылки и планировщика постов"""
+        self.delivery_pipeline.start()
         self.start_scheduler()
     
     def start_scheduler(self):
@@ -212,22 +228,12 @@ class ScheduledPostsManager:
                     error_count = 1
                     logging.info(f"❌ Ошибка отправки в канал: {e}")
             else:
-                # Отправляем пользователям
-                for recipient in recipients:
-                    try:
-                        telegram_id = recipient[0] if isinstance(recipient, (list, tuple)) else recipient.get('telegram_id')
-                        if image_url:
-                            result = self.bot.send_photo(telegram_id, image_url, message_text, keyboard)
-                        else:
-                            result = self.bot.send_message(telegram_id, message_text, keyboard)
-                        
-                        if result and result.get('ok'):
-                            success_count += 1
-                        else:
-                            error_count += 1
-                    except Exception as e:
-                        error_count += 1
-                        logging.info(f"❌ Ошибка отправки пользователю: {e}")
+                # Пользователям — через очередь доставки, планировщик не блокируется
+                delivery_id = self.delivery_pipeline.enqueue_delivery(
+                    post_id, time_period, message_text, image_url, keyboard, recipients
+                )
+                logging.info(f"📬 Пост {post_id} ({time_period}) поставлен в рассылку {delivery_id}")
+                return delivery_id
             
             # Записываем статистику
             current_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
@@ -326,16 +332,14 @@ class ScheduledPostsManager:
         """Отправка отзывов о товарах в канал (ТОЛЬКО ПО ЗАПРОСУ)"""
         try:
             # Получаем популярные товары с отзывами
+            # Агрегаты рейтинга хранятся на товаре, таблицу отзывов не сканируем
             popular_products_with_reviews = self.db.execute_query('''
                 SELECT 
-                    p.id, p.name, p.price, p.image_url,
-                    AVG(r.rating) as avg_rating,
-                    COUNT(r.id) as reviews_count
-                FROM products p
-                JOIN reviews r ON p.id = r.product_id
-                WHERE p.is_active = 1
-                GROUP BY p.id, p.name, p.price, p.image_url
-                HAVING reviews_count >= 3
+                    id, name, price, image_url,
+                    CAST(rating_sum AS REAL) / rating_count as avg_rating,
+                    rating_count as reviews_count
+                FROM products
+                WHERE is_active = 1 AND rating_count >= 3
                 ORDER BY avg_rating DESC, reviews_count DESC
                 LIMIT 3
             ''')
@@ -1,31 +1,40 @@
 """
 Модуль безопасности для телеграм-бота
 """
-import logging
-
-import time
 import hashlib
 import hmac
 import json
 import re
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
+from config import SECURITY_CONFIG, REDIS_CONFIG
+from block_list import BlockList
+from log_sink import get_log_writer
+from rate_limiter import RateLimiter, LRUTTLStore, create_rate_limit_backend
+from spam_filter import SpamClassifier, DEFAULT_SPAM_RULES, load_spam_rules
 
 class SecurityManager:
     def __init__(self, db):
         self.db = db
-        self.rate_limits = defaultdict(list)
-        self.blocked_users = set()
-        self.suspicious_activity = defaultdict(int)
+        self.audit_log = get_log_writer(db)
+        # Активные блокировки загружаются из security_blocks при старте
+        self.block_list = BlockList(db, SECURITY_CONFIG['block_list_reload_interval'])
+        self.block_list.start()
+        # Счетчики подозрительной активности и отметки последней записи в лог — с вытеснением
+        self.suspicious_activity = LRUTTLStore(max_keys=SECURITY_CONFIG['rate_limit_max_keys'])
+        self.rate_limit_logged = LRUTTLStore(max_keys=SECURITY_CONFIG['rate_limit_max_keys'])
         
         # Настройки лимитов
         self.limits = {
-            'messages_per_minute': 20,
+            'messages_per_minute': SECURITY_CONFIG['rate_limit_per_minute'],
             'orders_per_hour': 5,
             'search_per_minute': 10,
             'cart_actions_per_minute': 30,
             'callback_per_minute': 50
         }
+        self.rate_limiter = RateLimiter(
+            self.parse_limits(self.limits),
+            create_rate_limit_backend(REDIS_CONFIG, SECURITY_CONFIG['rate_limit_max_keys'])
+        )
         
         # Настройки блокировки
         self.block_thresholds = {
@@ -34,70 +43,69 @@ class SecurityManager:
             'suspicious_searches': 100
         }
     
+    @staticmethod
+    def parse_limits(limits):
+        """'search_per_minute': 10 -> 'search': (10, 60)"""
+        periods = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+        parsed = {}
+        for limit_key, count in limits.items():
+            action, _, period = limit_key.rpartition('_per_')
+            if action and period in periods and count:
+                parsed[action] = (count, periods[period])
+        return parsed
+    
     def check_rate_limit(self, user_id, action_type):
         """Проверка лимитов частоты запросов"""
-        now = time.time()
-        user_key = f"{user_id}_{action_type}"
-        
-        # Очищаем старые записи
-        self.rate_limits[user_key] = [
-            timestamp for timestamp in self.rate_limits[user_key]
-            if now - timestamp < 60  # Последняя минута
-        ]
-        
-        # Проверяем лимит
-        limit_key = f"{action_type}_per_minute"
-        if limit_key in self.limits:
-            if len(self.rate_limits[user_key]) >= self.limits[limit_key]:
-                self.log_suspicious_activity(user_id, f"rate_limit_exceeded_{action_type}")
-                return False
-        
-        # Добавляем текущий запрос
-        self.rate_limits[user_key].append(now)
-        return True
+        allowed, _ = self.acquire_rate_limit(user_id, action_type)
+        return allowed
+    
+    def acquire_rate_limit(self, user_id, action_type):
+        """Проверка лимита. Возвращает (разрешено, первый отказ за минуту)"""
+        if self.rate_limiter.check(user_id, action_type):
+            return True, False
+        
+        # В лог безопасности пишем не чаще раза в минуту на пользователя и действие
+        log_key = f"{user_id}_{action_type}"
+        if self.rate_limit_logged.get(log_key) is not None:
+            return False, False
+        self.rate_limit_logged.set(log_key, True, 60)
+        self.log_suspicious_activity(user_id, f"rate_limit_exceeded_{action_type}")
+        return False, True
     
     def is_user_blocked(self, user_id):
-        """Проверка блокировки пользователя"""
-        return user_id in self.blocked_users
+        """Проверка блокировки пользователя (без обращения к БД)"""
+        return self.block_list.is_blocked(user_id)
     
-    def block_user(self, user_id, reason, duration_hours=24):
+    def block_user(self, user_id, reason, duration_hours=None):
         """Блокировка пользователя"""
-        self.blocked_users.add(user_id)
-        
-        # Сохраняем в базу
-        try:
-            self.db.execute_query('''
-                INSERT INTO security_blocks (user_id, reason, blocked_until, created_at)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                user_id,
-                reason,
-                (datetime.now() + timedelta(hours=duration_hours)).strftime('%Y-%m-%d %H:%M:%S'),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-        except Exception as e:
-            logging.info(f"Ошибка записи блокировки: {e}")
-        
+        if duration_hours is None:
+            duration_hours = SECURITY_CONFIG['block_duration_hours']
+        self.block_list.block(user_id, reason, duration_hours)
         self.log_security_event(user_id, 'user_blocked', {'reason': reason, 'duration': duration_hours})
     
+    def unblock_user(self, user_id, admin_id=None):
+        """Досрочная разблокировка пользователя"""
+        unblocked = self.block_list.unblock(user_id)
+        if unblocked:
+            self.log_security_event(user_id, 'user_unblocked', {'admin_id': admin_id})
+        return unblocked
+    
     def log_suspicious_activity(self, user_id, activity_type, details=""):
         """Логирование подозрительной активности"""
-        self.suspicious_activity[f"{user_id}_{activity_type}"] += 1
-        
-        # Сохраняем в базу
-        try:
-            self.db.execute_query('''
-                INSERT INTO security_logs (user_id, activity_type, details, severity, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                user_id,
-                activity_type,
-                details,
-                self.get_activity_severity(activity_type),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-        except Exception as e:
-            logging.info(f"Ошибка записи лога безопасности: {e}")
+        activity_key = f"{user_id}_{activity_type}"
+        self.suspicious_activity.set(activity_key, (self.suspicious_activity.get(activity_key) or 0) + 1, 86400)
+        
+        # Запись в базу идет пачками в фоне
+        self.audit_log.write('''
+            INSERT INTO security_logs (user_id, activity_type, details, severity, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            user_id,
+            activity_type,
+            details,
+            self.get_activity_severity(activity_type),
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ))
     
     def get_activity_severity(self, activity_type):
         """Определение серьезности активности"""
@@ -115,19 +123,16 @@ class SecurityManager:
         """Логирование событий безопасности"""
         details_json = json.dumps(details) if details else None
         
-        try:
-            self.db.execute_query('''
-                INSERT INTO security_logs (user_id, activity_type, details, severity, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                user_id,
-                event_type,
-                details_json,
-                'info',
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-        except Exception as e:
-            logging.info(f"Ошибка записи события безопасности: {e}")
+        self.audit_log.write('''
+            INSERT INTO security_logs (user_id, activity_type, details, severity, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            user_id,
+            event_type,
+            details_json,
+            'info',
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ))
     
     def verify_webhook_signature(self, payload, signature, secret_key):
         """Проверка подписи webhook'а"""
@@ -142,36 +147,27 @@ class SecurityManager:
 class AntiSpamFilter:
     def __init__(self, db):
         self.db = db
-        self.spam_patterns = [
-            r'(https?://[^\s]+)',  # URL
-            r'(@\w+)',  # Упоминания
-            r'(\b\d{4,}\b)',  # Длинные числа
-            r'(СКИДКА|АКЦИЯ|БЕСПЛАТНО|FREE)',  # Спам слова
-        ]
+        self.classifier = SpamClassifier(
+            threshold=SECURITY_CONFIG['spam_threshold'],
+            duplicate_limit=SECURITY_CONFIG['spam_duplicate_limit'],
+            dedup_window=SECURITY_CONFIG['spam_dedup_window'],
+            dedup_max_keys=SECURITY_CONFIG['rate_limit_max_keys']
+        )
+        self.reload_rules()
         self.blacklist = set()
     
-    def is_spam(self, message):
+    def reload_rules(self):
+        """Загрузка взвешенных правил из БД (пустая таблица — правила по умолчанию)"""
+        rules = load_spam_rules(self.db)
+        self.classifier.set_rules(rules or DEFAULT_SPAM_RULES)
+    
+    def get_spam_score(self, message, user_id=None):
+        """Баллы сообщения и сработавшие правила"""
+        return self.classifier.score(message, user_id)
+    
+    def is_spam(self, message, user_id=None):
         """Проверка сообщения на спам"""
-        if not message:
-            return False
-        
-        message_upper = message.upper()
-        
-        # Проверяем спам-паттерны
-        spam_score = 0
-        for pattern in self.spam_patterns:
-            if re.search(pattern, message_upper):
-                spam_score += 1
-        
-        # Проверяем повторяющиеся символы
-        if re.search(r'(.)\1{5,}', message):
-            spam_score += 2
-        
-        # Проверяем капс
-        if len(message) > 10 and message.isupper():
-            spam_score += 1
-        
-        return spam_score >= 3
+        return self.classifier.is_spam(message, user_id)
     
     def add_to_blacklist(self, user_id):
         """Добавление в черный список"""
@@ -214,18 +210,16 @@ class InputSanitizer:
 class ActivityLogger:
     def __init__(self, db):
         self.db = db
+        self.audit_log = get_log_writer(db)
     
     def log_action(self, user_id, action, details=""):
         """Логирование действий пользователя"""
-        try:
-            self.db.execute_query('''
-                INSERT INTO user_activity_logs (user_id, action, search_query, created_at)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                user_id,
-                action,
-                details[:100] if details else None,
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-        except Exception as e:
-            logging.info(f"Ошибка логирования активности: {e}")
\ No newline at end of file
+        self.audit_log.write('''
+            INSERT INTO user_activity_logs (user_id, action, search_query, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (
+            user_id,
+            action,
+            details[:100] if details else None,
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ))
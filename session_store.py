@@ -0,0 +1,196 @@
+"""
+Хранилище состояний диалогов (FSM) с истечением по TTL
+"""
+import json
+import logging
+import threading
+import time
+
+from rate_limiter import LRUTTLStore
+
+
+def dump_value(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_value(raw):
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    return json.loads(raw)
+
+
+class MemorySessionBackend:
+    """Состояния в памяти процесса (теряются при перезапуске)"""
+
+    def __init__(self, max_keys=100000):
+        self.store = LRUTTLStore(max_keys)
+
+    def get(self, key):
+        raw = self.store.get(key)
+        return None if raw is None else load_value(raw)
+
+    def set(self, key, value, ttl):
+        self.store.set(key, dump_value(value), ttl)
+
+    def delete(self, key):
+        self.store.pop(key)
+
+
+class SQLSessionBackend:
+    """Состояния в таблице user_sessions (SQLite или Postgres из DatabaseManager).
+
+    Переживает перезапуск и доступно всем процессам бота с общей БД.
+    Просроченные строки не возвращаются и удаляются фоновым потоком
+    раз в purge_interval секунд.
+    """
+
+    def __init__(self, db, purge_interval=600):
+        self.db = db
+        self.purge_interval = purge_interval
+        if purge_interval:
+            threading.Thread(target=self.purge_worker, name="session-purge", daemon=True).start()
+
+    def get(self, key):
+        rows = self.db.execute_query(
+            'SELECT value FROM user_sessions WHERE session_key = ? AND expires_at > ?',
+            (key, time.time())
+        )
+        return load_value(rows[0][0]) if rows else None
+
+    def set(self, key, value, ttl):
+        self.db.execute_query('''
+            INSERT INTO user_sessions (session_key, value, expires_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT (session_key) DO UPDATE SET
+                value = excluded.value, expires_at = excluded.expires_at
+        ''', (key, dump_value(value), time.time() + ttl))
+
+    def delete(self, key):
+        self.db.execute_query('DELETE FROM user_sessions WHERE session_key = ?', (key,))
+
+    def purge_worker(self):
+        while True:
+            time.sleep(self.purge_interval)
+            try:
+                self.purge_expired()
+            except Exception as e:
+                logging.info(f"Ошибка очистки состояний диалогов: {e}")
+
+    def purge_expired(self):
+        return self.db.execute_query('DELETE FROM user_sessions WHERE expires_at <= ?', (time.time(),))
+
+
+class RedisSessionBackend:
+    """Состояния в Redis (SET ... EX), истечение — средствами Redis"""
+
+    def __init__(self, redis_config, key_prefix='fsm:'):
+        import redis
+        self.client = redis.Redis(
+            host=redis_config['host'],
+            port=redis_config['port'],
+            db=redis_config['db'],
+            password=redis_config.get('password'),
+            socket_timeout=1
+        )
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        raw = self.client.get(self.key_prefix + key)
+        return None if raw is None else load_value(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.key_prefix + key, dump_value(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.key_prefix + key)
+
+
+class SessionStore:
+    """Словарь состояний одного вида (namespace) поверх общего бэкенда.
+
+    Поддерживает операции, которыми обработчики пользовались у обычного
+    dict: get, [], del, in, pop. Значение хранится целиком в JSON, поэтому
+    изменение вложенного словаря нужно записать обратно (store[key] = data
+    или merge). Каждая запись продлевает TTL.
+    """
+
+    def __init__(self, backend, namespace, ttl=86400):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def make_key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        try:
+            value = self.backend.get(self.make_key(key))
+        except Exception as e:
+            logging.info(f"Ошибка чтения состояния {self.namespace}:{key}: {e}")
+            return default
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        try:
+            self.backend.set(self.make_key(key), value, self.ttl)
+        except Exception as e:
+            logging.info(f"Ошибка записи состояния {self.namespace}:{key}: {e}")
+
+    def __delitem__(self, key):
+        try:
+            self.backend.delete(self.make_key(key))
+        except Exception as e:
+            logging.info(f"Ошибка удаления состояния {self.namespace}:{key}: {e}")
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def pop(self, key, default=None):
+        value = self.get(key)
+        if value is not None:
+            del self[key]
+            return value
+        return default
+
+    def merge(self, key, **fields):
+        """Обновление полей словаря-значения; возвращает новое значение"""
+        value = self.get(key) or {}
+        value.update(fields)
+        self[key] = value
+        return value
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_session_backend(db, config, redis_config=None):
+    """memory | sql | redis (Redis при недоступности заменяется таблицей в БД)"""
+    backend = config.get('backend', 'memory')
+    if backend == 'redis':
+        try:
+            redis_backend = RedisSessionBackend(redis_config or {})
+            redis_backend.client.ping()
+            return redis_backend
+        except Exception as e:
+            logging.info(f"Redis для состояний диалогов недоступен, используется БД: {e}")
+            backend = 'sql'
+    if backend == 'sql':
+        return SQLSessionBackend(db, config.get('purge_interval', 600))
+    return MemorySessionBackend(config.get('max_keys', 100000))
+
+
+def get_session_store(db, namespace):
+    """Хранилище состояний namespace на общем бэкенде процесса (SESSION_CONFIG)"""
+    global _backend
+    from config import SESSION_CONFIG, REDIS_CONFIG
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_session_backend(db, SESSION_CONFIG, REDIS_CONFIG)
+    return SessionStore(_backend, namespace, SESSION_CONFIG['ttl'])
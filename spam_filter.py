@@ -0,0 +1,171 @@
+"""
+Оценка сообщений на спам: взвешенные правила и повторы одного текста
+"""
+import hashlib
+import logging
+import re
+import time
+
+from rate_limiter import LRUTTLStore
+
+# Правила по умолчанию: (имя, регулярное выражение, вес)
+DEFAULT_SPAM_RULES = [
+    ('url', r'https?://[^\s]+', 1),
+    ('mention', r'@\w+', 1),
+    ('long_number', r'\b\d{4,}\b', 1),
+    ('spam_words', r'СКИДКА|АКЦИЯ|БЕСПЛАТНО|FREE', 1),
+    ('repeated_chars', r'(.)\1{5,}', 2),
+]
+
+
+class SpamClassifier:
+    """Подсчет спам-баллов по взвешенным правилам.
+
+    Все правила собираются в одно выражение из необязательных опережающих
+    проверок, по группе на правило:
+    ^(?:(?=[\\s\\S]*?(?P<r0>...)))?(?:(?=[\\s\\S]*?(?P<r1>...)))?...
+    Один match дает все сработавшие правила сразу (группы не None), и
+    правила, совпадающие в одной позиции, учитываются независимо — как при
+    отдельном search на каждое. Обратные ссылки \\N внутри правил
+    перенумеровываются со сдвигом групп. Если общее выражение не
+    компилируется (например, одинаковые именованные группы в разных
+    правилах), правила проверяются по отдельности. Скомпилированное
+    состояние подменяется целиком, поэтому score читает его без блокировки.
+
+    Повторы: для каждого пользователя хранится отпечаток нормализованного
+    текста в ограниченном LRU; одинаковые сообщения сверх duplicate_limit
+    за dedup_window секунд добавляют duplicate_weight.
+    """
+
+    CAPS_WEIGHT = 1
+    NORMALIZE_RE = re.compile(r'\W+')
+    BACKREF_RE = re.compile(r'\\(?:([1-9]\d?)|.)|\[(?:\\.|[^\]\\])*\]?', re.DOTALL)
+
+    def __init__(self, rules=None, threshold=3, duplicate_limit=3, duplicate_weight=3,
+                 dedup_window=300, dedup_max_keys=100000):
+        self.threshold = threshold
+        self.duplicate_limit = duplicate_limit
+        self.duplicate_weight = duplicate_weight
+        self.dedup_window = dedup_window
+        self.fingerprints = LRUTTLStore(max_keys=dedup_max_keys)
+        self.set_rules(rules or DEFAULT_SPAM_RULES)
+
+    def set_rules(self, rules):
+        """Компиляция списка правил [(имя, выражение, вес)]"""
+        compiled_rules = []
+        parts = []
+        group_offset = 0
+        for name, pattern, weight in rules:
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                logging.info(f"Некорректное спам-правило {name}: {e}")
+                continue
+            index = len(compiled_rules)
+            # Группа правила получает следующий номер, его собственные группы — за ней
+            group_offset += 1
+            parts.append(
+                f"(?:(?=[\\s\\S]*?(?P<r{index}>{self.shift_backrefs(pattern, group_offset)})))?"
+            )
+            group_offset += compiled.groups
+            # Индекс группы правила в match.groups()
+            compiled_rules.append((name, compiled.search, weight, group_offset - 1))
+
+        try:
+            combined = re.compile('^' + ''.join(parts), re.IGNORECASE).match
+        except re.error as e:
+            logging.info(f"Спам-правила проверяются по отдельности: {e}")
+            combined = None
+        self.rules = (compiled_rules, combined)
+
+    def shift_backrefs(self, pattern, offset):
+        """Сдвиг обратных ссылок \\N на offset (символьные классы не меняются)"""
+        def replace(match):
+            if match.group(1):
+                return f"(?:\\{int(match.group(1)) + offset})"
+            return match.group(0)
+        return self.BACKREF_RE.sub(replace, pattern)
+
+    def score(self, message, user_id=None):
+        """Баллы и список сработавших правил"""
+        if not message:
+            return 0, []
+
+        rules, combined = self.rules
+        matched = []
+        spam_score = 0
+        if combined:
+            groups = combined(message).groups()
+            for name, search, weight, group in rules:
+                if groups[group] is not None:
+                    matched.append(name)
+                    spam_score += weight
+        else:
+            for name, search, weight, group in rules:
+                if search(message):
+                    matched.append(name)
+                    spam_score += weight
+
+        if len(message) > 10 and message.isupper():
+            matched.append('caps')
+            spam_score += self.CAPS_WEIGHT
+
+        if user_id is not None and self.is_duplicate(user_id, message):
+            matched.append('duplicate')
+            spam_score += self.duplicate_weight
+
+        return spam_score, matched
+
+    def is_spam(self, message, user_id=None):
+        spam_score, _ = self.score(message, user_id)
+        return spam_score >= self.threshold
+
+    def fingerprint(self, message):
+        normalized = self.NORMALIZE_RE.sub(' ', message.lower()).strip()
+        return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+
+    def is_duplicate(self, user_id, message):
+        """Учет повтора; True, если текст повторен больше duplicate_limit раз"""
+        key = (user_id, self.fingerprint(message))
+        count = (self.fingerprints.get(key) or 0) + 1
+        self.fingerprints.set(key, count, self.dedup_window)
+        return count > self.duplicate_limit
+
+
+def load_spam_rules(db):
+    """Активные правила из таблицы spam_rules (None, если прочитать не удалось)"""
+    rows = db.execute_query('''
+        SELECT name, pattern, weight FROM spam_rules
+        WHERE is_active = 1
+        ORDER BY id
+    ''')
+    if rows is None:
+        return None
+    return [(name, pattern, weight) for name, pattern, weight in rows]
+
+
+SAMPLE_MESSAGES = [
+    "Здравствуйте, когда будет доставка заказа?",
+    "🛍 Каталог",
+    "Покажите пожалуйста наушники",
+    "СКИДКА 90%!!! ЗАХОДИ https://spam.example.com @spam_channel 88005553535",
+    "аааааааааа бесплатно",
+    "Спасибо, все пришло",
+]
+
+
+def benchmark(iterations=200000, classifier=None):
+    """Пропускная способность классификатора, сообщений в секунду"""
+    classifier = classifier or SpamClassifier()
+    messages = SAMPLE_MESSAGES
+    started = time.perf_counter()
+    for index in range(iterations):
+        classifier.score(messages[index % len(messages)], index % 1000)
+    elapsed = time.perf_counter() - started
+    return iterations / elapsed if elapsed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    rate = benchmark()
+    logging.info(f"📊 Спам-фильтр: {rate:,.0f} сообщений/сек")
@@ -0,0 +1,119 @@
+"""
+Запуск бота: ленивое создание подсистем, параллельная инициализация и профилирование
+"""
+import importlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """Время импорта и инициализации подсистем (main.py --profile-startup).
+
+    Замеры пишутся всегда — это несколько вызовов perf_counter на подсистему,
+    а отчет печатается только по запросу.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last_mark = self.started
+        self.records = []
+        self.lock = threading.Lock()
+
+    def record(self, stage, name, seconds):
+        with self.lock:
+            self.records.append((stage, name, seconds, threading.current_thread().name))
+
+    @contextmanager
+    def measure(self, stage, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, name, time.perf_counter() - started)
+
+    def mark(self, stage, name):
+        """Замер от предыдущей отметки (например, блок импортов модуля)"""
+        now = time.perf_counter()
+        self.record(stage, name, now - self.last_mark)
+        self.last_mark = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def log_report(self):
+        with self.lock:
+            records = sorted(self.records, key=lambda record: record[2], reverse=True)
+        logging.info(f"{'этап':<8} {'мс':>9}  {'поток':<22} подсистема")
+        for stage, name, seconds, thread_name in records:
+            logging.info(f"{stage:<8} {seconds * 1000:>9.1f}  {thread_name[:22]:<22} {name}")
+        logging.info(f"Всего с начала импорта: {self.elapsed() * 1000:.1f} мс")
+
+
+startup_profiler = StartupProfiler()
+
+
+def import_optional(module_name, *names):
+    """Импорт необязательного модуля с замером; None вместо недоступных классов"""
+    with startup_profiler.measure('import', module_name):
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            logging.info(f"⚠️ Модуль {module_name} недоступен: {e}")
+            module = None
+    values = tuple(getattr(module, name, None) for name in names)
+    return values[0] if len(values) == 1 else values
+
+
+class lazy_subsystem:
+    """Атрибут бота, который создается при первом обращении.
+
+    Фабрика получает экземпляр бота; результат кладется в __dict__ экземпляра,
+    поэтому следующие обращения — обычное чтение атрибута без блокировки.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+        self.lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        with self.lock:
+            if self.name not in instance.__dict__:
+                with startup_profiler.measure('lazy', self.name):
+                    try:
+                        instance.__dict__[self.name] = self.factory(instance)
+                    except Exception as e:
+                        logging.info(f"⚠️ Подсистема {self.name} недоступна: {e}")
+                        instance.__dict__[self.name] = None
+        return instance.__dict__[self.name]
+
+
+def run_parallel(tasks, workers=4, optional=False):
+    """Параллельная инициализация независимых подсистем: {имя: фабрика} -> {имя: объект}.
+
+    Ошибка обязательной подсистемы пробрасывается после завершения остальных;
+    при optional=True она логируется, а вместо объекта возвращается None.
+    """
+    def run(name, factory):
+        with startup_profiler.measure('init', name):
+            try:
+                return factory()
+            except Exception as e:
+                logging.info(f"⚠️ Ошибка инициализации {name}: {e}")
+                if not optional:
+                    raise
+                return None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='startup') as executor:
+        futures = {name: executor.submit(run, name, factory) for name, factory in tasks.items()}
+    # Выход из with дожидается всех задач, поэтому result() уже не блокирует
+    return {name: future.result() for name, future in futures.items()}
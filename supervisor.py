@@ -0,0 +1,234 @@
+"""
+Многопроцессная обработка обновлений: прием в одном процессе, обработка в N рабочих
+"""
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from config import BOT_CONFIG
+from webhook_server import TelegramWebhookServer
+
+HEARTBEAT_INTERVAL = 5
+
+
+def worker_main(index, token, update_queue, status_queue):
+    """Рабочий процесс: полноценный бот, обновления берутся из своей очереди по одному"""
+    from logger import logger
+    from query_profiler import use_worker_source
+    # Каждый процесс пишет и ротирует свои файлы логов (bot.worker<N>.log)
+    # и сохраняет свой профиль запросов (source main.worker<N>)
+    logger.use_worker_files(index)
+    use_worker_source(index)
+    from main import TelegramShopBot
+
+    bot = TelegramShopBot(token, worker_index=index)
+    # Ctrl+C получает вся группа процессов; остановкой рабочих управляет supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    state = {'processed': 0, 'last_update_at': None}
+
+    def heartbeat_worker():
+        while bot.running:
+            health = bot.health_monitor.metrics
+            try:
+                status_queue.put_nowait({
+                    'worker': index,
+                    'pid': multiprocessing.current_process().pid,
+                    'processed': state['processed'],
+                    'errors': health['errors_count'],
+                    'database_status': health['database_status'],
+                    'memory_mb': health['memory_usage'],
+                    'queued': update_queue.qsize(),
+                    'last_update_at': state['last_update_at'],
+                    'ts': time.time()
+                })
+            except Exception:
+                pass
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    threading.Thread(target=heartbeat_worker, name="worker-heartbeat", daemon=True).start()
+    logging.info(f"Рабочий процесс {index} запущен")
+
+    while bot.running:
+        try:
+            update = update_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+        if update is None:
+            break
+        # process_update сам перехватывает и считает ошибки
+        bot.process_update(update)
+        state['processed'] += 1
+        state['last_update_at'] = time.time()
+
+
+class UpdateSupervisor:
+    """Процесс приема обновлений (long polling или webhook) и N рабочих процессов.
+
+    Обновление уходит в очередь рабочего hash(chat_id) % N, а рабочий
+    обрабатывает свою очередь последовательно — порядок сообщений внутри
+    чата сохраняется, а разные чаты обрабатываются на разных ядрах без
+    общего GIL. Рабочие получают те же переменные окружения, то есть ту же
+    БД, SESSION_BACKEND и лимиты. Раз в HEARTBEAT_INTERVAL секунд каждый
+    рабочий присылает отчет о состоянии; упавший процесс перезапускается,
+    и его очередь, в которой сохранились необработанные обновления,
+    разбирает новый экземпляр.
+    """
+
+    def __init__(self, token, workers, queue_size=1000):
+        self.token = token
+        self.base_url = f"{BOT_CONFIG['api_url']}/bot{token}"
+        self.workers = workers
+        self.context = multiprocessing.get_context('spawn')
+        self.queues = [self.context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.status_queue = self.context.Queue()
+        self.processes = [None] * workers
+        self.health = {}
+        self.restarts = [0] * workers
+        self.offset = 0
+        self.running = True
+
+    def start_worker(self, index):
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.token, self.queues[index], self.status_queue),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+        logging.info(f"Запущен рабочий процесс {index} (pid {process.pid})")
+
+    def start(self):
+        for index in range(self.workers):
+            self.start_worker(index)
+        threading.Thread(target=self.monitor_worker, name="supervisor-monitor", daemon=True).start()
+
+    def process_update(self, update):
+        """Маршрутизация обновления в очередь рабочего по chat_id"""
+        chat_id = TelegramWebhookServer.get_chat_id(update)
+        # Очередь ограничена: при перегрузке прием ждет, а не теряет обновления
+        self.queues[hash(chat_id) % self.workers].put(update)
+
+    def monitor_worker(self):
+        """Отчеты рабочих и перезапуск упавших процессов"""
+        last_summary = time.monotonic()
+        while self.running:
+            try:
+                report = self.status_queue.get(timeout=HEARTBEAT_INTERVAL)
+                self.health[report['worker']] = report
+            except queue.Empty:
+                pass
+
+            for index, process in enumerate(self.processes):
+                if self.running and process is not None and not process.is_alive():
+                    self.restarts[index] += 1
+                    logging.warning(f"Рабочий процесс {index} завершился (код {process.exitcode}), перезапуск")
+                    self.start_worker(index)
+
+            if time.monotonic() - last_summary >= 60:
+                last_summary = time.monotonic()
+                logging.info(f"Состояние рабочих: {json.dumps(self.get_worker_health(), ensure_ascii=False)}")
+
+    def get_worker_health(self):
+        """Последний отчет каждого рабочего; stale — отчета не было 3 интервала"""
+        now = time.time()
+        workers = []
+        for index, process in enumerate(self.processes):
+            report = dict(self.health.get(index) or {'worker': index})
+            report['alive'] = bool(process and process.is_alive())
+            report['restarts'] = self.restarts[index]
+            report['stale'] = now - report.get('ts', 0) > HEARTBEAT_INTERVAL * 3
+            report['queued'] = self.queues[index].qsize()
+            workers.append(report)
+        return workers
+
+    def call_api(self, method, data=None, timeout=None):
+        url = f"{self.base_url}/{method}"
+        try:
+            request = urllib.request.Request(url, data=urllib.parse.urlencode(data or {}).encode('utf-8'), method='POST')
+            with urllib.request.urlopen(request, timeout=timeout or BOT_CONFIG['request_timeout']) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except Exception as e:
+            logging.info(f"Ошибка вызова {method}: {e}")
+            return None
+
+    def run(self):
+        """Запуск рабочих и приема обновлений до остановки"""
+        self.start()
+        try:
+            if BOT_CONFIG.get('update_mode') == 'webhook':
+                self.run_webhook()
+            else:
+                self.run_polling()
+        except KeyboardInterrupt:
+            logging.info("🛑 Supervisor остановлен пользователем")
+        finally:
+            self.stop()
+
+    def run_polling(self):
+        # Активный webhook блокирует getUpdates
+        self.call_api('deleteWebhook')
+        logging.info(f"🛍 Бот запущен: прием через long polling, рабочих процессов: {self.workers}")
+        while self.running:
+            result = self.call_api('getUpdates', {'offset': self.offset, 'timeout': 30}, timeout=40)
+            if not result or not result.get('ok'):
+                time.sleep(3)
+                continue
+            for update in result['result']:
+                self.offset = update['update_id'] + 1
+                self.process_update(update)
+
+    def run_webhook(self):
+        webhook_url = BOT_CONFIG.get('webhook_url')
+        if not webhook_url:
+            logging.error("❌ UPDATE_MODE=webhook, но WEBHOOK_URL не задан")
+            return
+        server = TelegramWebhookServer(
+            self,
+            host=BOT_CONFIG['webhook_listen_host'],
+            port=BOT_CONFIG['webhook_listen_port'],
+            path=BOT_CONFIG['webhook_path'],
+            secret_token=BOT_CONFIG.get('webhook_secret'),
+            workers=BOT_CONFIG['webhook_workers']
+        )
+        server.start()
+        data = {
+            'url': webhook_url.rstrip('/') + BOT_CONFIG['webhook_path'],
+            'allowed_updates': json.dumps(['message', 'callback_query']),
+            'max_connections': BOT_CONFIG['webhook_workers'] * 10,
+            'secret_token': server.secret_token
+        }
+        result = self.call_api('setWebhook', data)
+        if not result or not result.get('ok'):
+            logging.error(f"❌ Не удалось установить webhook: {result}")
+            server.stop()
+            return
+        logging.info(f"🛍 Бот запущен: прием через webhook, рабочих процессов: {self.workers}")
+        try:
+            while self.running:
+                time.sleep(1)
+        finally:
+            server.stop()
+
+    def stop(self, timeout=10):
+        """Остановка: рабочие дорабатывают свои очереди, затем завершаются"""
+        self.running = False
+        for update_queue in self.queues:
+            try:
+                update_queue.put(None, timeout=1)
+            except Exception:
+                pass
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        logging.info("🔄 Рабочие процессы остановлены")
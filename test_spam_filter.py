@@ -0,0 +1,87 @@
+"""
+Регрессионная проверка SpamClassifier: баллы совпадают с прежним AntiSpamFilter.is_spam
+"""
+import re
+
+from spam_filter import DEFAULT_SPAM_RULES, SpamClassifier
+
+# Прежняя проверка: каждый шаблон искался отдельно. Единственное намеренное
+# отличие — регистр не учитывается (раньше поиск шел по message.upper(),
+# и шаблон URL в нижнем регистре не срабатывал никогда).
+LEGACY_PATTERNS = [
+    r'(https?://[^\s]+)',
+    r'(@\w+)',
+    r'(\b\d{4,}\b)',
+    r'(СКИДКА|АКЦИЯ|БЕСПЛАТНО|FREE)',
+]
+
+MESSAGES = [
+    'Звоните 88888888',
+    '@user 1111111',
+    'http://aaaaaaaa.com',
+    'СКИДКА 90%!!! ЗАХОДИ https://spam.example.com @spam_channel 88005553535',
+    'аааааааааа бесплатно',
+    'Здравствуйте, когда будет доставка заказа?',
+    'Спасибо, все пришло',
+    'ПРИВЕТ ВСЕМ В ЧАТЕ',
+    'free iphone @promo',
+    '',
+]
+
+
+def legacy_score(message):
+    if not message:
+        return 0
+    score = 0
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, message, re.IGNORECASE):
+            score += 1
+    if re.search(r'(.)\1{5,}', message):
+        score += 2
+    if len(message) > 10 and message.isupper():
+        score += 1
+    return score
+
+
+def test_scores_match_legacy_filter():
+    classifier = SpamClassifier()
+    for message in MESSAGES:
+        assert classifier.score(message)[0] == legacy_score(message), message
+
+
+def test_overlapping_rules_are_counted_separately():
+    classifier = SpamClassifier()
+    assert classifier.score('Звоните 88888888') == (3, ['long_number', 'repeated_chars'])
+    assert classifier.is_spam('@user 1111111')
+    assert classifier.is_spam('http://aaaaaaaa.com')
+
+
+def test_backreference_rules():
+    classifier = SpamClassifier(rules=[('double_word', r'\b(\w+) \1\b', 2), ('url', r'https?://\S+', 1)])
+    assert classifier.score('купи купи http://x.io') == (3, ['double_word', 'url'])
+
+
+def test_rules_are_matched_in_one_pass():
+    classifier = SpamClassifier()
+    rules, combined = classifier.rules
+    assert combined is not None
+    assert len(rules) == len(DEFAULT_SPAM_RULES)
+
+
+def test_backreferences_are_shifted_per_rule():
+    classifier = SpamClassifier(rules=[
+        ('double_char', r'(\w)\1', 1),
+        ('triple_digit_tail', r'(\d)(\d)\2', 1),
+        ('class_escape', r'(x)[\1]', 1),
+    ])
+    assert classifier.rules[1] is not None
+    assert classifier.score('ab 122') == (2, ['double_char', 'triple_digit_tail'])
+    assert classifier.score('aa') == (1, ['double_char'])
+    assert classifier.score('x\x01') == (1, ['class_escape'])
+
+
+def test_falls_back_to_separate_search():
+    # Одинаковые именованные группы не собираются в одно выражение
+    classifier = SpamClassifier(rules=[('a', r'(?P<w>a)', 1), ('b', r'(?P<w>b)', 1)])
+    assert classifier.rules[1] is None
+    assert classifier.score('ab') == (2, ['a', 'b'])
@@ -0,0 +1,107 @@
+"""
+Прием обновлений через TelegramWebhookServer на локальной имитации Telegram (FakeTelegramAPI)
+"""
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fake_telegram import FakeTelegramAPI
+from webhook_server import TelegramWebhookServer
+
+TOKEN = 'TEST:TOKEN'
+
+
+class EchoBot:
+    """Минимальный бот: отвечает в чат текстом полученного сообщения"""
+
+    def __init__(self, api):
+        self.base_url = f"{api.base_url}/bot{TOKEN}"
+
+    def call_api(self, method, data):
+        request = urllib.request.Request(
+            f"{self.base_url}/{method}", data=json.dumps(data).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def process_update(self, update):
+        message = update['message']
+        self.call_api('sendMessage', {'chat_id': message['chat']['id'], 'text': message['text']})
+
+
+@pytest.fixture
+def harness():
+    api = FakeTelegramAPI().start()
+    server = TelegramWebhookServer(EchoBot(api), host='127.0.0.1', port=0, workers=2)
+    server.start()
+    bot = EchoBot(api)
+    bot.call_api('setWebhook', {
+        'url': f"http://127.0.0.1:{server.port}{server.path}",
+        'secret_token': server.secret_token
+    })
+    yield api, server
+    server.stop()
+    api.stop()
+
+
+def post(server, body, secret):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.port}{server.path}", data=body,
+        headers={'Content-Type': 'application/json', server.SECRET_HEADER: secret}, method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def make_update(update_id, chat_id, text):
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'chat': {'id': chat_id}, 'from': {'id': chat_id}, 'text': text}
+    }
+
+
+def test_update_reaches_bot_and_send_message(harness):
+    api, server = harness
+    assert api.push_update(make_update(1, 42, 'привет')) == 200
+    assert api.wait_for_calls('sendMessage', 1)
+    method, params = api.get_calls('sendMessage')[0]
+    assert params['chat_id'] == 42
+    assert params['text'] == 'привет'
+
+
+def test_wrong_secret_is_rejected(harness):
+    api, server = harness
+    body = json.dumps(make_update(2, 42, 'подделка')).encode('utf-8')
+    assert post(server, body, 'wrong-secret') == 403
+    assert post(server, body, '') == 403
+    assert server.get_stats()['rejected'] == 2
+    assert not api.wait_for_calls('sendMessage', 1, timeout=0.5)
+
+
+def test_secret_is_generated_when_not_configured():
+    server = TelegramWebhookServer(bot=None, secret_token=None)
+    assert server.secret_token
+    assert not server.verify_secret(None)
+    assert server.verify_secret(server.secret_token)
+
+
+def test_non_object_body_is_rejected(harness):
+    api, server = harness
+    for body in (b'[]', b'1', b'"text"', b'not json'):
+        assert post(server, body, server.secret_token) == 400
+    assert server.get_stats()['received'] == 0
+
+
+def test_callback_queries_are_routed_by_chat():
+    callback = {'update_id': 3, 'callback_query': {
+        'id': '1', 'from': {'id': 7}, 'message': {'message_id': 5, 'chat': {'id': -100}}, 'data': 'x'
+    }}
+    assert TelegramWebhookServer.get_chat_id(callback) == -100
+    inline = {'update_id': 4, 'callback_query': {'id': '2', 'from': {'id': 7}, 'data': 'x'}}
+    assert TelegramWebhookServer.get_chat_id(inline) == 7
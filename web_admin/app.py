@@ -14,6 +14,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import DatabaseManager
 from bot_integration import TelegramBotIntegration
+from dashboard_metrics import DashboardMetrics
+from post_delivery import get_delivery_progress
+from query_profiler import load_profile_report
+from config import WEB_ADMIN_CONFIG
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-change-in-production')
@@ -22,7 +26,9 @@ app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-change-in-produc
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH_WEBPANEL = os.path.join(BASE_DIR, 'shop_bot.db')
 db = DatabaseManager(DB_PATH_WEBPANEL)
-telegram_bot = TelegramBotIntegration()
+telegram_bot = TelegramBotIntegration(db)
+dashboard_metrics = DashboardMetrics(db, WEB_ADMIN_CONFIG['dashboard_refresh_interval'])
+dashboard_metrics.start()
 
 # Настройки загрузки файлов
 UPLOAD_FOLDER = 'static/uploads'
@@ -69,68 +75,18 @@ def login_required(f):
 @app.route('/')
 @login_required
 def dashboard():
-    # Статистика за сегодня
-    today = datetime.now().strftime('%Y-%m-%d')
-    today_stats = db.execute_query('''
-        SELECT 
-            COUNT(*) as orders_today,
-            COALESCE(SUM(total_amount), 0) as revenue_today,
-            COUNT(DISTINCT user_id) as customers_today
-        FROM orders 
-        WHERE DATE(created_at) = ?
-    ''', (today,))
-    
-    # Статистика за вчера
-    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-    yesterday_stats = db.execute_query('''
-        SELECT 
-            COUNT(*) as orders_yesterday,
-            COALESCE(SUM(total_amount), 0) as revenue_yesterday
-        FROM orders 
-        WHERE DATE(created_at) = ?
-    ''', (yesterday,))
-    
-    # Общая статистика
-    total_stats = db.execute_query('''
-        SELECT 
-            COUNT(DISTINCT id) as total_customers,
-            COUNT(*) as total_orders,
-            COALESCE(SUM(total_amount), 0) as total_revenue
-        FROM (
-            SELECT u.id, o.total_amount FROM users u
-            LEFT JOIN orders o ON u.id = o.user_id AND o.status != 'cancelled'
-            WHERE u.is_admin = 0
-        )
-    ''')
-    
-    # Последние заказы
-    recent_orders = db.execute_query('''
-        SELECT o.id, o.total_amount, o.status, o.created_at, u.name
-        FROM orders o
-        JOIN users u ON o.user_id = u.id
-        ORDER BY o.created_at DESC
-        LIMIT 10
-    ''')
-    
-    # Топ товары за неделю
-    top_products = db.execute_query('''
-        SELECT p.name, SUM(oi.quantity) as sold, SUM(oi.quantity * oi.price) as revenue
-        FROM order_items oi
-        JOIN products p ON oi.product_id = p.id
-        JOIN orders o ON oi.order_id = o.id
-        WHERE o.created_at >= date('now', '-7 days')
-        AND o.status != 'cancelled'
-        GROUP BY p.id, p.name
-        ORDER BY revenue DESC
-        LIMIT 5
-    ''')
-    
+    # Метрики отдаются из кэша, пересчет идет в фоновом потоке
+    metrics = dashboard_metrics.get_snapshot()
+    refreshed_at, metrics_age = dashboard_metrics.get_freshness()
+
     return render_template('dashboard.html',
-                         today_stats=today_stats[0] if today_stats else (0, 0, 0),
-                         yesterday_stats=yesterday_stats[0] if yesterday_stats else (0, 0),
-                         total_stats=total_stats[0] if total_stats else (0, 0, 0),
-                         recent_orders=recent_orders or [],
-                         top_products=top_products or [])
+                         today_stats=metrics['today_stats'],
+                         yesterday_stats=metrics['yesterday_stats'],
+                         total_stats=metrics['total_stats'],
+                         recent_orders=metrics['recent_orders'],
+                         top_products=metrics['top_products'],
+                         metrics_refreshed_at=refreshed_at,
+                         metrics_age=metrics_age)
 
 @app.route('/orders')
 @login_required
@@ -550,13 +506,36 @@ def scheduled_posts():
             LIMIT 10
         ''')
         
+        # Прогресс массовых рассылок
+        deliveries = get_delivery_progress(db)
+        
         return render_template('scheduled_posts.html',
                              posts=posts or [],
-                             stats=stats or [])
+                             stats=stats or [],
+                             deliveries=deliveries)
     except Exception as e:
         flash(f'Ошибка загрузки автопостов: {e}')
         return redirect(url_for('dashboard'))
 
+@app.route('/query_profile', endpoint='query_profile_page')
+@login_required
+def query_profile_page():
+    order_by = request.args.get('order', 'total')
+    source = request.args.get('source') or None
+    top_n = request.args.get('top', 50, type=int)
+    try:
+        rows = load_profile_report(db, top_n, order_by, source)
+        sources = db.execute_query('SELECT DISTINCT source FROM query_profile ORDER BY source') or []
+        return render_template('query_profile.html',
+                             rows=rows,
+                             sources=[row[0] for row in sources],
+                             order_by=order_by,
+                             source=source,
+                             top_n=top_n)
+    except Exception as e:
+        flash(f'Ошибка загрузки профиля запросов: {e}')
+        return redirect(url_for('dashboard'))
+
 @app.route('/create_post', methods=['GET', 'POST'])
 @login_required
 def create_post():
@@ -698,24 +677,17 @@ def send_now_post():
             else:
                 error_count = 1
         else:
-            # Отправка пользователям
-            recipients = posts_manager.get_recipients(target_audience)
-            logging.info(f"send_now_post recipients count={len(recipients) if recipients else 0}")
-            for recipient in recipients:
-                try:
-                    telegram_id = recipient[0] if isinstance(recipient, (list, tuple)) else recipient.get('telegram_id')
-                    if image_url:
-                        result = telegram_bot.send_photo(telegram_id, image_url, message_text, keyboard)
-                    else:
-                        result = telegram_bot.send_message(telegram_id, message_text, keyboard)
-                    ok = bool(result and isinstance(result, dict) and result.get('ok'))
-                    if ok:
-                        success_count += 1
-                    else:
-                        error_count += 1
-                except Exception as e:
-                    error_count += 1
-                    logging.info(f"Ошибка отправки пользователю: {e}")
+            # Пользователям — рассылкой через очередь доставки: ее отправляет основной процесс бота
+            recipients = posts_manager.get_target_audience(target_audience) or []
+            logging.info(f"send_now_post recipients count={len(recipients)}")
+            delivery_id = posts_manager.delivery_pipeline.enqueue_delivery(
+                post_id, 'manual', message_text, image_url, keyboard, recipients
+            ) if recipients else None
+            if delivery_id:
+                flash(f'📬 Пост поставлен в рассылку #{delivery_id}: получателей {len(recipients)}.')
+            else:
+                flash('❌ Не удалось поставить пост в рассылку: нет получателей или ошибка записи.')
+            return redirect(url_for('scheduled_posts'))
         
         # Триггерим перезагрузку данных у бота — чтобы в админ-чат пришло "Данные обновлены"
         try:
@@ -820,6 +792,7 @@ def update_order_status():
     result = db.update_order_status(order_id, status)
     
     if result and result > 0:
+        dashboard_metrics.invalidate()
         # Уведомляем клиента об изменении статуса
         try:
             order_details = db.get_order_details(order_id)
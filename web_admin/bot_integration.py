@@ -17,10 +17,11 @@ from config import BOT_TOKEN, POST_CHANNEL_ID
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 class TelegramBotIntegration:
-    def __init__(self):
+    def __init__(self, db=None):
         self.token = BOT_TOKEN
         self.base_url = f"https://api.telegram.org/bot{self.token}"
         self.channel_id = POST_CHANNEL_ID
+        self.db = db
     
     def trigger_bot_data_reload(self):
         """Сигнал боту о необходимости перезагрузки данных"""
@@ -109,15 +110,12 @@ class TelegramBotIntegration:
     def notify_admins(self, message):
         """Уведомление всех админов"""
         try:
-            from database import DatabaseManager
-            db = DatabaseManager()
+            from admin_alerts import get_admin_alerts
+            if self.db is None:
+                from database import DatabaseManager
+                self.db = DatabaseManager()
             
-            admins = db.execute_query(
-                'SELECT telegram_id FROM users WHERE is_admin = 1'
-            )
-            
-            for admin in admins:
-                self.send_message(admin[0], message)
+            get_admin_alerts(self, self.db).notify(message)
                 
         except Exception as e:
             logging.info(f"Ошибка уведомления админов: {e}")
@@ -0,0 +1,135 @@
+"""
+Кэшированные метрики главной страницы веб-панели
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class DashboardMetrics:
+    """Фоновый пересчет метрик дашборда с отдачей из памяти"""
+
+    def __init__(self, db, refresh_interval=30):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.refresh_event = threading.Event()
+        self.snapshot = None
+        self.refreshed_at = None
+        self.refresh_duration = 0.0
+        self.worker_started = False
+
+    def start(self):
+        """Запуск фонового обновления"""
+        with self.lock:
+            if self.worker_started:
+                return
+            self.worker_started = True
+
+        def refresh_worker():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logging.info(f"Ошибка обновления метрик дашборда: {e}")
+                self.refresh_event.wait(self.refresh_interval)
+                self.refresh_event.clear()
+
+        refresh_thread = threading.Thread(target=refresh_worker, daemon=True)
+        refresh_thread.start()
+
+    def invalidate(self):
+        """Досрочное обновление после изменений в заказах или товарах"""
+        self.refresh_event.set()
+
+    def get_snapshot(self):
+        """Последний снимок метрик; при холодном старте считается синхронно"""
+        if self.snapshot is None:
+            self.refresh()
+        return self.snapshot
+
+    def refresh(self):
+        """Пересчет всех метрик дашборда"""
+        started = time.time()
+        now = datetime.now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        tomorrow_start = today_start + timedelta(days=1)
+        yesterday_start = today_start - timedelta(days=1)
+        week_start = today_start - timedelta(days=7)
+
+        # Диапазоны по created_at вместо DATE(created_at) = ? используют индекс
+        today_stats = self.db.execute_query('''
+            SELECT
+                COUNT(*) as orders_today,
+                COALESCE(SUM(total_amount), 0) as revenue_today,
+                COUNT(DISTINCT user_id) as customers_today
+            FROM orders
+            WHERE created_at >= ? AND created_at < ?
+        ''', (self.format_ts(today_start), self.format_ts(tomorrow_start)))
+
+        yesterday_stats = self.db.execute_query('''
+            SELECT
+                COUNT(*) as orders_yesterday,
+                COALESCE(SUM(total_amount), 0) as revenue_yesterday
+            FROM orders
+            WHERE created_at >= ? AND created_at < ?
+        ''', (self.format_ts(yesterday_start), self.format_ts(today_start)))
+
+        # Общая статистика без JOIN по всей истории users×orders
+        customers = self.db.execute_query('SELECT COUNT(*) FROM users WHERE is_admin = 0')
+        orders_totals = self.db.execute_query('''
+            SELECT COUNT(*), COALESCE(SUM(o.total_amount), 0)
+            FROM orders o
+            JOIN users u ON o.user_id = u.id
+            WHERE o.status != 'cancelled' AND u.is_admin = 0
+        ''')
+        total_customers = customers[0][0] if customers else 0
+        total_orders, total_revenue = orders_totals[0] if orders_totals else (0, 0)
+
+        recent_orders = self.db.execute_query('''
+            SELECT o.id, o.total_amount, o.status, o.created_at, u.name
+            FROM orders o
+            JOIN users u ON o.user_id = u.id
+            ORDER BY o.created_at DESC
+            LIMIT 10
+        ''')
+
+        top_products = self.db.execute_query('''
+            SELECT p.name, SUM(oi.quantity) as sold, SUM(oi.quantity * oi.price) as revenue
+            FROM order_items oi
+            JOIN products p ON oi.product_id = p.id
+            JOIN orders o ON oi.order_id = o.id
+            WHERE o.created_at >= ?
+            AND o.status != 'cancelled'
+            GROUP BY p.id, p.name
+            ORDER BY revenue DESC
+            LIMIT 5
+        ''', (self.format_ts(week_start),))
+
+        snapshot = {
+            'today_stats': today_stats[0] if today_stats else (0, 0, 0),
+            'yesterday_stats': yesterday_stats[0] if yesterday_stats else (0, 0),
+            'total_stats': (total_customers, total_orders or 0, total_revenue or 0),
+            'recent_orders': recent_orders or [],
+            'top_products': top_products or [],
+        }
+
+        with self.lock:
+            self.snapshot = snapshot
+            self.refreshed_at = now
+            self.refresh_duration = time.time() - started
+
+        return snapshot
+
+    def get_freshness(self):
+        """Время последнего обновления и возраст снимка в секундах"""
+        with self.lock:
+            if not self.refreshed_at:
+                return None, None
+            age = int((datetime.now() - self.refreshed_at).total_seconds())
+            return self.refreshed_at.strftime('%Y-%m-%d %H:%M:%S'), age
+
+    @staticmethod
+    def format_ts(value):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
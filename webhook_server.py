@@ -0,0 +1,155 @@
+"""
+HTTP-сервер для приема обновлений Telegram в режиме webhook
+"""
+import hmac
+import json
+import logging
+import queue
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TelegramWebhookServer:
+    """Прием обновлений по HTTP и передача их в диспетчер бота.
+
+    Запрос подтверждается сразу после проверки секрета и постановки в очередь,
+    обработка идет в рабочих потоках. Обновления одного чата всегда попадают
+    в одну и ту же очередь, поэтому порядок сообщений внутри чата сохраняется.
+
+    Без секрета обновления не принимаются: если WEBHOOK_SECRET не задан,
+    генерируется случайный, и его нужно передать в setWebhook (secret_token).
+    """
+
+    SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+    def __init__(self, bot, host='0.0.0.0', port=8443, path='/telegram/webhook', secret_token=None, workers=4):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.path = path
+        if not secret_token:
+            secret_token = secrets.token_urlsafe(32)
+            logging.warning("⚠️ WEBHOOK_SECRET не задан, для webhook сгенерирован случайный секрет")
+        self.secret_token = secret_token
+        self.queues = [queue.Queue() for _ in range(max(1, workers))]
+        self.server = None
+        self.stats = {'received': 0, 'rejected': 0, 'processed': 0}
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        """Запуск HTTP-сервера и рабочих потоков"""
+        for index, update_queue in enumerate(self.queues):
+            threading.Thread(
+                target=self.update_worker, args=(update_queue,),
+                name=f"webhook-worker-{index}", daemon=True
+            ).start()
+
+        self.server = ThreadingHTTPServer((self.host, self.port), self.create_handler())
+        self.server.daemon_threads = True
+        # При port=0 ОС выбирает свободный порт
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="webhook-server", daemon=True).start()
+        logging.info(f"Webhook сервер запущен на {self.host}:{self.port}{self.path}")
+
+    def stop(self):
+        """Остановка HTTP-сервера"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def verify_secret(self, received_token):
+        return hmac.compare_digest(received_token or '', self.secret_token)
+
+    def enqueue_update(self, update):
+        """Постановка обновления в очередь его чата"""
+        chat_id = self.get_chat_id(update)
+        update_queue = self.queues[hash(chat_id) % len(self.queues)]
+        update_queue.put(update)
+        with self.stats_lock:
+            self.stats['received'] += 1
+
+    @staticmethod
+    def get_chat_id(update):
+        if 'message' in update:
+            return update['message'].get('chat', {}).get('id')
+        if 'callback_query' in update:
+            callback_query = update['callback_query']
+            # Нажатие в групповом чате идет в очередь чата, а не нажавшего
+            chat_id = (callback_query.get('message') or {}).get('chat', {}).get('id')
+            if chat_id is not None:
+                return chat_id
+            return callback_query.get('from', {}).get('id')
+        return update.get('update_id')
+
+    def update_worker(self, update_queue):
+        """Обработка обновлений из очереди"""
+        while True:
+            update = update_queue.get()
+            try:
+                self.bot.process_update(update)
+            except Exception as e:
+                logging.info(f"Ошибка обработки обновления из webhook: {e}")
+            finally:
+                with self.stats_lock:
+                    self.stats['processed'] += 1
+                update_queue.task_done()
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['queued'] = sum(update_queue.qsize() for update_queue in self.queues)
+        # В режиме supervisor — отчеты рабочих процессов
+        if hasattr(self.bot, 'get_worker_health'):
+            stats['workers'] = self.bot.get_worker_health()
+        return stats
+
+    def create_handler(self):
+        webhook = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != webhook.path:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                if not webhook.verify_secret(self.headers.get(webhook.SECRET_HEADER)):
+                    with webhook.stats_lock:
+                        webhook.stats['rejected'] += 1
+                    self.send_response(403)
+                    self.end_headers()
+                    return
+
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    update = json.loads(self.rfile.read(length).decode('utf-8'))
+                except (ValueError, UnicodeDecodeError):
+                    update = None
+                if not isinstance(update, dict):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+
+                webhook.enqueue_update(update)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{"ok":true}')
+
+            def do_GET(self):
+                if self.path == webhook.path + '/health':
+                    body = json.dumps(webhook.get_stats()).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+
+            def log_message(self, format, *args):
+                pass  # Отключаем логи HTTP сервера
+
+        return WebhookHandler
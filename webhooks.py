@@ -3,14 +3,35 @@
 """
 import logging
 
+import hashlib
 import json
-from datetime import datetime
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from config import PAYMENT_WEBHOOK_CONFIG
+from log_sink import get_log_writer
 
 class WebhookManager:
-    def __init__(self, bot, db, security_manager):
+    """Прием платежных webhook'ов с подтверждением до обработки.
+    
+    Событие проверяется, сохраняется в payment_events с уникальным
+    (provider, event_id) и сразу подтверждается провайдеру; повторная
+    доставка того же события отвечает 'duplicate' без повторной обработки.
+    Оплата заказа, очистка корзины и уведомление клиента выполняются
+    фоновыми потоками с повторами по экспоненциальной задержке.
+    
+    Обрабатывает события только экземпляр с process_events=True (основной
+    процесс бота); остальные лишь записывают их, а основной забирает из БД.
+    Захват события действует processing_lease секунд: событие процесса,
+    упавшего посреди обработки, после этого снова становится доступным.
+    """
+    
+    def __init__(self, bot, db, security_manager, process_events=True):
         self.bot = bot
         self.db = db
         self.security = security_manager
+        self.audit_log = get_log_writer(db)
         
         # Секретные ключи для проверки подписей
         self.webhook_secrets = {
@@ -20,100 +41,222 @@ class WebhookManager:
             'paypal': 'PAYPAL_WEBHOOK_SECRET',
             'zoodpay': 'ZOODPAY_WEBHOOK_SECRET'
         }
+        
+        self.event_parsers = {
+            'stripe': self.parse_stripe_event,
+            'paypal': self.parse_paypal_event
+        }
+        
+        self.max_attempts = PAYMENT_WEBHOOK_CONFIG['max_attempts']
+        self.retry_base_delay = PAYMENT_WEBHOOK_CONFIG['retry_base_delay']
+        self.retry_poll_interval = PAYMENT_WEBHOOK_CONFIG['retry_poll_interval']
+        self.processing_lease = PAYMENT_WEBHOOK_CONFIG['processing_lease']
+        self.event_queue = queue.Queue()
+        self.process_events = process_events
+        if process_events:
+            self.start_processing(PAYMENT_WEBHOOK_CONFIG['workers'])
+    
+    def start_processing(self, workers):
+        """Запуск обработчиков событий и планировщика повторов"""
+        for index in range(max(1, workers)):
+            threading.Thread(target=self.event_worker, name=f"payment-events-{index}", daemon=True).start()
+        threading.Thread(target=self.retry_worker, name="payment-events-retry", daemon=True).start()
     
     def handle_payment_webhook(self, provider, payload, signature=None):
-        """Обработка webhook'а от платежной системы"""
+        """Прием webhook'а: проверка, запись события и немедленный ответ"""
         try:
             # Проверяем подпись
             if signature and not self.verify_webhook_signature(provider, payload, signature):
                 self.log_webhook_error(provider, "Invalid signature", payload[:100])
                 return {'status': 'error', 'message': 'Invalid signature'}
             
-            # Парсим данные
-            if provider == 'stripe':
-                return self.handle_stripe_webhook(payload)
-            elif provider == 'paypal':
-                return self.handle_paypal_webhook(payload)
-            else:
+            parser = self.event_parsers.get(provider)
+            if not parser:
                 return {'status': 'error', 'message': 'Unknown provider'}
-                
+            
+            event_id, event_type, order_id = parser(json.loads(payload))
+            if not event_id:
+                event_id = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+            
+            # События без заказа сохраняются только ради идемпотентности
+            status = 'pending' if order_id else 'ignored'
+            row_id, created = self.db.record_payment_event(provider, event_id, event_type, order_id, payload, status)
+            if created is None:
+                return {'status': 'error', 'message': 'Storage error'}
+            if not created:
+                return {'status': 'duplicate', 'event_id': event_id}
+            
+            if status == 'pending' and self.process_events:
+                self.event_queue.put(row_id)
+            return {'status': 'accepted', 'event_id': event_id}
+        
         except Exception as e:
             self.log_webhook_error(provider, str(e), payload[:100])
             return {'status': 'error', 'message': 'Processing error'}
     
-    def handle_stripe_webhook(self, payload):
-        """Обработка Stripe webhook"""
-        try:
-            data = json.loads(payload)
-            
-            if data['type'] == 'payment_intent.succeeded':
-                payment_intent = data['data']['object']
-                order_id = payment_intent['metadata'].get('order_id')
-                
-                if order_id:
-                    self.confirm_payment(order_id, 'stripe')
-                    return {'status': 'success'}
-            
-            return {'status': 'success'}
-        except Exception as e:
-            logging.info(f"Ошибка обработки Stripe webhook: {e}")
-            return {'status': 'error'}
+    def parse_stripe_event(self, data):
+        """(event_id, тип, order_id) из события Stripe"""
+        order_id = None
+        if data.get('type') == 'payment_intent.succeeded':
+            payment_intent = data['data']['object']
+            order_id = payment_intent.get('metadata', {}).get('order_id')
+        return data.get('id'), data.get('type'), order_id
+    
+    def parse_paypal_event(self, data):
+        """(event_id, тип, order_id) из события PayPal"""
+        order_id = None
+        if data.get('event_type') == 'PAYMENT.CAPTURE.COMPLETED':
+            purchase_units = data.get('resource', {}).get('purchase_units')
+            if purchase_units:
+                order_id = purchase_units[0].get('reference_id')
+        return data.get('id'), data.get('event_type'), order_id
+    
+    def event_worker(self):
+        """Обработка событий из очереди"""
+        while True:
+            row_id = self.event_queue.get()
+            try:
+                self.process_event(row_id)
+            except Exception as e:
+                logging.info(f"Ошибка обработки платежного события {row_id}: {e}")
+            finally:
+                self.event_queue.task_done()
+    
+    def retry_worker(self):
+        """Постановка в очередь событий, у которых подошло время повтора или истек захват"""
+        while True:
+            try:
+                due = self.db.execute_query('''
+                    SELECT id FROM payment_events
+                    WHERE status IN ('pending', 'failed', 'processing') AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at
+                    LIMIT 100
+                ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+                for (row_id,) in due or []:
+                    self.event_queue.put(row_id)
+            except Exception as e:
+                logging.info(f"Ошибка планировщика повторов платежей: {e}")
+            time.sleep(self.retry_poll_interval)
     
-    def handle_paypal_webhook(self, payload):
-        """Обработка PayPal webhook"""
+    def process_event(self, row_id):
+        """Обработка одного события; строка захватывается, чтобы не обработать ее дважды.
+        
+        Пока событие в processing, next_attempt_at — срок захвата.
+        """
+        now = datetime.now()
+        claimed = self.db.execute_query('''
+            UPDATE payment_events SET status = 'processing', attempts = attempts + 1, next_attempt_at = ?
+            WHERE id = ? AND (status IN ('pending', 'failed') OR (status = 'processing' AND next_attempt_at <= ?))
+        ''', (
+            (now + timedelta(seconds=self.processing_lease)).strftime('%Y-%m-%d %H:%M:%S'),
+            row_id,
+            now.strftime('%Y-%m-%d %H:%M:%S')
+        ))
+        if not claimed:
+            return
+        
+        event = self.db.execute_query(
+            'SELECT provider, order_id, attempts FROM payment_events WHERE id = ?',
+            (row_id,)
+        )
+        if not event:
+            return
+        provider, order_id, attempts = event[0]
+        
         try:
-            data = json.loads(payload)
-            
-            if data.get('event_type') == 'PAYMENT.CAPTURE.COMPLETED':
-                purchase_units = data['resource']['purchase_units']
-                if purchase_units:
-                    order_id = purchase_units[0]['reference_id']
-                    self.confirm_payment(order_id, 'paypal')
-            
-            return {'status': 'success'}
+            self.confirm_payment(order_id, provider)
         except Exception as e:
-            logging.info(f"Ошибка обработки PayPal webhook: {e}")
-            return {'status': 'error'}
+            if attempts >= self.max_attempts:
+                status, next_attempt_at = 'dead', None
+                self.log_webhook_error(provider, f"Order {order_id}: {e}", None)
+            else:
+                delay = self.retry_base_delay * (2 ** (attempts - 1))
+                status = 'failed'
+                next_attempt_at = (datetime.now() + timedelta(seconds=delay)).strftime('%Y-%m-%d %H:%M:%S')
+            self.db.execute_query('''
+                UPDATE payment_events SET status = ?, last_error = ?, next_attempt_at = ?
+                WHERE id = ?
+            ''', (status, str(e)[:500], next_attempt_at, row_id))
+            return
+        
+        self.db.execute_query('''
+            UPDATE payment_events SET status = 'processed', last_error = NULL, processed_at = ?
+            WHERE id = ?
+        ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), row_id))
     
     def confirm_payment(self, order_id, provider):
-        """Подтверждение успешной оплаты"""
-        try:
-            # Обновляем статус заказа
-            self.db.execute_query(
-                'UPDATE orders SET payment_status = "paid", status = "confirmed" WHERE id = ?',
+        """Подтверждение успешной оплаты.
+        
+        Статус заказа, очистка корзины и уведомление отмечаются отдельно:
+        повтор события выполняет только то, что еще не сделано.
+        """
+        # Обновляем статус заказа
+        updated = self.db.execute_query('''
+            UPDATE orders SET payment_status = 'paid', status = 'confirmed'
+            WHERE id = ? AND (payment_status IS NULL OR payment_status != 'paid')
+        ''', (order_id,))
+        if updated is None:
+            raise RuntimeError("order update failed")
+        
+        # Получаем данные заказа
+        order = self.db.execute_query(
+            'SELECT user_id, payment_cart_cleared, payment_notified FROM orders WHERE id = ?',
+            (order_id,)
+        )
+        if order is None:
+            raise RuntimeError("order lookup failed")
+        if not order:
+            # Заказ не существует
+            return
+        user_id, cart_cleared, notified = order[0]
+        
+        if user_id and not cart_cleared:
+            # Очищаем корзину и отмечаем шаг в одной транзакции
+            cleared = self.db.execute_batch([
+                ('''
+                    DELETE FROM cart WHERE user_id = ?
+                    AND EXISTS (SELECT 1 FROM orders WHERE id = ? AND payment_cart_cleared = 0)
+                ''', [(user_id, order_id)]),
+                ('UPDATE orders SET payment_cart_cleared = 1 WHERE id = ?', [(order_id,)]),
+            ])
+            if cleared is None:
+                raise RuntimeError("cart clear failed")
+        
+        if user_id and not notified:
+            # Захватываем уведомление, чтобы параллельное событие не отправило его второй раз
+            claimed = self.db.execute_query(
+                'UPDATE orders SET payment_notified = 1 WHERE id = ? AND payment_notified = 0',
                 (order_id,)
             )
-            
-            # Получаем данные заказа
-            order = self.db.execute_query(
-                'SELECT user_id FROM orders WHERE id = ?',
+            if claimed is None:
+                raise RuntimeError("notification claim failed")
+            if claimed:
+                self.notify_payment_success(order_id, user_id)
+        
+        if updated:
+            self.log_webhook_success(provider, order_id, user_id)
+    
+    def notify_payment_success(self, order_id, user_id):
+        """Уведомление клиента об оплате; при ошибке шаг снова считается невыполненным"""
+        user = self.db.execute_query(
+            'SELECT telegram_id, name FROM users WHERE id = ?',
+            (user_id,)
+        )
+        if not user:
+            return
+        
+        success_text = f"✅ <b>Оплата прошла успешно!</b>\n\n"
+        success_text += f"💳 Платеж подтвержден\n"
+        success_text += f"📦 Заказ #{order_id}\n\n"
+        success_text += f"📞 Мы свяжемся с вами в ближайшее время"
+        
+        result = self.bot.send_message(user[0][0], success_text)
+        if not result or not result.get('ok'):
+            self.db.execute_query(
+                'UPDATE orders SET payment_notified = 0 WHERE id = ?',
                 (order_id,)
             )
-            
-            if order:
-                user_id = order[0][0]
-                
-                # Очищаем корзину
-                self.db.clear_cart(user_id)
-                
-                # Уведомляем клиента
-                user = self.db.execute_query(
-                    'SELECT telegram_id, name FROM users WHERE id = ?',
-                    (user_id,)
-                )
-                
-                if user:
-                    success_text = f"✅ <b>Оплата прошла успешно!</b>\n\n"
-                    success_text += f"💳 Платеж подтвержден\n"
-                    success_text += f"📦 Заказ #{order_id}\n\n"
-                    success_text += f"📞 Мы свяжемся с вами в ближайшее время"
-                    
-                    self.bot.send_message(user[0][0], success_text)
-            
-            self.log_webhook_success(provider, order_id, user_id if order else None)
-            
-        except Exception as e:
-            logging.info(f"Ошибка подтверждения платежа: {e}")
+            raise RuntimeError("payment notification failed")
     
     def verify_webhook_signature(self, provider, payload, signature):
         """Проверка подписи webhook'а"""
@@ -125,32 +268,26 @@ class WebhookManager:
     
     def log_webhook_success(self, provider, order_id, user_id):
         """Логирование успешного webhook'а"""
-        try:
-            self.db.execute_query('''
-                INSERT INTO webhook_logs (provider, order_id, user_id, status, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                provider,
-                order_id,
-                user_id,
-                'success',
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-        except Exception as e:
-            logging.info(f"Ошибка записи лога webhook: {e}")
+        self.audit_log.write('''
+            INSERT INTO webhook_logs (provider, order_id, user_id, status, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            provider,
+            order_id,
+            user_id,
+            'success',
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ))
     
     def log_webhook_error(self, provider, error_message, payload_preview):
         """Логирование ошибки webhook'а"""
-        try:
-            self.db.execute_query('''
-                INSERT INTO webhook_logs (provider, status, error_message, payload_preview, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                provider,
-                'error',
-                error_message,
-                payload_preview,
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ))
-        except Exception as e:
-            logging.info(f"Ошибка записи лога ошибки webhook: {e}")
\ No newline at end of file
+        self.audit_log.write('''
+            INSERT INTO webhook_logs (provider, status, error_message, payload_preview, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            provider,
+            'error',
+            error_message,
+            payload_preview,
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ))